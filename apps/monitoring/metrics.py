@@ -0,0 +1,134 @@
+"""
+Счетчики и гистограммы в памяти процесса и их вывод в текстовом
+формате Prometheus.
+
+Значения хранятся отдельно в каждом процессе: при нескольких
+воркерах gunicorn каждый отдает свои метрики, а Prometheus
+суммирует их по лейблу instance.
+"""
+import threading
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, lock):
+        self.name = name
+        self.documentation = documentation
+        self._lock = lock
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield self.name, labels, value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, lock, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self._lock = lock
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * len(self.buckets), 0)
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        for labels, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield (
+                    f'{self.name}_bucket',
+                    labels + (('le', _format_value(bound)),),
+                    count,
+                )
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, counts[-1]
+
+
+class Registry:
+    """
+    Набор метрик процесса. Метрики создаются при первом обращении
+    и возвращаются повторно по имени.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, metric_class, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(
+                    name, documentation, self._lock, **kwargs
+                )
+        return metric
+
+    def counter(self, name, documentation):
+        return self._get(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DURATION_BUCKETS):
+        return self._get(Histogram, name, documentation, buckets=buckets)
+
+    def reset(self):
+        with self._lock:
+            for metric in self._metrics.values():
+                metric._values.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in self._metrics.values():
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    lines.append(
+                        f'{name}{_format_labels(labels)} '
+                        f'{_format_value(value)}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,227 @@
+import cProfile
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import registry
+from .profiling import (
+    RequestProfile, current_profile, instrument_connections,
+    instrument_serializers,
+)
+
+logger = logging.getLogger(__name__)
+
+# В процессе может работать только один cProfile.
+_profiler_lock = threading.Lock()
+
+REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests by view, method and status.'
+)
+DURATION = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by view.'
+)
+DB_QUERIES = registry.counter(
+    'db_queries_total', 'SQL queries executed by view.'
+)
+DB_DURATION = registry.counter(
+    'db_query_duration_seconds_total', 'Time spent in SQL queries by view.'
+)
+DUPLICATE_QUERIES = registry.counter(
+    'db_duplicate_queries_total',
+    'Repeated executions of the same SQL pattern (N+1) by view.'
+)
+SERIALIZER_DURATION = registry.counter(
+    'serializer_duration_seconds_total',
+    'Time spent in DRF serializers by view.'
+)
+RENDER_DURATION = registry.counter(
+    'render_duration_seconds_total', 'Time spent rendering responses by view.'
+)
+ALLOCATED = registry.counter(
+    'http_request_allocated_bytes_total',
+    'Peak memory allocated while handling requests by view.'
+)
+
+
+class ProfilingMiddleware:
+    """
+    Замеряет каждый запрос: число и время SQL-запросов, время
+    сериализации и рендеринга, общую задержку и (если включено
+    ``PROFILING_TRACE_ALLOCATIONS``) выделенную память.
+
+    Замеры возвращаются в заголовке ``Server-Timing`` и копятся в
+    метриках для ``/metrics/``. Повторяющиеся шаблоны SQL (N+1)
+    записываются в лог. Заголовок ``X-Profile`` со значением
+    ``PROFILING_TOKEN`` (без токена заголовок игнорируется) или
+    выборка с вероятностью ``PROFILING_SAMPLE_RATE`` сохраняют дамп
+    cProfile запроса в ``PROFILING_DUMP_DIR``.
+
+    Работает и в синхронной, и в асинхронной цепочке middleware,
+    поэтому под ASGI не добавляет переход в поток. В асинхронной
+    цепочке дамп cProfile покрывает только поток цикла событий:
+    код, выполняемый через sync_to_async, в него не попадает.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.duplicate_threshold = settings.PROFILING_DUPLICATE_QUERIES
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.dump_dir = settings.PROFILING_DUMP_DIR
+        self.token = settings.PROFILING_TOKEN
+        self.trace_allocations = settings.PROFILING_TRACE_ALLOCATIONS
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        instrument_connections()
+        instrument_serializers()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile, token, allocated_before = self._start()
+        try:
+            response, dump = self._get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self._finish(request, response, profile, allocated_before, dump)
+
+    async def __acall__(self, request):
+        profile, token, allocated_before = self._start()
+        try:
+            response, dump = await self._aget_response(request)
+        finally:
+            current_profile.reset(token)
+        return self._finish(request, response, profile, allocated_before, dump)
+
+    def _start(self):
+        profile = RequestProfile()
+        allocated_before = None
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            allocated_before = tracemalloc.get_traced_memory()[0]
+        return profile, current_profile.set(profile), allocated_before
+
+    def _finish(self, request, response, profile, allocated_before, dump):
+        total = time.perf_counter() - profile.started
+
+        allocated = None
+        if allocated_before is not None:
+            allocated = tracemalloc.get_traced_memory()[1] - allocated_before
+        view = self._view_name(request)
+        duplicates = profile.duplicate_queries(self.duplicate_threshold)
+        self._record(request, response, view, profile, total, allocated)
+        for sql, count in duplicates:
+            logger.warning(
+                f'Duplicate queries in {view}: {count} x {sql}'
+            )
+        DUPLICATE_QUERIES.inc(
+            sum(count - 1 for _, count in duplicates), view=view
+        )
+
+        response['Server-Timing'] = self._server_timing(
+            profile, total, duplicates, allocated
+        )
+        if dump:
+            response['X-Profile-Dump'] = dump
+        return response
+
+    def process_template_response(self, request, response):
+        profile = current_profile.get()
+        if profile is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                profile.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _should_profile(self, request):
+        header = request.headers.get('X-Profile')
+        if header and self.token:
+            return hmac.compare_digest(header, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _get_response(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request), None
+        if not _profiler_lock.acquire(blocking=False):
+            return self.get_response(request), None
+        try:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+        finally:
+            _profiler_lock.release()
+        return response, self._dump(request, profiler)
+
+    async def _aget_response(self, request):
+        if not self._should_profile(request):
+            return await self.get_response(request), None
+        if not _profiler_lock.acquire(blocking=False):
+            return await self.get_response(request), None
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            _profiler_lock.release()
+        return response, self._dump(request, profiler)
+
+    def _dump(self, request, profiler):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        name = (
+            f'{time.strftime("%Y%m%d-%H%M%S")}-'
+            f'{self._view_name(request)}-{uuid.uuid4().hex[:8]}.prof'
+        )
+        profiler.dump_stats(os.path.join(self.dump_dir, name))
+        return name
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match.func.__name__
+
+    def _record(self, request, response, view, profile, total, allocated):
+        REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        DURATION.observe(total, view=view, method=request.method)
+        DB_QUERIES.inc(len(profile.queries), view=view)
+        DB_DURATION.inc(profile.db_time, view=view)
+        SERIALIZER_DURATION.inc(profile.serializer_time, view=view)
+        RENDER_DURATION.inc(profile.render_time, view=view)
+        if allocated is not None:
+            ALLOCATED.inc(allocated, view=view)
+
+    @staticmethod
+    def _server_timing(profile, total, duplicates, allocated):
+        description = f'{len(profile.queries)} queries'
+        if duplicates:
+            repeated = sum(count - 1 for _, count in duplicates)
+            description += f', {repeated} duplicates'
+        entries = [
+            f'db;dur={profile.db_time * 1000:.2f};desc="{description}"',
+            f'serializer;dur={profile.serializer_time * 1000:.2f}',
+            f'render;dur={profile.render_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ]
+        if allocated is not None:
+            entries.append(f'alloc;desc="{allocated} bytes"')
+        return ', '.join(entries)
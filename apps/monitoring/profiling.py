@@ -0,0 +1,129 @@
+"""
+Замеры одного запроса: SQL-запросы и их время, время сериализации
+и рендеринга. Профиль текущего запроса хранится в ContextVar,
+поэтому он доступен и в async-вью, вызванных из того же запроса.
+"""
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+current_profile = ContextVar('current_profile', default=None)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, ?(?:%s|\?))*\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+
+def normalize_sql(sql):
+    """
+    Приводит SQL к шаблону: литералы и списки ``IN (...)`` любой
+    длины заменяются одинаковыми заглушками.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    """
+    Замеры одного запроса. SQL-запросы записывает обертка
+    соединений ``record_query`` (см. ``instrument_connections``).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self._serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicate_queries(self, threshold):
+        """
+        Шаблоны SQL, выполненные за запрос ``threshold`` раз и более
+        (признак N+1), и число их выполнений.
+        """
+        counts = Counter(
+            normalize_sql(sql) for sql, _ in self.queries
+            if not sql.lstrip().upper().startswith(_IGNORED_PREFIXES)
+        )
+        return [
+            (sql, count) for sql, count in counts.most_common()
+            if count >= threshold
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения SQL: записывает запрос в профиль текущего
+    запроса, если он есть.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def _install_wrapper(connection, **kwargs):
+    # В начало списка: execute_wrapper() снимает последнюю обертку.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def instrument_connections():
+    """
+    Подключает ``record_query`` ко всем соединениям с БД, в том числе
+    к открываемым позже в других потоках. Соединения привязаны к
+    потоку, а профиль — к контексту, поэтому запросы async-вью из
+    потоков sync_to_async тоже попадают в профиль запроса.
+    """
+    for connection in connections.all():
+        _install_wrapper(connection)
+    connection_created.connect(
+        _install_wrapper, dispatch_uid='monitoring_record_query'
+    )
+
+
+def _timed_data(fget):
+    def data(self):
+        profile = current_profile.get()
+        if profile is None or profile._serializer_depth:
+            return fget(self)
+        profile._serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            profile.serializer_time += time.perf_counter() - start
+            profile._serializer_depth -= 1
+
+    data._profiled = True
+    return data
+
+
+def instrument_serializers():
+    """
+    Добавляет замер времени в ``BaseSerializer.data``. Serializer и
+    ListSerializer получают данные через ``super().data``, поэтому
+    замеряются все сериализаторы DRF. Вложенные вызовы учитываются
+    один раз.
+    """
+    fget = serializers.BaseSerializer.data.fget
+    if not getattr(fget, '_profiled', False):
+        serializers.BaseSerializer.data = property(_timed_data(fget))
@@ -0,0 +1,280 @@
+import os
+import re
+import tempfile
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+from django.urls import include, path, resolve, reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from .metrics import Registry, registry
+from .middleware import ProfilingMiddleware
+from .profiling import RequestProfile, normalize_sql
+from apps.products.models import Category, Product
+from apps.users.models import User
+
+PROFILING_MIDDLEWARE = [
+    'apps.monitoring.middleware.ProfilingMiddleware',
+    *settings.MIDDLEWARE,
+]
+
+
+def n_plus_one_view(request):
+    return JsonResponse({
+        'categories': [
+            [category.name for category in product.categories.all()]
+            for product in Product.objects.all()
+        ]
+    })
+
+
+urlpatterns = [
+    path('n-plus-one/', n_plus_one_view, name='n-plus-one'),
+    path('', include('mini_online_store.urls')),
+]
+
+
+def server_timing(response):
+    entries = {}
+    for entry in re.split(r', (?=\w+;)', response['Server-Timing']):
+        name, *params = entry.split(';')
+        entries[name] = dict(param.split('=', 1) for param in params)
+    return entries
+
+
+@override_settings(MIDDLEWARE=PROFILING_MIDDLEWARE, REQUEST_PROFILING=True)
+class ProfilingMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Phone', regular_price='100.00', stock=5
+        )
+        self.product.categories.add(category)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = server_timing(response)
+        self.assertEqual(
+            set(timing), {'db', 'serializer', 'render', 'total'}
+        )
+        self.assertRegex(timing['db']['desc'], r'^"\d+ queries"$')
+        self.assertGreater(float(timing['serializer']['dur']), 0)
+        self.assertGreater(float(timing['render']['dur']), 0)
+        self.assertGreaterEqual(
+            float(timing['total']['dur']), float(timing['db']['dur'])
+        )
+
+    def test_async_view(self):
+        response = self.client.get(
+            reverse('async-product-detail', args=[self.product.pk])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = server_timing(response)
+        self.assertEqual(timing['db']['desc'], '"4 queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('product-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn(
+            'http_requests_total{method="GET",status="200",'
+            'view="product-list"} 1',
+            body
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count'
+            '{method="GET",view="product-list"} 1',
+            body
+        )
+        self.assertIn('db_queries_total{view="product-list"}', body)
+        self.assertIn('catalog_cache_misses_total', body)
+
+    @override_settings(PROFILING_TOKEN='secret')
+    def test_metrics_token(self):
+        client = APIClient()
+        response = client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(ROOT_URLCONF='apps.monitoring.tests')
+    def test_async_middleware(self):
+        """
+        В асинхронной цепочке middleware вызывается без перехода
+        в поток и замеряет запросы к БД из sync_to_async.
+        """
+        middleware = ProfilingMiddleware(self._async_view_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/n-plus-one/')
+        request.resolver_match = resolve('/n-plus-one/')
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(server_timing(response)['db']['desc'], '"1 queries"')
+        self.assertIn(
+            'http_requests_total{method="GET",status="200",'
+            'view="n-plus-one"} 1',
+            registry.render()
+        )
+
+    @staticmethod
+    async def _async_view_response(request):
+        count = await Product.objects.acount()
+        return JsonResponse({'count': count})
+
+    def test_metrics_disabled(self):
+        """Без профилирования и токена ``/metrics/`` не отдается."""
+        with override_settings(REQUEST_PROFILING=False):
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(ROOT_URLCONF='apps.monitoring.tests')
+    def test_duplicate_queries_flagged(self):
+        for number in range(3):
+            Product.objects.create(
+                name=f'Product {number}', regular_price='10.00', stock=1
+            )
+        with self.assertLogs('apps.monitoring.middleware', 'WARNING') as logs:
+            response = self.client.get(reverse('n-plus-one'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            server_timing(response)['db']['desc'],
+            '"5 queries, 3 duplicates"'
+        )
+        self.assertIn('Duplicate queries in n-plus-one: 4 x', logs.output[0])
+        self.assertIn(
+            'db_duplicate_queries_total{view="n-plus-one"} 3',
+            registry.render()
+        )
+
+    def test_no_duplicates_in_product_list(self):
+        for number in range(5):
+            Product.objects.create(
+                name=f'Product {number}', regular_price='10.00', stock=1
+            )
+        response = self.client.get(reverse('product-list'))
+        self.assertNotIn('duplicates', server_timing(response)['db']['desc'])
+
+    @override_settings(PROFILING_TOKEN='secret')
+    def test_profile_dump_by_header(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            with override_settings(PROFILING_DUMP_DIR=dump_dir):
+                client = APIClient()
+                client.force_authenticate(user=self.user)
+                response = client.get(
+                    reverse('product-detail', args=[self.product.pk]),
+                    HTTP_X_PROFILE='secret'
+                )
+                dump = response['X-Profile-Dump']
+                self.assertTrue(dump.endswith('.prof'))
+                self.assertEqual(os.listdir(dump_dir), [dump])
+
+                response = client.get(
+                    reverse('product-detail', args=[self.product.pk])
+                )
+                self.assertNotIn('X-Profile-Dump', response)
+
+    @override_settings(PROFILING_TOKEN='secret')
+    def test_profile_header_requires_token(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            with override_settings(PROFILING_DUMP_DIR=dump_dir):
+                client = APIClient()
+                client.force_authenticate(user=self.user)
+                response = client.get(
+                    reverse('product-list'), HTTP_X_PROFILE='1'
+                )
+                self.assertNotIn('X-Profile-Dump', response)
+                response = client.get(
+                    reverse('product-list'), HTTP_X_PROFILE='secret'
+                )
+                self.assertIn('X-Profile-Dump', response)
+                with override_settings(PROFILING_TOKEN=''):
+                    client = APIClient()
+                    client.force_authenticate(user=self.user)
+                    response = client.get(
+                        reverse('product-list'), HTTP_X_PROFILE='1'
+                    )
+                self.assertNotIn('X-Profile-Dump', response)
+
+    @override_settings(PROFILING_TRACE_ALLOCATIONS=True)
+    def test_allocations(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('product-list'))
+        self.assertRegex(
+            server_timing(response)['alloc']['desc'], r'^"\d+ bytes"$'
+        )
+
+
+class ProfilingHelpersTests(APITestCase):
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql(
+                'SELECT * FROM t WHERE id IN (%s, %s, %s) '
+                "AND name = 'x' LIMIT 21"
+            ),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s)'),
+            'SELECT * FROM t WHERE id IN (...)'
+        )
+
+    def test_duplicate_queries(self):
+        profile = RequestProfile()
+        profile.queries = [
+            ('SELECT * FROM t WHERE id = %s', 0.001),
+            ('SELECT * FROM t WHERE id = %s', 0.001),
+            ('SAVEPOINT "s1"', 0.001),
+            ('SAVEPOINT "s1"', 0.001),
+            ('SELECT * FROM u', 0.001),
+        ]
+        self.assertEqual(
+            profile.duplicate_queries(2),
+            [('SELECT * FROM t WHERE id = %s', 2)]
+        )
+        self.assertEqual(profile.duplicate_queries(3), [])
+
+    def test_registry_render(self):
+        metrics = Registry()
+        counter = metrics.counter('requests_total', 'Requests.')
+        counter.inc(view='a"b')
+        counter.inc(2, view='a"b')
+        histogram = metrics.histogram(
+            'latency_seconds', 'Latency.', buckets=(0.1, 1)
+        )
+        histogram.observe(0.5, view='x')
+        self.assertEqual(
+            metrics.render(),
+            '# HELP requests_total Requests.\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{view="a\\"b"} 3\n'
+            '# HELP latency_seconds Latency.\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{view="x",le="0.1"} 0\n'
+            'latency_seconds_bucket{view="x",le="1"} 1\n'
+            'latency_seconds_bucket{view="x",le="+Inf"} 1\n'
+            'latency_seconds_sum{view="x"} 0.5\n'
+            'latency_seconds_count{view="x"} 1\n'
+        )
@@ -0,0 +1,47 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from .metrics import registry
+from apps.products.cache import get_cache_metrics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _catalog_cache_lines():
+    metrics = get_cache_metrics()
+    lines = []
+    for name in ('hits', 'misses'):
+        metric = f'catalog_cache_{name}_total'
+        lines += [
+            f'# HELP {metric} Catalog response cache {name}.',
+            f'# TYPE {metric} counter',
+            f'{metric} {metrics[name]}',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Метрики процесса в текстовом формате Prometheus. Доступны,
+    только если включен REQUEST_PROFILING или задан
+    ``PROFILING_TOKEN``. С токеном требуется заголовок
+    ``Authorization: Bearer <token>``, без токена — сессия
+    сотрудника (``is_staff``).
+    """
+    token = settings.PROFILING_TOKEN
+    if not settings.REQUEST_PROFILING and not token:
+        raise Http404
+    if token:
+        header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(header, f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render() + _catalog_cache_lines(),
+        content_type=CONTENT_TYPE,
+    )
@@ -0,0 +1,454 @@
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import tasks
+from .models import Cart, CartItem
+from apps.products.models import Product
+
+CART_PREFIX = 'cart'
+CART_TOKEN_HEADER = 'X-Cart-Token'
+CART_TOKEN_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class DatabaseCartStore:
+    """
+    Хранилище корзин в таблицах Cart и CartItem (по умолчанию).
+    Каждое изменение атомарно: добавление блокирует строку корзины,
+    как и оформление заказа, поэтому параллельные добавления
+    и оформление выполняются по очереди, а остальные изменения —
+    одиночные UPDATE и DELETE. Каждое изменение обновляет
+    ``Cart.updated_at``.
+
+    Другое хранилище подключается настройкой CART_STORE и должно
+    реализовать те же методы; каждый принимает CartService.
+    """
+
+    def check(self):
+        pass
+
+    @staticmethod
+    def _lookup(cart):
+        if cart.user_id is not None:
+            return {'user_id': cart.user_id}
+        return {'token': cart.token}
+
+    def _items(self, cart):
+        if cart.user_id is not None:
+            return CartItem.objects.filter(cart__user_id=cart.user_id)
+        return CartItem.objects.filter(cart__token=cart.token)
+
+    def _touch(self, cart):
+        Cart.objects.filter(**self._lookup(cart)).update(
+            updated_at=timezone.now()
+        )
+
+    def get(self, cart):
+        return dict(
+            self._items(cart).order_by('id')
+            .values_list('product_id', 'quantity')
+        )
+
+    def _lock(self, cart):
+        row, _ = Cart.objects.select_for_update().get_or_create(
+            **self._lookup(cart)
+        )
+        return row
+
+    def _add(self, row, items):
+        Cart.objects.filter(pk=row.pk).update(updated_at=timezone.now())
+        for product_id, quantity in items.items():
+            if not CartItem.objects.filter(
+                cart=row, product_id=product_id
+            ).update(quantity=F('quantity') + quantity):
+                CartItem.objects.create(
+                    cart=row, product_id=product_id, quantity=quantity
+                )
+
+    def add(self, cart, product_id, quantity):
+        with transaction.atomic():
+            self._add(self._lock(cart), {product_id: quantity})
+
+    def set_quantity(self, cart, product_id, quantity):
+        if not self._items(cart).filter(
+            product_id=product_id
+        ).update(quantity=quantity):
+            return False
+        self._touch(cart)
+        return True
+
+    def remove(self, cart, product_ids):
+        self._items(cart).filter(product_id__in=product_ids).delete()
+        self._touch(cart)
+
+    def clear(self, cart):
+        self._items(cart).delete()
+        self._touch(cart)
+
+    def merge(self, cart, other):
+        with transaction.atomic():
+            source = Cart.objects.select_for_update().filter(
+                token=other.token
+            ).first()
+            if source is None:
+                return
+            items = dict(
+                source.items.values_list('product_id', 'quantity')
+            )
+            if items:
+                self._add(self._lock(cart), items)
+            source.delete()
+
+    def remove_ordered(self, cart, quantities):
+        """
+        Вызывается при оформлении заказа под блокировкой строки
+        корзины, поэтому в корзине нет ничего, кроме заказанного.
+        """
+        self._items(cart).delete()
+
+
+class CacheCartStore:
+    """
+    Хранилище корзин в общем кеше Django (RedisCache или
+    совместимый сервер), подключается настройкой CART_STORE.
+    Корзина хранится одним значением ``{product_id: quantity}``,
+    каждое изменение выполняется под блокировкой корзины в кеше.
+
+    Изменения корзины пользователя записываются в таблицы Cart
+    и CartItem отложенно задачей persist_cart: несколько изменений
+    за CART_PERSIST_DELAY секунд записываются одной задачей. Если
+    корзины нет в кеше, она загружается из таблиц. Анонимные
+    корзины живут только в кеше.
+    """
+    lock_timeout = 5
+
+    def check(self):
+        """
+        Кеш должен быть общим для всех процессов, а задачи Celery —
+        выполняться воркером, иначе корзины теряются между
+        процессами, а каждое изменение записывается в БД сразу.
+        """
+        backend = settings.CACHES['default']['BACKEND']
+        if backend.rsplit('.', 1)[-1] in ('LocMemCache', 'DummyCache'):
+            raise ImproperlyConfigured(
+                'CacheCartStore requires a shared cache backend, '
+                f'not {backend}.'
+            )
+        if settings.CELERY_TASK_ALWAYS_EAGER:
+            raise ImproperlyConfigured(
+                'CacheCartStore requires a Celery broker; '
+                'CELERY_TASK_ALWAYS_EAGER is set.'
+            )
+
+    @contextmanager
+    def _locked(self, cart):
+        lock_key = f'{cart.key}:lock'
+        # Блокировка истекает сама, если ее владелец упал.
+        while not cache.add(lock_key, 1, self.lock_timeout):
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+
+    def _load(self, cart):
+        if cart.user_id is None:
+            return {}
+        return dict(
+            CartItem.objects.filter(cart__user_id=cart.user_id)
+            .order_by('id').values_list('product_id', 'quantity')
+        )
+
+    def get(self, cart):
+        items = cache.get(cart.key)
+        if items is None:
+            items = self._load(cart)
+            # add, а не set: параллельное изменение, успевшее
+            # сохранить корзину, не перезаписывается данными из БД.
+            if not cache.add(cart.key, items, cart.timeout):
+                items = cache.get(cart.key, items)
+        return items
+
+    def _save(self, cart, items):
+        cache.set(cart.key, items, cart.timeout)
+        if cart.user_id is not None and cache.add(
+            f'{cart.key}:dirty', 1, settings.CART_PERSIST_DELAY + 60
+        ):
+            tasks.persist_cart.apply_async(
+                args=[cart.user_id], countdown=settings.CART_PERSIST_DELAY
+            )
+
+    @contextmanager
+    def _changing(self, cart):
+        """
+        Содержимое корзины для изменения под блокировкой;
+        сохраняется, если изменилось.
+        """
+        with self._locked(cart):
+            items = self.get(cart)
+            before = dict(items)
+            yield items
+            if items != before:
+                self._save(cart, items)
+
+    def add(self, cart, product_id, quantity):
+        with self._changing(cart) as items:
+            items[product_id] = items.get(product_id, 0) + quantity
+
+    def set_quantity(self, cart, product_id, quantity):
+        with self._changing(cart) as items:
+            if product_id not in items:
+                return False
+            items[product_id] = quantity
+        return True
+
+    def remove(self, cart, product_ids):
+        with self._changing(cart) as items:
+            for product_id in product_ids:
+                items.pop(product_id, None)
+
+    def clear(self, cart):
+        with self._changing(cart) as items:
+            items.clear()
+
+    def merge(self, cart, other):
+        with self._locked(other):
+            other_items = cache.get(other.key)
+            cache.delete(other.key)
+        if other_items:
+            with self._changing(cart) as items:
+                for product_id, quantity in other_items.items():
+                    items[product_id] = items.get(product_id, 0) + quantity
+
+    def remove_ordered(self, cart, quantities):
+        """
+        Вычитает заказанные количества после фиксации заказа:
+        товары, добавленные во время оформления, остаются в корзине,
+        а при откате корзина не меняется.
+        """
+        CartItem.objects.filter(cart__user_id=cart.user_id).delete()
+
+        def subtract():
+            with self._changing(cart) as items:
+                for product_id, quantity in quantities.items():
+                    left = items.get(product_id, 0) - quantity
+                    if left > 0:
+                        items[product_id] = left
+                    else:
+                        items.pop(product_id, None)
+
+        transaction.on_commit(subtract)
+
+
+def get_cart_store():
+    return import_string(settings.CART_STORE)()
+
+
+def user_cart_key(user_id):
+    return f'{CART_PREFIX}:user:{user_id}'
+
+
+def anonymous_cart_key(token):
+    return f'{CART_PREFIX}:anonymous:{token}'
+
+
+def get_cart_token(request):
+    """
+    Токен анонимной корзины из заголовка X-Cart-Token или None,
+    если заголовка нет или токен некорректен.
+    """
+    token = request.headers.get(CART_TOKEN_HEADER, '')
+    return token if CART_TOKEN_RE.fullmatch(token) else None
+
+
+class CartService:
+    """
+    Корзина пользователя (``user_id``) или анонимная корзина
+    (``token``) в хранилище CART_STORE. Анонимные корзины
+    переносятся в корзину пользователя при входе.
+    """
+
+    def __init__(self, user_id=None, token=None, store=None):
+        self.user_id = user_id
+        self.token = token
+        self.store = store or get_cart_store()
+        if user_id is not None:
+            self.key = user_cart_key(user_id)
+            self.timeout = settings.CART_TIMEOUT
+        else:
+            self.key = anonymous_cart_key(token)
+            self.timeout = settings.CART_ANONYMOUS_TIMEOUT
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Корзина текущего пользователя или анонимная корзина по токену
+        из запроса; без токена создается новый.
+        """
+        if request.user and request.user.is_authenticated:
+            return cls(user_id=request.user.id)
+        return cls(token=get_cart_token(request) or uuid.uuid4().hex)
+
+    def get_items(self):
+        """Содержимое корзины: ``{product_id: quantity}``."""
+        return self.store.get(self)
+
+    def add(self, product_id, quantity):
+        """Добавляет товар или увеличивает его количество."""
+        self.store.add(self, product_id, quantity)
+
+    def set_quantity(self, product_id, quantity):
+        """
+        Устанавливает количество товара. Возвращает False, если
+        товара нет в корзине.
+        """
+        return self.store.set_quantity(self, product_id, quantity)
+
+    def remove(self, *product_ids):
+        self.store.remove(self, product_ids)
+
+    def clear(self):
+        self.store.clear(self)
+
+    def merge_from(self, other):
+        """
+        Переносит в корзину товары анонимной корзины ``other``,
+        складывая количества, и удаляет ``other``.
+        """
+        self.store.merge(self, other)
+
+    def remove_ordered(self, quantities):
+        """
+        Убирает из корзины заказанные товары; вызывается в транзакции
+        оформления заказа.
+        """
+        self.store.remove_ordered(self, quantities)
+
+    def describe(self):
+        """
+        Позиции корзины с ценами и остатками, проверенные одним
+        запросом к продуктам. Удаленные продукты убираются из
+        корзины, в ``unavailable`` перечисляются продукты, остатка
+        которых не хватает.
+        """
+        items = self.get_items()
+        products = {
+            product['id']: product
+            for product in Product.objects.filter(pk__in=items).values(
+                'id', 'name', 'effective_price', 'stock'
+            )
+        }
+        missing = [
+            product_id for product_id in items if product_id not in products
+        ]
+        if missing:
+            self.remove(*missing)
+        rows = []
+        unavailable = []
+        total_price = 0
+        for product_id, quantity in items.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            rows.append({
+                'product': product_id,
+                'name': product['name'],
+                'price': str(product['effective_price']),
+                'stock': product['stock'],
+                'quantity': quantity,
+            })
+            total_price += product['effective_price'] * quantity
+            if product['stock'] < quantity:
+                unavailable.append(product_id)
+        return {
+            'items': rows,
+            'total_price': str(total_price),
+            'unavailable': unavailable,
+        }
+
+
+def merge_anonymous_cart(token, user_id):
+    """
+    Переносит анонимную корзину с токеном ``token`` в корзину
+    пользователя при входе.
+    """
+    store = get_cart_store()
+    CartService(user_id=user_id, store=store).merge_from(
+        CartService(token=token, store=store)
+    )
+
+
+def prune_anonymous_carts():
+    """
+    Удаляет из БД анонимные корзины, которые не менялись дольше
+    CART_ANONYMOUS_TIMEOUT. Возвращает число удаленных корзин.
+    """
+    _, deleted = Cart.objects.filter(
+        user__isnull=True,
+        updated_at__lt=timezone.now() - timedelta(
+            seconds=settings.CART_ANONYMOUS_TIMEOUT
+        ),
+    ).delete()
+    return deleted.get(Cart._meta.label, 0)
+
+
+def persist_cart(user_id):
+    """
+    Записывает корзину пользователя из CacheCartStore в таблицы Cart
+    и CartItem. Строка корзины блокируется, поэтому параллельные
+    записи выполняются по очереди и каждая записывает актуальное
+    содержимое. Если корзины в хранилище нет (истекла или
+    вытеснена), таблицы не меняются.
+    """
+    key = user_cart_key(user_id)
+    # Пометка снимается до чтения корзины: изменение после чтения
+    # запланирует новую запись.
+    cache.delete(f'{key}:dirty')
+    with transaction.atomic():
+        cart, _ = Cart.objects.select_for_update().get_or_create(
+            user_id=user_id
+        )
+        items = cache.get(key)
+        if items is None:
+            return
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+        existing = {
+            product_id: (pk, quantity)
+            for pk, product_id, quantity in cart.items.values_list(
+                'pk', 'product_id', 'quantity'
+            )
+        }
+        CartItem.objects.filter(pk__in=[
+            pk for product_id, (pk, _) in existing.items()
+            if product_id not in items
+        ]).delete()
+        CartItem.objects.bulk_update([
+            CartItem(pk=pk, quantity=items[product_id])
+            for product_id, (pk, quantity) in existing.items()
+            if product_id in items and items[product_id] != quantity
+        ], ['quantity'])
+        new_ids = [
+            product_id for product_id in items if product_id not in existing
+        ]
+        if new_ids:
+            product_ids = set(
+                Product.objects.filter(pk__in=new_ids)
+                .values_list('pk', flat=True)
+            )
+            CartItem.objects.bulk_create([
+                CartItem(
+                    cart=cart, product_id=product_id,
+                    quantity=items[product_id],
+                )
+                for product_id in new_ids if product_id in product_ids
+            ])
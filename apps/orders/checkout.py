@@ -0,0 +1,106 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from .carts import CartService
+from .models import Cart, Order, OrderItem
+from apps.products.cache import invalidate_products
+from apps.products.facets import apply_stock_transitions
+from apps.products.models import Product
+from apps.products.stats import adjust_total_stock
+from apps.products.versions import bump_catalog_version
+
+
+class CheckoutError(Exception):
+    """
+    Оформление заказа невозможно. ``products`` — id продуктов,
+    из-за которых оно не удалось.
+    """
+
+    def __init__(self, message, products=None):
+        super().__init__(message)
+        self.message = message
+        self.products = products or []
+
+
+def get_unit_price(product):
+    """Цена, по которой продается продукт."""
+    if product.discount_price is not None:
+        return product.discount_price
+    return product.regular_price
+
+
+def checkout(user_id):
+    """
+    Оформляет заказ из корзины пользователя в одной транзакции.
+    Принимает id пользователя, поэтому не требует загрузки
+    пользователя из БД.
+
+    Позиции читаются из хранилища корзин (см. CartService).
+    Строка корзины блокируется, чтобы один и тот же заказ нельзя
+    было оформить дважды и чтобы добавления в корзину ждали
+    фиксации; заказанные товары убираются из корзины вместе
+    с ней. Строки
+    продуктов блокируются в порядке id, поэтому параллельные
+    оформления не взаимоблокируются, а остаток
+    списывается условным ``UPDATE ... SET stock = stock - n
+    WHERE stock >= n``, что исключает продажу сверх остатка.
+    При нехватке любого продукта транзакция откатывается целиком.
+    """
+    with transaction.atomic():
+        Cart.objects.select_for_update().get_or_create(user_id=user_id)
+        service = CartService(user_id=user_id)
+        quantities = Counter(service.get_items())
+        if not quantities:
+            raise CheckoutError('Cart is empty.')
+
+        product_ids = sorted(quantities)
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update().filter(
+                pk__in=product_ids
+            ).order_by('pk')
+        }
+
+        out_of_stock = []
+        for product_id in product_ids:
+            updated = Product.objects.filter(
+                pk=product_id, stock__gte=quantities[product_id]
+            ).update(
+                stock=F('stock') - quantities[product_id],
+                stock_version=F('stock_version') + 1,
+            )
+            if not updated:
+                out_of_stock.append(product_id)
+        if out_of_stock:
+            raise CheckoutError('Not enough stock.', out_of_stock)
+
+        items = [
+            OrderItem(
+                product_id=product_id,
+                quantity=quantities[product_id],
+                price=get_unit_price(products[product_id]),
+            )
+            for product_id in product_ids
+        ]
+        order = Order.objects.create(
+            user_id=user_id,
+            total_price=sum(item.price * item.quantity for item in items),
+        )
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+
+        service.remove_ordered(quantities)
+        adjust_total_stock(-sum(quantities.values()))
+        apply_stock_transitions({
+            product_id: (
+                products[product_id].stock,
+                products[product_id].stock - quantities[product_id],
+            )
+            for product_id in product_ids
+        })
+        bump_catalog_version()
+        invalidate_products(product_ids)
+    return order
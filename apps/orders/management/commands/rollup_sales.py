@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.orders.rollups import rollup_sales
+
+
+class Command(BaseCommand):
+    help = (
+        'Учитывает новые оплаченные заказы в часовых и дневных роллапах '
+        'продаж.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать роллапы по всем заказам с нуля'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        processed = rollup_sales(
+            batch_size=options['batch_size'], rebuild=options['rebuild']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Orders rolled up: {processed}'
+        ))
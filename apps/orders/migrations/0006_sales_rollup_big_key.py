@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_cart_token'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='salesrollup',
+            name='key',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_rolled_up_orders(apps, schema_editor):
+    # Заказы до старой позиции уже учтены в роллапах.
+    SalesRollupState = apps.get_model('orders', 'SalesRollupState')
+    Order = apps.get_model('orders', 'Order')
+    state = SalesRollupState.objects.first()
+    if state is not None:
+        Order.objects.filter(id__lte=state.last_order_id).update(
+            is_rolled_up=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_sales_rollup_big_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='is_rolled_up',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(
+            mark_rolled_up_orders, migrations.RunPython.noop
+        ),
+        migrations.RemoveField(
+            model_name='salesrollupstate',
+            name='last_order_id',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_paid', True), ('is_rolled_up', False)), fields=['id'], name='order_rollup_pending_idx'),
+        ),
+    ]
@@ -1,13 +1,47 @@
+from django.conf import settings
 from django.db import models
-from django.contrib.auth.models import User
-from products.models import Product
+
+from apps.products.models import Product
 
 
 class Cart(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    """
+    Корзина пользователя или анонимная корзина с токеном
+    ``token`` (заголовок X-Cart-Token). ``updated_at`` — время
+    последнего изменения содержимого; по нему удаляются забытые
+    анонимные корзины.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        null=True, blank=True
+    )
+    token = models.CharField(
+        max_length=32, unique=True, null=True, blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(user__isnull=True),
+                name='cart_anonymous_updated_idx'
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(user__isnull=False, token__isnull=True)
+                    | models.Q(user__isnull=True, token__isnull=False)
+                ),
+                name='cart_user_or_token'
+            )
+        ]
 
     def __str__(self):
+        if self.user_id is None:
+            return f'Cart(anonymous {self.token})'
         return f'Cart({self.user.username})'
 
 
@@ -20,15 +54,44 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product'], name='unique_cart_product'
+            )
+        ]
+
     def __str__(self):
         return f'{self.product.name} x {self.quantity}'
 
 
 class Order(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     is_paid = models.BooleanField(default=False)
+    # Оплаченный заказ уже учтен в SalesRollup.
+    is_rolled_up = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at'], name='order_user_created_idx'
+            ),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(is_paid=False),
+                name='order_unpaid_created_idx'
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(is_paid=True, is_rolled_up=False),
+                name='order_rollup_pending_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Order({self.user.username}) - {self.total_price}'
@@ -46,3 +109,60 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f'{self.product.name} x {self.quantity} @ {self.price}'
+
+
+class SalesRollup(models.Model):
+    """
+    Продажи за час или день: общий итог (``dimension=total``,
+    ``key=0``), по продукту или по категории (``key`` — их id).
+    Заполняется инкрементально командой rollup_sales или задачей
+    Celery; отчеты о продажах читают только эту таблицу.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+    TOTAL = 'total'
+    PRODUCT = 'product'
+    CATEGORY = 'category'
+    DIMENSION_CHOICES = [
+        (TOTAL, 'Total'), (PRODUCT, 'Product'), (CATEGORY, 'Category'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    dimension = models.CharField(max_length=8, choices=DIMENSION_CHOICES)
+    period_start = models.DateTimeField()
+    key = models.PositiveBigIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'dimension', 'period_start', 'key'],
+                name='unique_sales_rollup'
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'SalesRollup({self.period} {self.period_start} '
+            f'{self.dimension}={self.key}: {self.revenue})'
+        )
+
+
+class SalesRollupState(models.Model):
+    """
+    Состояние заполнения SalesRollup: время последнего обновления.
+    Хранится одной строкой, которую блокирует каждый запуск,
+    поэтому запуски не выполняются параллельно.
+    """
+    SINGLETON_ID = 1
+
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'SalesRollupState({self.updated_at})'
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import CartItem, Order, OrderItem, SalesRollup
+from apps.products.models import Product
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор добавляемого в корзину товара.
+    """
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.all()
+    )
+
+    class Meta:
+        model = CartItem
+        fields = ['product', 'quantity']
+
+    def validate_quantity(self, value):
+        """Проверка, что количество больше нуля"""
+        if value < 1:
+            raise serializers.ValidationError(
+                "Quantity must be greater than zero."
+            )
+        return value
+
+
+class CartItemQuantitySerializer(serializers.Serializer):
+    """
+    Сериализатор изменения количества товара в корзине.
+    """
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'name', 'quantity', 'price']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'created_at', 'total_price', 'is_paid', 'items']
+
+
+class SalesReportParamsSerializer(serializers.Serializer):
+    """
+    Параметры отчета о продажах: ``period`` роллапов и интервал
+    ``[start, end)``. Даты без времени означают начало дня.
+    """
+    DATETIME_FORMATS = ['iso-8601', '%Y-%m-%d']
+    DEFAULT_RANGES = {
+        SalesRollup.HOUR: timedelta(days=2),
+        SalesRollup.DAY: timedelta(days=30),
+    }
+    MAX_RANGES = {
+        SalesRollup.HOUR: timedelta(days=31),
+        SalesRollup.DAY: timedelta(days=3 * 366),
+    }
+
+    period = serializers.ChoiceField(
+        choices=SalesRollup.PERIOD_CHOICES, default=SalesRollup.DAY
+    )
+    start = serializers.DateTimeField(
+        required=False, input_formats=DATETIME_FORMATS
+    )
+    end = serializers.DateTimeField(
+        required=False, input_formats=DATETIME_FORMATS
+    )
+
+    def validate(self, data):
+        """Проверка интервала и подстановка значений по умолчанию"""
+        period = data['period']
+        end = data.get('end') or timezone.now()
+        start = data.get('start') or end - self.DEFAULT_RANGES[period]
+        if start >= end:
+            raise serializers.ValidationError(
+                "Start must be earlier than end."
+            )
+        if end - start > self.MAX_RANGES[period]:
+            raise serializers.ValidationError(
+                f"Range is too long for {period} period."
+            )
+        return {'period': period, 'start': start, 'end': end}
+
+
+class SalesRollupSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = SalesRollup
+        fields = ['period_start', 'order_count', 'quantity', 'revenue']
+
+
+class SalesTopSerializer(serializers.Serializer):
+    """
+    Продажи продукта или категории за интервал отчета.
+    """
+    id = serializers.IntegerField(source='key')
+    name = serializers.CharField(allow_null=True)
+    order_count = serializers.IntegerField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
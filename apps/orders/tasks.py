@@ -0,0 +1,35 @@
+import logging
+
+from celery import shared_task
+
+from . import carts, rollups
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def rollup_sales():
+    """
+    Периодически учитывает новые оплаченные заказы в роллапах продаж.
+    """
+    processed = rollups.rollup_sales()
+    logger.info(f'Orders rolled up: {processed}')
+    return processed
+
+
+@shared_task
+def persist_cart(user_id):
+    """
+    Отложенно записывает корзину пользователя из хранилища в БД.
+    """
+    carts.persist_cart(user_id)
+
+
+@shared_task
+def prune_anonymous_carts():
+    """
+    Периодически удаляет устаревшие анонимные корзины.
+    """
+    deleted = carts.prune_anonymous_carts()
+    logger.info(f'Anonymous carts pruned: {deleted}')
+    return deleted
@@ -0,0 +1,632 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from . import tasks
+from .carts import (
+    CacheCartStore, CartService, DatabaseCartStore, persist_cart,
+    prune_anonymous_carts,
+)
+from .checkout import CheckoutError, checkout
+from .models import (
+    Cart, CartItem, Order, OrderItem, SalesRollup, SalesRollupState,
+)
+from .rollups import rollup_sales
+from apps.products.facets import get_facets
+from apps.products.models import Category, Product, ProductStats
+from apps.products.stats import rebuild_product_stats
+from apps.users.models import User
+
+
+def create_user(name):
+    return User.objects.create_user(
+        username=name,
+        email=f'{name}@example.com',
+        password='userpassword123',
+        role=User.USER,
+        is_email_verified=True
+    )
+
+
+def create_product(name, stock, price='100.00', discount_price=None):
+    return Product.objects.create(
+        name=name,
+        regular_price=price,
+        discount_price=discount_price,
+        stock=stock,
+        description=name
+    )
+
+
+class CartTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user('buyer')
+        self.client.force_authenticate(user=self.user)
+        self.laptop = create_product('Laptop', 5, '1000.00', '900.00')
+        self.mouse = create_product('Mouse', 10, '20.00')
+        rebuild_product_stats()
+
+    def _add(self, product, quantity):
+        return self.client.post(
+            reverse('cart-items'),
+            {'product': product.pk, 'quantity': quantity},
+            format='json'
+        )
+
+    def test_add_to_cart(self):
+        """
+        Тестирует добавление товаров в корзину.
+        Повторное добавление увеличивает количество.
+        """
+        self._add(self.laptop, 1)
+        self._add(self.mouse, 2)
+        response = self._add(self.laptop, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [(item['product'], item['quantity'])
+             for item in response.data['items']],
+            [(self.laptop.pk, 2), (self.mouse.pk, 2)]
+        )
+        self.assertEqual(response.data['total_price'], '1840.00')
+
+    def test_update_and_remove_cart_item(self):
+        """Тестирует изменение количества и удаление товара."""
+        self._add(self.mouse, 1)
+        url = reverse(
+            'cart-item-detail', kwargs={'product_id': self.mouse.pk}
+        )
+        response = self.client.patch(url, {'quantity': 5}, format='json')
+        self.assertEqual(response.data['items'][0]['quantity'], 5)
+        response = self.client.delete(url)
+        self.assertEqual(response.data['items'], [])
+
+    def test_checkout(self):
+        """
+        Тестирует оформление заказа: создается заказ по ценам со
+        скидкой, списываются остатки и очищается корзина.
+        """
+        self._add(self.laptop, 2)
+        self._add(self.mouse, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_price'], '1860.00')
+        self.assertEqual(len(response.data['items']), 2)
+        self.laptop.refresh_from_db()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.laptop.stock, 3)
+        self.assertEqual(self.mouse.stock, 7)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(ProductStats.objects.get().total_stock, 10)
+
+    def test_checkout_updates_facets(self):
+        """
+        Проданный целиком продукт перестает учитываться в фасетах
+        как имеющийся в наличии.
+        """
+        self._add(self.laptop, 5)
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(get_facets(), get_facets(Product.objects.all()))
+
+    def test_checkout_not_enough_stock(self):
+        """
+        Тестирует, что при нехватке остатка заказ не создается
+        и остатки других товаров не меняются.
+        """
+        self._add(self.mouse, 1)
+        self._add(self.laptop, 6)
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['products'], [self.laptop.pk])
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_checkout_empty_cart(self):
+        """Тестирует оформление заказа с пустой корзиной."""
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Cart is empty.')
+
+
+class CartServiceTests(APITestCase):
+    """
+    Корзины в горячем хранилище: анонимные корзины, перенос при
+    входе, отложенная запись в таблицы и проверка позиций.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('buyer')
+        self.laptop = create_product('Laptop', 5, '1000.00', '900.00')
+        self.mouse = create_product('Mouse', 10, '20.00')
+
+    def _add(self, product, quantity, token=None):
+        headers = {'HTTP_X_CART_TOKEN': token} if token else {}
+        return self.client.post(
+            reverse('cart-items'),
+            {'product': product.pk, 'quantity': quantity},
+            format='json', **headers
+        )
+
+    def test_anonymous_cart(self):
+        """
+        Анонимная корзина выдается с токеном и хранится отдельно
+        от корзин пользователей.
+        """
+        response = self._add(self.laptop, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        token = response['X-Cart-Token']
+        self._add(self.mouse, 2, token)
+        response = self.client.get(reverse('cart'), HTTP_X_CART_TOKEN=token)
+        self.assertEqual(
+            [(item['product'], item['quantity'])
+             for item in response.data['items']],
+            [(self.laptop.pk, 1), (self.mouse.pk, 2)]
+        )
+        self.assertEqual(
+            list(Cart.objects.values_list('user_id', 'token')),
+            [(None, token)]
+        )
+        response = self.client.get(reverse('cart'))
+        self.assertNotEqual(response['X-Cart-Token'], token)
+        self.assertEqual(response.data['items'], [])
+
+    def test_merge_on_login(self):
+        """
+        При входе анонимная корзина складывается с корзиной
+        пользователя и удаляется.
+        """
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.laptop, quantity=1)
+        token = self._add(self.laptop, 2)['X-Cart-Token']
+        self._add(self.mouse, 1, token)
+        response = self.client.post(reverse('login'), {
+            'email': self.user.email, 'password': 'userpassword123',
+        }, format='json', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            dict(cart.items.values_list('product_id', 'quantity')),
+            {self.laptop.pk: 3, self.mouse.pk: 1}
+        )
+        response = self.client.get(reverse('cart'), HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.data['items'], [])
+
+    def test_prune_by_last_change(self):
+        """
+        Анонимная корзина удаляется, если не менялась дольше
+        CART_ANONYMOUS_TIMEOUT, а не через этот срок после создания.
+        """
+        self._add(self.laptop, 1)
+        active = self._add(self.laptop, 1)['X-Cart-Token']
+        long_ago = timezone.now() - timedelta(
+            seconds=settings.CART_ANONYMOUS_TIMEOUT + 60
+        )
+        Cart.objects.update(created_at=long_ago, updated_at=long_ago)
+        self._add(self.mouse, 1, active)
+        self.assertEqual(prune_anonymous_carts(), 1)
+        self.assertEqual(
+            list(Cart.objects.values_list('token', flat=True)), [active]
+        )
+
+    @override_settings(CART_STORE='apps.orders.carts.CacheCartStore')
+    def test_write_behind(self):
+        """
+        Изменения корзины в кеше записываются в таблицы одной
+        отложенной задачей; без корзины в кеше она читается из таблиц.
+        """
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.object(
+            tasks.persist_cart, 'apply_async'
+        ) as apply_async:
+            self._add(self.laptop, 1)
+            self._add(self.mouse, 2)
+            self.client.delete(reverse(
+                'cart-item-detail', kwargs={'product_id': self.laptop.pk}
+            ))
+        apply_async.assert_called_once_with(
+            args=[self.user.pk], countdown=settings.CART_PERSIST_DELAY
+        )
+        self.assertFalse(CartItem.objects.exists())
+
+        persist_cart(self.user.pk)
+        self.assertEqual(
+            list(CartItem.objects.values_list('product_id', 'quantity')),
+            [(self.mouse.pk, 2)]
+        )
+        cache.clear()
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(
+            [(item['product'], item['quantity'])
+             for item in response.data['items']],
+            [(self.mouse.pk, 2)]
+        )
+
+    def test_cache_store_requires_shared_cache(self):
+        """
+        Хранилище в кеше не запускается на кеше одного процесса
+        или без брокера Celery.
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            CacheCartStore().check()
+        redis = {'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        }}
+        with override_settings(CACHES=redis, CELERY_TASK_ALWAYS_EAGER=True):
+            with self.assertRaises(ImproperlyConfigured):
+                CacheCartStore().check()
+        with override_settings(CACHES=redis, CELERY_TASK_ALWAYS_EAGER=False):
+            CacheCartStore().check()
+
+    def test_cart_validation(self):
+        """
+        Цены и остатки позиций проверяются одним запросом, удаленные
+        продукты убираются из корзины.
+        """
+        self.client.force_authenticate(user=self.user)
+        self._add(self.laptop, 6)
+        self._add(self.mouse, 1)
+        gone = create_product('Gone', 1)
+        self._add(gone, 1)
+        gone.delete()
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(
+            [item['product'] for item in response.data['items']],
+            [self.laptop.pk, self.mouse.pk]
+        )
+        self.assertEqual(response.data['unavailable'], [self.laptop.pk])
+        self.assertEqual(response.data['total_price'], '5420.00')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('cart'))
+
+
+def create_order(user, created_at, *items, is_paid=True):
+    """
+    Заказ с позициями ``(product, quantity, price)`` и заданным
+    временем создания.
+    """
+    order = Order.objects.create(
+        user=user,
+        total_price=sum(
+            Decimal(price) * quantity for _, quantity, price in items
+        ),
+        is_paid=is_paid,
+    )
+    Order.objects.filter(pk=order.pk).update(created_at=created_at)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product=product, quantity=quantity, price=price
+        )
+        for product, quantity, price in items
+    ])
+    return order
+
+
+class OrderHistoryTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user('buyer')
+        self.client.force_authenticate(user=self.user)
+        self.laptop = create_product('Laptop', 5, '1000.00')
+        start = timezone.now() - timedelta(days=30)
+        self.orders = [
+            create_order(
+                self.user, start + timedelta(hours=number),
+                (self.laptop, 1, '1000.00')
+            )
+            for number in range(12)
+        ]
+        create_order(
+            create_user('other'), start, (self.laptop, 1, '1000.00')
+        )
+
+    def test_order_history(self):
+        """
+        Тестирует историю заказов: только свои заказы, новые первыми,
+        курсорная пагинация.
+        """
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [order['id'] for order in response.data['results']]
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(
+            response.data['results'][0]['items'][0]['name'], 'Laptop'
+        )
+        response = self.client.get(response.data['next'])
+        ids += [order['id'] for order in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(
+            ids, [order.pk for order in reversed(self.orders)]
+        )
+
+    def test_order_history_queries(self):
+        with self.assertNumQueries(3):
+            self.client.get(reverse('order-list'))
+
+
+class SalesRollupTests(APITestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.employee = User.objects.create_user(
+            username='employee',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.employee)
+        self.user = create_user('buyer')
+        self.electronics = Category.objects.create(name='Electronics')
+        self.laptop = create_product('Laptop', 50, '1000.00')
+        self.mouse = create_product('Mouse', 50, '20.00')
+        self.laptop.categories.add(self.electronics)
+        self.mouse.categories.add(self.electronics)
+        self.day = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) - timedelta(days=2)
+        create_order(
+            self.user, self.day + timedelta(hours=9, minutes=5),
+            (self.laptop, 1, '900.00'), (self.mouse, 2, '20.00')
+        )
+        create_order(
+            self.user, self.day + timedelta(hours=9, minutes=40),
+            (self.mouse, 3, '20.00')
+        )
+        create_order(
+            self.user, self.day + timedelta(hours=15),
+            (self.laptop, 2, '1000.00')
+        )
+
+    def _rollup(self, period, dimension, start, key=0):
+        rollup = SalesRollup.objects.get(
+            period=period, dimension=dimension, period_start=start, key=key
+        )
+        return rollup.order_count, rollup.quantity, rollup.revenue
+
+    def test_rollup_sales(self):
+        self.assertEqual(rollup_sales(batch_size=2), 3)
+        nine = self.day + timedelta(hours=9)
+        self.assertEqual(
+            self._rollup(SalesRollup.HOUR, SalesRollup.TOTAL, nine),
+            (2, 6, Decimal('1000.00'))
+        )
+        self.assertEqual(
+            self._rollup(SalesRollup.DAY, SalesRollup.TOTAL, self.day),
+            (3, 8, Decimal('3000.00'))
+        )
+        self.assertEqual(
+            self._rollup(
+                SalesRollup.DAY, SalesRollup.PRODUCT, self.day, self.mouse.pk
+            ),
+            (2, 5, Decimal('100.00'))
+        )
+        self.assertEqual(
+            self._rollup(
+                SalesRollup.DAY, SalesRollup.CATEGORY, self.day,
+                self.electronics.pk
+            ),
+            (3, 8, Decimal('3000.00'))
+        )
+
+    def test_incremental_rollup(self):
+        """
+        Неоплаченный заказ не учитывается, пока его не оплатят,
+        даже если после него уже учтены заказы с большими id.
+        """
+        rollup_sales()
+        unpaid = create_order(
+            self.user, self.day + timedelta(hours=15, minutes=30),
+            (self.mouse, 1, '20.00'), is_paid=False
+        )
+        create_order(self.user, self.day, (self.mouse, 2, '20.00'))
+        self.assertEqual(rollup_sales(), 1)
+        self.assertEqual(
+            self._rollup(SalesRollup.DAY, SalesRollup.TOTAL, self.day),
+            (4, 10, Decimal('3040.00'))
+        )
+        Order.objects.filter(pk=unpaid.pk).update(is_paid=True)
+        self.assertEqual(rollup_sales(), 1)
+        self.assertEqual(rollup_sales(), 0)
+        self.assertEqual(
+            self._rollup(SalesRollup.DAY, SalesRollup.TOTAL, self.day),
+            (5, 11, Decimal('3060.00'))
+        )
+        self.assertIsNotNone(SalesRollupState.objects.get().updated_at)
+        self.assertEqual(rollup_sales(rebuild=True), 5)
+        self.assertEqual(
+            self._rollup(SalesRollup.DAY, SalesRollup.TOTAL, self.day),
+            (5, 11, Decimal('3060.00'))
+        )
+
+    def test_rollup_command(self):
+        out = StringIO()
+        call_command('rollup_sales', stdout=out)
+        self.assertIn('Orders rolled up: 3', out.getvalue())
+
+    def test_sales_report(self):
+        rollup_sales()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales-report'), {
+                'period': 'hour',
+                'start': self.day.date().isoformat(),
+                'end': (self.day + timedelta(days=1)).isoformat(),
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (row['order_count'], row['revenue'])
+                for row in response.data['results']
+            ],
+            [(2, '1000.00'), (1, '2000.00')]
+        )
+        for query in queries.captured_queries:
+            self.assertNotIn('"orders_order"', query['sql'])
+            self.assertNotIn('"orders_orderitem"', query['sql'])
+
+    def test_top_reports(self):
+        rollup_sales()
+        response = self.client.get(reverse('sales-report-products'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (row['id'], row['name'], row['quantity'], row['revenue'])
+                for row in response.data['results']
+            ],
+            [
+                (self.laptop.pk, 'Laptop', 3, '2900.00'),
+                (self.mouse.pk, 'Mouse', 5, '100.00'),
+            ]
+        )
+        response = self.client.get(reverse('sales-report-categories'))
+        self.assertEqual(response.data['results'][0]['name'], 'Electronics')
+
+    def test_report_validation_and_permissions(self):
+        response = self.client.get(
+            reverse('sales-report'),
+            {'period': 'hour', 'start': '2020-01-01', 'end': '2021-01-01'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            reverse('sales-report'), {'start': 'yesterday'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('sales-report'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    """
+    Параллельные добавления в корзину не теряют друг друга
+    в обоих хранилищах.
+    """
+    threads = 2
+    adds = 10
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('buyer')
+        self.product = create_product('Mouse', 100)
+
+    def _add(self, store, barrier):
+        barrier.wait()
+        try:
+            cart = CartService(user_id=self.user.pk, store=store)
+            for _ in range(self.adds):
+                for _ in range(200):
+                    try:
+                        cart.add(self.product.pk, 1)
+                        break
+                    except OperationalError:
+                        # SQLite блокирует базу целиком; повторяем попытку.
+                        time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def _run(self, store):
+        barrier = threading.Barrier(self.threads)
+        threads = [
+            threading.Thread(target=self._add, args=(store, barrier))
+            for _ in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return CartService(user_id=self.user.pk, store=store).get_items()
+
+    def test_database_store(self):
+        items = self._run(DatabaseCartStore())
+        self.assertEqual(items, {self.product.pk: self.threads * self.adds})
+
+    def test_cache_store(self):
+        with mock.patch.object(tasks.persist_cart, 'apply_async'):
+            items = self._run(CacheCartStore())
+        self.assertEqual(items, {self.product.pk: self.threads * self.adds})
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Параллельные оформления заказов не продают больше остатка.
+    """
+    buyers = 8
+    stock = 3
+
+    def setUp(self):
+        cache.clear()
+        self.product = create_product('Limited', self.stock)
+        self.users = [create_user(f'buyer{i}') for i in range(self.buyers)]
+        for user in self.users:
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(
+                cart=cart, product=self.product, quantity=1
+            )
+
+    def _checkout(self, user, barrier, results):
+        barrier.wait()
+        try:
+            for _ in range(200):
+                try:
+                    checkout(user.pk)
+                    results.append('ok')
+                    return
+                except CheckoutError:
+                    results.append('sold out')
+                    return
+                except OperationalError:
+                    # SQLite блокирует базу целиком; повторяем попытку.
+                    time.sleep(0.01)
+            results.append('locked')
+        finally:
+            connection.close()
+
+    def test_no_overselling(self):
+        barrier = threading.Barrier(self.buyers)
+        results = []
+        threads = [
+            threading.Thread(
+                target=self._checkout, args=(user, barrier, results)
+            )
+            for user in self.users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(results.count('sold out'), self.buyers - self.stock)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(
+            sum(OrderItem.objects.values_list('quantity', flat=True)),
+            self.stock
+        )
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.assertEqual(
+            sum(Order.objects.values_list('total_price', flat=True)),
+            Decimal('100.00') * self.stock
+        )
@@ -0,0 +1,32 @@
+from django.urls import path
+
+from .models import SalesRollup
+from .views import (
+    CartItemDetailView, CartItemListView, CartView, CheckoutView,
+    OrderListView, SalesReportView, SalesTopReportView,
+)
+
+urlpatterns = [
+    path('cart/', CartView.as_view(), name='cart'),
+    path('cart/items/', CartItemListView.as_view(), name='cart-items'),
+    path(
+        'cart/items/<int:product_id>/',
+        CartItemDetailView.as_view(),
+        name='cart-item-detail'
+    ),
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('orders/', OrderListView.as_view(), name='order-list'),
+    path(
+        'reports/sales/', SalesReportView.as_view(), name='sales-report'
+    ),
+    path(
+        'reports/sales/products/',
+        SalesTopReportView.as_view(dimension=SalesRollup.PRODUCT),
+        name='sales-report-products'
+    ),
+    path(
+        'reports/sales/categories/',
+        SalesTopReportView.as_view(dimension=SalesRollup.CATEGORY),
+        name='sales-report-categories'
+    ),
+]
@@ -1,3 +1,221 @@
-from django.shortcuts import render
+from django.db.models import Sum
+from rest_framework import generics, status
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .carts import CART_TOKEN_HEADER, CartService
+from .checkout import CheckoutError, checkout
+from .models import Order, SalesRollup
+from .serializers import (
+    CartItemQuantitySerializer, CartItemSerializer, OrderSerializer,
+    SalesReportParamsSerializer, SalesRollupSerializer, SalesTopSerializer,
+)
+from apps.products.models import Category, Product
+from apps.users.permissions import (
+    IsEmailVerified, IsEmployeeOrHigher, IsUserOrHigher,
+)
+
+
+def cart_response(cart, status_code=status.HTTP_200_OK):
+    """
+    Содержимое корзины; для анонимной корзины ее токен
+    возвращается в заголовке X-Cart-Token.
+    """
+    response = Response(cart.describe(), status=status_code)
+    if cart.token is not None:
+        response[CART_TOKEN_HEADER] = cart.token
+    return response
+
+
+class CartView(APIView):
+    """
+    API-вью корзины текущего пользователя. Без аутентификации
+    используется анонимная корзина по токену из заголовка
+    X-Cart-Token.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Возвращает содержимое корзины.
+        """
+        return cart_response(CartService.for_request(request))
+
+    def delete(self, request):
+        """
+        Очищает корзину.
+        """
+        cart = CartService.for_request(request)
+        cart.clear()
+        return cart_response(cart)
+
+
+class CartItemListView(APIView):
+    """
+    API-вью для добавления товаров в корзину.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """
+        Добавляет товар в корзину или увеличивает его количество.
+        """
+        serializer = CartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = CartService.for_request(request)
+        cart.add(
+            serializer.validated_data['product'].pk,
+            serializer.validated_data['quantity'],
+        )
+        return cart_response(cart, status.HTTP_201_CREATED)
+
+
+class CartItemDetailView(APIView):
+    """
+    API-вью для изменения и удаления товара в корзине.
+    """
+    permission_classes = [AllowAny]
+
+    def patch(self, request, product_id):
+        """
+        Устанавливает количество товара в корзине.
+        """
+        serializer = CartItemQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = CartService.for_request(request)
+        if not cart.set_quantity(
+            product_id, serializer.validated_data['quantity']
+        ):
+            return Response(
+                {'message': 'Product is not in the cart'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return cart_response(cart)
+
+    def delete(self, request, product_id):
+        """
+        Удаляет товар из корзины.
+        """
+        cart = CartService.for_request(request)
+        cart.remove(product_id)
+        return cart_response(cart)
+
+
+class CheckoutView(APIView):
+    """
+    API-вью для оформления заказа из корзины.
+    Доступно пользователям с подтвержденной почтой.
+    """
+    permission_classes = [IsUserOrHigher, IsEmailVerified]
+
+    def post(self, request):
+        """
+        Оформляет заказ, списывает остатки и очищает корзину.
+        """
+        try:
+            order = checkout(request.user.id)
+        except CheckoutError as exc:
+            return Response(
+                {'message': exc.message, 'products': exc.products},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        order = Order.objects.prefetch_related('items__product').get(
+            pk=order.pk
+        )
+        return Response(
+            OrderSerializer(order).data, status=status.HTTP_201_CREATED
+        )
+
+
+class OrderHistoryPagination(CursorPagination):
+    """
+    Курсорная пагинация истории заказов: страница выбирается по
+    индексу ``(user, -created_at)`` без OFFSET на любой глубине.
+    """
+    ordering = '-created_at'
+
+
+class OrderListView(generics.ListAPIView):
+    """
+    API-вью истории заказов текущего пользователя, новые первыми.
+    """
+    permission_classes = [IsUserOrHigher]
+    serializer_class = OrderSerializer
+    pagination_class = OrderHistoryPagination
+
+    def get_queryset(self):
+        return Order.objects.filter(
+            user_id=self.request.user.id
+        ).prefetch_related('items__product')
+
+
+class SalesReportMixin:
+    """
+    Отчеты о продажах, которые читают только таблицу SalesRollup.
+    Доступны сотрудникам и администраторам.
+    """
+    permission_classes = [IsEmployeeOrHigher]
+
+    def get_rollups(self, dimension):
+        params = SalesReportParamsSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        self.params = params.validated_data
+        return SalesRollup.objects.filter(
+            period=self.params['period'],
+            dimension=dimension,
+            period_start__gte=self.params['start'],
+            period_start__lt=self.params['end'],
+        )
+
+
+class SalesReportView(SalesReportMixin, APIView):
+    """
+    API-вью выручки, числа заказов и проданных единиц по часам
+    или дням интервала.
+    """
+
+    def get(self, request):
+        rollups = self.get_rollups(SalesRollup.TOTAL).order_by(
+            'period_start'
+        )
+        return Response({
+            'period': self.params['period'],
+            'start': self.params['start'],
+            'end': self.params['end'],
+            'results': SalesRollupSerializer(rollups, many=True).data,
+        })
+
+
+class SalesTopReportView(SalesReportMixin, generics.ListAPIView):
+    """
+    API-вью продуктов или категорий (``dimension``) с наибольшей
+    выручкой за интервал, постранично.
+    """
+    serializer_class = SalesTopSerializer
+    dimension = SalesRollup.PRODUCT
+    name_models = {
+        SalesRollup.PRODUCT: Product,
+        SalesRollup.CATEGORY: Category,
+    }
+
+    def get_queryset(self):
+        return self.get_rollups(self.dimension).values('key').annotate(
+            order_count=Sum('order_count'),
+            quantity=Sum('quantity'),
+            revenue=Sum('revenue'),
+        ).order_by('-revenue', 'key')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        names = dict(
+            self.name_models[self.dimension].objects.filter(
+                pk__in=[row['key'] for row in page]
+            ).values_list('pk', 'name')
+        )
+        for row in page:
+            row['name'] = names.get(row['key'])
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
@@ -4,10 +4,10 @@ from .models import Category, Product
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'parent')
     search_fields = ('name',)
     list_filter = ('name',)
-    fields = ('name',)
+    fields = ('name', 'parent')
 
 
 @admin.register(Product)
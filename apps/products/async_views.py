@@ -0,0 +1,228 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .cache import (
+    add_validators, aget_cached_entry, aproduct_detail_key, not_modified,
+)
+from .models import Category, Product
+from .pagination import (
+    PRODUCT_ORDERING_FIELDS, AsyncProductPagination, ProductOrderingFilter,
+    ProductPriceFilter,
+)
+from .serializers import PRODUCT_READ_FIELDS, aread_products
+from .stats import aget_product_stats
+from .versions import (
+    aget_catalog_version, aproduct_validators, catalog_validators,
+)
+from mini_online_store.renderers import FastJSONRenderer
+
+
+class AsyncAPIView(View):
+    """
+    Базовое async-вью для чтения под ASGI.
+
+    DRF не поддерживает async-вью, поэтому аутентификация, проверка
+    разрешений, обработка ошибок и рендеринг JSON выполняются здесь
+    теми же классами DRF. Аутентификаторы с ``aauthenticate``
+    вызываются в событийном цикле, остальные — через ``sync_to_async``.
+    """
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    renderer_class = FastJSONRenderer
+    http_method_names = ['get']
+
+    def get_authenticators(self):
+        return [
+            auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ]
+
+    async def perform_authentication(self, request):
+        for authenticator in request.authenticators:
+            if hasattr(authenticator, 'aauthenticate'):
+                result = await authenticator.aauthenticate(request)
+            else:
+                result = await sync_to_async(authenticator.authenticate)(
+                    request
+                )
+            if result is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = result
+                return
+        request._authenticator = None
+        request.user = api_settings.UNAUTHENTICATED_USER()
+        request.auth = None
+
+    def check_permissions(self, request):
+        for permission in (cls() for cls in self.permission_classes):
+            if not permission.has_permission(request, self):
+                if request.successful_authenticator is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def render(self, data, status=200, headers=None):
+        content = b''
+        if data is not None:
+            content = self.renderer_class().render(data)
+        response = HttpResponse(
+            content, status=status,
+            content_type=self.renderer_class.media_type,
+        )
+        for name, value in (headers or {}).items():
+            response[name] = value
+        return response
+
+    async def conditional_response(self, request, validators, respond):
+        """
+        Async-версия ``ConditionalResponseMixin.conditional_response``:
+        ``respond`` — корутинная функция, которая вызывается, только
+        если условный запрос не дал 304.
+        """
+        etag, last_modified = validators
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = await respond()
+        return add_validators(response, request, etag, last_modified)
+
+    def handle_exception(self, request, exc):
+        headers = {}
+        if isinstance(exc, (
+            exceptions.NotAuthenticated, exceptions.AuthenticationFailed
+        )):
+            authenticators = request.authenticators
+            if authenticators:
+                headers['WWW-Authenticate'] = (
+                    authenticators[0].authenticate_header(request)
+                )
+            else:
+                exc.status_code = 403
+        response = exception_handler(exc, {'view': self, 'request': request})
+        if response is None:
+            raise exc
+        headers.update(response.headers)
+        headers.pop('Content-Type', None)
+        return self.render(response.data, response.status_code, headers)
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, authenticators=self.get_authenticators())
+        self.request = request
+        try:
+            if request.method.lower() not in self.http_method_names:
+                raise exceptions.MethodNotAllowed(request.method)
+            await self.perform_authentication(request)
+            self.check_permissions(request)
+            handler = getattr(self, request.method.lower())
+            return await handler(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return self.handle_exception(request, exc)
+
+
+class AsyncProductListMixin:
+    """
+    Список продуктов с сортировкой ``ordering`` и постраничной
+    или курсорной (``?pagination=cursor``) пагинацией, как у
+    синхронных вью. Строки ``.values()`` читаются через
+    ``aiterator()``, имена категорий — одним запросом на страницу.
+    """
+    pagination_class = AsyncProductPagination
+    filter_backends = [ProductPriceFilter, ProductOrderingFilter]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
+    ordering = ['id']
+
+    async def get_queryset(self, request, **kwargs):
+        return Product.objects.all()
+
+    async def get(self, request, **kwargs):
+        return await self.conditional_response(
+            request,
+            catalog_validators(await aget_catalog_version()),
+            lambda: self.list_response(request, **kwargs),
+        )
+
+    async def list_response(self, request, **kwargs):
+        queryset = await self.get_queryset(request, **kwargs)
+        queryset = ProductPriceFilter().filter_queryset(
+            request, queryset, self
+        )
+        ordering = ProductOrderingFilter().get_ordering(
+            request, queryset, self
+        )
+        paginator = self.pagination_class()
+        rows = await paginator.apaginate_queryset(
+            queryset.order_by(*ordering).values(*PRODUCT_READ_FIELDS),
+            request, self
+        )
+        data = await aread_products(rows)
+        return self.render(paginator.get_paginated_data(data))
+
+
+class AsyncProductListView(AsyncProductListMixin, AsyncAPIView):
+    """
+    Async-вью для получения списка продуктов.
+    Все аутентифицированные пользователи могут
+    просматривать список продуктов с пагинацией.
+    """
+
+
+class AsyncProductsByCategoryView(AsyncProductListMixin, AsyncAPIView):
+    """
+    Async-вью для получения списка продуктов в
+    конкретной категории и ее подкатегориях.
+    """
+
+    async def get_queryset(self, request, category_name):
+        try:
+            category = await Category.objects.aget(name=category_name)
+        except Category.DoesNotExist:
+            raise Http404('No Category matches the given query.')
+        product_ids = Product.categories.through.objects.filter(
+            category__path__startswith=category.path
+        ).values('product_id')
+        return Product.objects.filter(id__in=product_ids)
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    """
+    Async-вью для получения продукта по его ID.
+    Использует те же записи кеша и валидаторы, что и
+    ProductDetailView.
+    """
+
+    async def get(self, request, pk):
+        async def build():
+            rows = [
+                row async for row in Product.objects.filter(
+                    pk=pk
+                ).values(*PRODUCT_READ_FIELDS)
+            ]
+            if not rows:
+                raise Http404('No Product matches the given query.')
+            return (await aread_products(rows))[0]
+
+        entry, cache_status = await aget_cached_entry(
+            await aproduct_detail_key(pk), build,
+            lambda: aproduct_validators(pk),
+        )
+        etag, last_modified = entry['etag'], entry['last_modified']
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = self.render(entry['data'])
+        response['X-Cache'] = cache_status
+        return add_validators(response, request, etag, last_modified)
+
+
+class AsyncProductStatsView(AsyncAPIView):
+    """
+    Async-вью для получения статистики по продуктам.
+    """
+
+    async def get(self, request):
+        async def respond():
+            return self.render(await aget_product_stats())
+
+        return await self.conditional_response(
+            request, catalog_validators(await aget_catalog_version()), respond
+        )
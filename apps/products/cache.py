@@ -0,0 +1,213 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from mini_online_store.routers import read_primary
+
+CACHE_PREFIX = 'catalog'
+CATEGORY_VERSION_KEY = f'{CACHE_PREFIX}:categories:version'
+METRIC_KEYS = {
+    'hits': f'{CACHE_PREFIX}:metrics:hits',
+    'misses': f'{CACHE_PREFIX}:metrics:misses',
+}
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+async def _aincr(key, delta=1):
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        return await cache.aincr(key, delta)
+    except ValueError:
+        await cache.aset(key, delta, timeout=None)
+        return delta
+
+
+def get_category_version():
+    """
+    Версия категорий входит в ключи всех записей кеша, так как
+    имена категорий есть и в ответах продуктов.
+    """
+    version = cache.get(CATEGORY_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATEGORY_VERSION_KEY, 1)
+    return version
+
+
+async def aget_category_version():
+    version = await cache.aget(CATEGORY_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATEGORY_VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(CATEGORY_VERSION_KEY, 1)
+    return version
+
+
+def product_detail_key(pk, version=None):
+    if version is None:
+        version = get_category_version()
+    return f'{CACHE_PREFIX}:product:{pk}:v{version}'
+
+
+async def aproduct_detail_key(pk):
+    return product_detail_key(pk, await aget_category_version())
+
+
+def category_list_key(query_string):
+    digest = hashlib.md5(query_string.encode()).hexdigest()
+    return f'{CACHE_PREFIX}:categories:v{get_category_version()}:{digest}'
+
+
+def _on_commit_too(func):
+    """
+    Выполняет инвалидацию сразу и повторно после фиксации транзакции,
+    чтобы параллельный запрос не закешировал данные до коммита.
+    """
+    func()
+    transaction.on_commit(func)
+
+
+def invalidate_products(pks):
+    pks = list(pks)
+    if pks:
+        _on_commit_too(
+            lambda: cache.delete_many([product_detail_key(pk) for pk in pks])
+        )
+
+
+def invalidate_categories():
+    _on_commit_too(lambda: _incr(CATEGORY_VERSION_KEY))
+
+
+def get_cache_metrics():
+    values = cache.get_many(list(METRIC_KEYS.values()))
+    metrics = {
+        name: values.get(key, 0) for name, key in METRIC_KEYS.items()
+    }
+    requests = metrics['hits'] + metrics['misses']
+    metrics['hit_ratio'] = (
+        round(metrics['hits'] / requests, 4) if requests else None
+    )
+    return metrics
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Ответ 304 Not Modified, если If-None-Match или If-Modified-Since
+    запроса совпадает с валидаторами ресурса, иначе None.
+    """
+    if etag is None:
+        return None
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+
+
+def add_validators(response, request, etag, last_modified):
+    """
+    Добавляет к ответу ETag, Last-Modified и Cache-Control.
+    Ответы аутентифицированным пользователям помечаются как
+    private, чтобы общий кеш (CDN) не отдавал их другим клиентам.
+    """
+    if etag is None or response.status_code not in (
+        status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+    ):
+        return response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    visibility = 'private' if request.user.is_authenticated else 'public'
+    patch_cache_control(
+        response, max_age=settings.CATALOG_HTTP_MAX_AGE,
+        must_revalidate=True, **{visibility: True}
+    )
+    return response
+
+
+def get_cached_entry(key, build, validators):
+    """
+    Возвращает запись кеша с данными ответа, ETag и Last-Modified
+    и статус HIT/MISS. При промахе валидаторы получаются вызовом
+    ``validators`` до построения данных вызовом ``build``, поэтому
+    данные не старее валидаторов. Оба вызова читают из основной
+    базы: запись с отстающей реплики после инвалидации отдавалась
+    бы весь ``CATALOG_CACHE_TIMEOUT``.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        _incr(METRIC_KEYS['hits'])
+        return entry, 'HIT'
+    _incr(METRIC_KEYS['misses'])
+    with read_primary():
+        etag, last_modified = validators()
+        entry = {
+            'data': build(), 'etag': etag, 'last_modified': last_modified,
+        }
+    cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+    return entry, 'MISS'
+
+
+async def aget_cached_entry(key, build, validators):
+    """
+    Асинхронная версия ``get_cached_entry``, ``build``
+    и ``validators`` — корутинные функции.
+    """
+    entry = await cache.aget(key)
+    if entry is not None:
+        await _aincr(METRIC_KEYS['hits'])
+        return entry, 'HIT'
+    await _aincr(METRIC_KEYS['misses'])
+    with read_primary():
+        etag, last_modified = await validators()
+        entry = {
+            'data': await build(), 'etag': etag,
+            'last_modified': last_modified,
+        }
+    await cache.aset(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+    return entry, 'MISS'
+
+
+class ConditionalResponseMixin:
+    """
+    Условные запросы к ответам чтения: валидаторы ``(etag,
+    last_modified)`` строятся по версиям до основного запроса,
+    и на совпадающий If-None-Match или If-Modified-Since ответ
+    304 возвращается без выборки и сериализации.
+    """
+
+    def conditional_response(self, request, validators, respond):
+        etag, last_modified = validators
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = respond()
+        return add_validators(response, request, etag, last_modified)
+
+
+class CachedResponseMixin:
+    """
+    Кеширует сериализованные ответы чтения в кеше Django вместе
+    с их ETag и Last-Modified и отвечает 304 Not Modified на
+    условные запросы с совпадающими валидаторами.
+    В заголовке X-Cache указывается HIT или MISS.
+    """
+
+    def cached_response(self, request, key, build, validators):
+        entry, cache_status = get_cached_entry(key, build, validators)
+        etag, last_modified = entry['etag'], entry['last_modified']
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = Response(entry['data'])
+        response['X-Cache'] = cache_status
+        return add_validators(response, request, etag, last_modified)
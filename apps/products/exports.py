@@ -0,0 +1,76 @@
+import csv
+import json
+
+from .imports import CATEGORY_SEPARATOR, CSV, NDJSON
+from .models import Product
+
+CHUNK_SIZE = 2000
+CSV_COLUMNS = [
+    'id', 'name', 'regular_price', 'discount_price', 'stock',
+    'description', 'categories',
+]
+
+
+def product_to_dict(product):
+    """
+    Представление продукта в том же виде, что и у ProductSerializer.
+    """
+    return {
+        'id': product.id,
+        'name': product.name,
+        'regular_price': str(product.regular_price),
+        'discount_price': (
+            str(product.discount_price)
+            if product.discount_price is not None else None
+        ),
+        'effective_price': str(product.effective_price),
+        'discount_percent': product.discount_percent,
+        'stock': product.stock,
+        'stock_version': product.stock_version,
+        'description': product.description,
+        'categories': [
+            category.name for category in product.categories.all()
+        ],
+    }
+
+
+def iter_products(chunk_size=CHUNK_SIZE):
+    """
+    Обходит все продукты итератором (серверным курсором там, где
+    он поддерживается), подгружая категории один раз на пачку.
+    """
+    return Product.objects.prefetch_related('categories').order_by(
+        'id'
+    ).iterator(chunk_size=chunk_size)
+
+
+def export_ndjson(products):
+    for product in products:
+        yield json.dumps(product_to_dict(product), ensure_ascii=False) + '\n'
+
+
+class _Line:
+    """
+    Псевдофайл для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_csv(products):
+    """
+    CSV в формате, который принимает импорт: категории через ``|``.
+    """
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    for product in products:
+        row = product_to_dict(product)
+        row['categories'] = CATEGORY_SEPARATOR.join(row['categories'])
+        yield writer.writerow([row[column] for column in CSV_COLUMNS])
+
+
+EXPORTERS = {
+    NDJSON: (export_ndjson, 'application/x-ndjson'),
+    CSV: (export_csv, 'text/csv'),
+}
@@ -0,0 +1,291 @@
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, CharField, Count, F, IntegerField, Q, Value, When,
+)
+from django.db.models.functions import Greatest
+
+from .models import CategoryFacet, PriceFacet, Product
+
+CATEGORY = 'category'
+PRICE = 'price'
+
+
+def price_bucket(price):
+    """
+    Номер корзины гистограммы: последняя нижняя граница из
+    PRODUCT_PRICE_BUCKETS, не превышающая цену.
+    """
+    return max(bisect_right(settings.PRODUCT_PRICE_BUCKETS, price) - 1, 0)
+
+
+def price_bucket_expression():
+    """То же, что ``price_bucket``, в виде выражения SQL."""
+    bounds = list(enumerate(settings.PRODUCT_PRICE_BUCKETS))
+    return Case(
+        *[
+            When(effective_price__gte=bound, then=Value(index))
+            for index, bound in reversed(bounds)
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _add(deltas, key, count, in_stock):
+    previous_count, previous_in_stock = deltas.get(key, (0, 0))
+    deltas[key] = (previous_count + count, previous_in_stock + in_stock)
+
+
+def _adjust(model, deltas):
+    """
+    Применяет изменения счетчиков ``{pk: (count, in_stock)}``.
+    Недостающие строки создаются, одинаковые изменения выполняются
+    одним UPDATE. Счетчики не опускаются ниже нуля, чтобы
+    расхождение до пересчета не ломало запись продуктов.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(pk=pk) for pk in deltas], ignore_conflicts=True
+    )
+    groups = {}
+    for pk, delta in deltas.items():
+        groups.setdefault(delta, []).append(pk)
+    for (count, in_stock), pks in groups.items():
+        model.objects.filter(pk__in=pks).update(
+            product_count=Greatest(F('product_count') + count, 0),
+            in_stock_count=Greatest(F('in_stock_count') + in_stock, 0),
+        )
+
+
+def _product_categories(product_ids):
+    return Product.categories.through.objects.filter(
+        product_id__in=product_ids
+    ).values_list('product_id', 'category_id')
+
+
+def apply_product_change(product_id, previous=None, current=None,
+                         category_ids=None):
+    """
+    Применяет к фасетам изменение одного продукта.
+
+    ``previous`` и ``current`` — пары ``(effective_price, stock)``
+    до и после изменения; ``None`` означает, что продукта не было
+    или больше нет. Категории читаются из БД, только если изменилось
+    наличие, и не передаются явно (при удалении связи уже удалены).
+    """
+    price_deltas = {}
+    was_in_stock = previous is not None and previous[1] > 0
+    is_in_stock = current is not None and current[1] > 0
+    if previous is not None:
+        _add(price_deltas, price_bucket(previous[0]), -1, -was_in_stock)
+    if current is not None:
+        _add(price_deltas, price_bucket(current[0]), 1, is_in_stock)
+    _adjust(PriceFacet, price_deltas)
+
+    if previous is None:
+        return
+    count = -1 if current is None else 0
+    in_stock = is_in_stock - was_in_stock
+    if not count and not in_stock:
+        return
+    if category_ids is None:
+        category_ids = [
+            category_id
+            for _, category_id in _product_categories([product_id])
+        ]
+    _adjust(CategoryFacet, {
+        category_id: (count, in_stock) for category_id in category_ids
+    })
+
+
+def apply_product_changes(changes):
+    """
+    Применяет к фасетам изменения пачки продуктов, записанной
+    в обход сигналов. ``changes`` — четверки ``(previous, current,
+    previous_categories, current_categories)``: пары
+    ``(effective_price, stock)`` или ``None`` до и после изменения
+    и id категорий продукта до и после него.
+    """
+    price_deltas = {}
+    category_deltas = {}
+    for previous, current, previous_categories, current_categories in (
+        changes
+    ):
+        for state, categories, sign in (
+            (previous, previous_categories, -1),
+            (current, current_categories, 1),
+        ):
+            if state is None:
+                continue
+            in_stock = sign * (state[1] > 0)
+            _add(price_deltas, price_bucket(state[0]), sign, in_stock)
+            for category_id in categories:
+                _add(category_deltas, category_id, sign, in_stock)
+    _adjust(PriceFacet, price_deltas)
+    _adjust(CategoryFacet, category_deltas)
+
+
+def apply_links(product_ids, category_ids, sign):
+    """
+    Учитывает добавление (``sign=1``) или удаление (``sign=-1``)
+    связей каждого продукта из ``product_ids`` с каждой категорией
+    из ``category_ids``.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    in_stock = Product.objects.filter(
+        pk__in=product_ids, stock__gt=0
+    ).count()
+    _adjust(CategoryFacet, {
+        category_id: (sign * len(product_ids), sign * in_stock)
+        for category_id in category_ids
+    })
+
+
+def apply_stock_transitions(stocks):
+    """
+    Учитывает массовые изменения остатков в обход сигналов.
+    ``stocks`` — ``{product_id: (old_stock, new_stock)}``; запросы
+    выполняются, только если продукт появился или закончился.
+    """
+    flips = {
+        product_id: 1 if new > 0 else -1
+        for product_id, (old, new) in stocks.items()
+        if (old > 0) != (new > 0)
+    }
+    if not flips:
+        return
+    price_deltas = {}
+    for product_id, price in Product.objects.filter(
+        pk__in=flips
+    ).values_list('pk', 'effective_price'):
+        _add(price_deltas, price_bucket(price), 0, flips[product_id])
+    category_deltas = {}
+    for product_id, category_id in _product_categories(flips):
+        _add(category_deltas, category_id, 0, flips[product_id])
+    _adjust(PriceFacet, price_deltas)
+    _adjust(CategoryFacet, category_deltas)
+
+
+def _columns(queryset, facet, key, name, count, in_stock):
+    # Все столбцы — аннотации, чтобы их порядок в обеих частях
+    # UNION совпадал: поля модели values_list ставит перед ними.
+    return queryset.annotate(
+        facet=Value(facet, output_field=CharField()),
+        facet_key=key,
+        facet_name=name,
+        facet_count=count,
+        facet_in_stock=in_stock,
+    ).values_list(
+        'facet', 'facet_key', 'facet_name', 'facet_count', 'facet_in_stock'
+    )
+
+
+def _grouped_rows(products):
+    """
+    Категории и корзины цен выборки продуктов одним запросом:
+    два GROUP BY, объединенные UNION ALL.
+    """
+    products = products.order_by()
+    categories = Product.categories.through.objects.filter(
+        product_id__in=products.values('pk')
+    ).values('category_id')
+    prices = products.annotate(
+        bucket=price_bucket_expression()
+    ).values('bucket')
+    return _columns(
+        categories, CATEGORY, F('category_id'), F('category__name'),
+        Count('product_id'),
+        Count('product_id', filter=Q(product__stock__gt=0)),
+    ).union(
+        _columns(
+            prices, PRICE, F('bucket'), Value(None, CharField()),
+            Count('pk'), Count('pk', filter=Q(stock__gt=0)),
+        ),
+        all=True,
+    )
+
+
+def _materialized_rows():
+    return _columns(
+        CategoryFacet.objects.filter(product_count__gt=0),
+        CATEGORY, F('category_id'), F('category__name'),
+        F('product_count'), F('in_stock_count'),
+    ).union(
+        _columns(
+            PriceFacet.objects.all(), PRICE, F('bucket'),
+            Value(None, CharField()),
+            F('product_count'), F('in_stock_count'),
+        ),
+        all=True,
+    )
+
+
+def _facets_data(rows):
+    bounds = settings.PRODUCT_PRICE_BUCKETS
+    upper_bounds = [*bounds[1:], None]
+    categories = []
+    prices = {}
+    for facet, key, name, count, in_stock in rows:
+        if facet == CATEGORY and count:
+            categories.append({
+                'id': key, 'name': name,
+                'count': count, 'in_stock': in_stock,
+            })
+        elif facet == PRICE:
+            prices[key] = (count, in_stock)
+    categories.sort(key=lambda category: category['id'])
+    return {
+        'categories': categories,
+        'prices': [
+            {
+                'min': bound,
+                'max': upper_bounds[index],
+                'count': prices.get(index, (0, 0))[0],
+                'in_stock': prices.get(index, (0, 0))[1],
+            }
+            for index, bound in enumerate(bounds)
+        ],
+    }
+
+
+def get_facets(products=None):
+    """
+    Число продуктов (и в наличии) по категориям и корзинам цен.
+    Без выборки ``products`` читает материализованные счетчики,
+    иначе считает по выборке одним сгруппированным запросом.
+    Категории учитывают только прямую привязку продукта.
+    """
+    if products is None:
+        return _facets_data(_materialized_rows())
+    return _facets_data(_grouped_rows(products))
+
+
+def rebuild_facets():
+    """
+    Полностью пересчитывает материализованные фасеты по всем
+    продуктам.
+    """
+    with transaction.atomic():
+        CategoryFacet.objects.all().delete()
+        PriceFacet.objects.all().delete()
+        rows = list(_grouped_rows(Product.objects.all()))
+        CategoryFacet.objects.bulk_create([
+            CategoryFacet(
+                category_id=key, product_count=count,
+                in_stock_count=in_stock,
+            )
+            for facet, key, _, count, in_stock in rows if facet == CATEGORY
+        ])
+        PriceFacet.objects.bulk_create([
+            PriceFacet(
+                bucket=key, product_count=count, in_stock_count=in_stock
+            )
+            for facet, key, _, count, in_stock in rows if facet == PRICE
+        ])
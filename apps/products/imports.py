@@ -0,0 +1,260 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from . import facets, stats
+from .cache import invalidate_products
+from .models import Category, Product
+from .serializers import ProductImportSerializer
+from .versions import bump_catalog_version
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+CATEGORY_SEPARATOR = '|'
+MAX_REPORTED_ERRORS = 1000
+PRODUCT_FIELDS = [
+    'name', 'regular_price', 'discount_price', 'stock', 'description'
+]
+
+
+def read_csv(lines):
+    """
+    Читает строки CSV с заголовком. Пустые значения считаются
+    отсутствующими, категории разделяются символом ``|``.
+    """
+    for row in csv.DictReader(lines):
+        row = {
+            key: value for key, value in row.items()
+            if key and value not in ('', None)
+        }
+        if 'categories' in row:
+            row['categories'] = [
+                name.strip()
+                for name in row['categories'].split(CATEGORY_SEPARATOR)
+                if name.strip()
+            ]
+        yield row
+
+
+def read_ndjson(lines):
+    """
+    Читает NDJSON: один JSON-объект продукта на строку.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield ValueError(f'Invalid JSON: {exc}')
+
+
+READERS = {CSV: read_csv, NDJSON: read_ndjson}
+
+
+def read_rows(lines, file_format):
+    return READERS[file_format](lines)
+
+
+class ImportReport:
+    """
+    Итоги импорта: количество созданных и обновленных продуктов
+    и ошибки по строкам.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def _validate_batch(batch, report):
+    """
+    Проверяет строки пачки без запросов к БД и возвращает
+    пары (номер строки, проверенные данные).
+    """
+    valid = []
+    for number, row in batch:
+        if not isinstance(row, dict):
+            message = (
+                str(row) if isinstance(row, Exception)
+                else 'Expected a JSON object.'
+            )
+            report.add_error(number, {'non_field_errors': [message]})
+            continue
+        serializer = ProductImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            report.add_error(number, serializer.errors)
+    return valid
+
+
+def _resolve_batch(valid, report):
+    """
+    Одним запросом находит категории и одним — существующие продукты
+    пачки. Строки с неизвестными категориями или id и повторы id
+    в пачке отбрасываются. Для существующих продуктов запоминается
+    состояние до изменения: ``(regular_price, effective_price,
+    stock)``.
+    """
+    names = {name for _, data in valid for name in data['categories']}
+    categories = dict(
+        Category.objects.filter(name__in=names).values_list('name', 'id')
+    )
+    ids = {data['id'] for _, data in valid if data.get('id')}
+    existing = Product.objects.in_bulk(ids)
+
+    resolved = []
+    seen = set()
+    for number, data in valid:
+        missing = [
+            name for name in data['categories'] if name not in categories
+        ]
+        if missing:
+            report.add_error(number, {'categories': [
+                f'Unknown categories: {", ".join(missing)}.'
+            ]})
+            continue
+        product_id = data.get('id')
+        if product_id and product_id not in existing:
+            report.add_error(number, {'id': [
+                f'Product with id {product_id} does not exist.'
+            ]})
+            continue
+        if product_id in seen:
+            report.add_error(number, {'id': [
+                f'Product with id {product_id} is repeated in this batch.'
+            ]})
+            continue
+        if product_id:
+            seen.add(product_id)
+        product = existing.get(product_id) or Product()
+        previous = None
+        if product.pk:
+            previous = (
+                product.regular_price, product.effective_price,
+                product.stock,
+            )
+        for field in PRODUCT_FIELDS:
+            setattr(product, field, data.get(field))
+        category_ids = {categories[name] for name in data['categories']}
+        resolved.append((number, product, category_ids, previous))
+    return resolved
+
+
+def _apply_batch_changes(resolved, previous_categories):
+    stats.apply_product_changes([
+        (
+            previous and (previous[0], previous[2]),
+            (product.regular_price, product.stock),
+        )
+        for _, product, _, previous in resolved
+    ])
+    facets.apply_product_changes([
+        (
+            previous and (previous[1], previous[2]),
+            (product.effective_price, product.stock),
+            previous_categories.get(product.pk, ()),
+            category_ids,
+        )
+        for _, product, category_ids, previous in resolved
+    ])
+
+
+def _write_batch(resolved, report):
+    """
+    Записывает пачку в одной транзакции: bulk_create новых продуктов,
+    bulk_update существующих (``stock_version`` увеличивается, только
+    если остаток изменился, как в ``Product.save``) и пересоздание
+    их связей с категориями.
+    Массовые операции не вызывают сигналы, поэтому изменения пачки
+    применяются к статистике и фасетам одним набором обновлений,
+    версия каталога увеличивается, а кеш обновленных продуктов
+    сбрасывается явно.
+    """
+    new = [product for _, product, _, _ in resolved if product.pk is None]
+    existing = [product for _, product, _, _ in resolved if product.pk]
+    Through = Product.categories.through
+    try:
+        with transaction.atomic():
+            previous_categories = {}
+            for product_id, category_id in Through.objects.filter(
+                product_id__in=[product.pk for product in existing]
+            ).values_list('product_id', 'category_id'):
+                previous_categories.setdefault(product_id, set()).add(
+                    category_id
+                )
+            Product.objects.bulk_create(new)
+            for _, product, _, previous in resolved:
+                if previous is None:
+                    continue
+                product.stock_version = (
+                    F('stock_version') + 1
+                    if product.stock != previous[2] else F('stock_version')
+                )
+            Product.objects.bulk_update(
+                existing, [*PRODUCT_FIELDS, 'stock_version']
+            )
+            Through.objects.filter(
+                product_id__in=[product.pk for product in existing]
+            ).delete()
+            Through.objects.bulk_create([
+                Through(product_id=product.pk, category_id=category_id)
+                for _, product, category_ids, _ in resolved
+                for category_id in category_ids
+            ])
+            _apply_batch_changes(resolved, previous_categories)
+            bump_catalog_version()
+    except DatabaseError as exc:
+        for number, _, _, _ in resolved:
+            report.add_error(number, {'non_field_errors': [str(exc)]})
+        return
+    invalidate_products(product.pk for product in existing)
+    report.created += len(new)
+    report.updated += len(existing)
+
+
+def import_products(rows, batch_size=1000, report=None):
+    """
+    Загружает продукты из итератора строк пачками по ``batch_size``.
+    Итоги накапливаются в ``report``, если он передан, поэтому они
+    доступны, даже если чтение строк прервалось исключением.
+
+    Строки с ``id`` обновляют существующие продукты, остальные
+    создаются. Ошибочные строки попадают в отчет и не прерывают
+    загрузку остальных. Статистика продуктов и фасеты обновляются
+    каждой пачкой, поэтому стоимость импорта не зависит от размера
+    каталога.
+    """
+    if report is None:
+        report = ImportReport()
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        valid = _validate_batch(batch, report)
+        resolved = _resolve_batch(valid, report)
+        if resolved:
+            _write_batch(resolved, report)
+    return report
@@ -0,0 +1,55 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.imports import FORMATS, NDJSON, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Загружает продукты из CSV или NDJSON файла пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Путь к файлу или "-" для чтения из stdin'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def get_format(self, path, file_format):
+        if file_format:
+            return file_format
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        if extension in ('ndjson', 'jsonl'):
+            return NDJSON
+        if extension in FORMATS:
+            return extension
+        raise CommandError('Cannot detect file format, use --format.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if path == '-':
+            file_format = options['format']
+            if not file_format:
+                raise CommandError('--format is required for stdin.')
+            report = import_products(
+                read_rows(sys.stdin, file_format), options['batch_size']
+            )
+        else:
+            file_format = self.get_format(path, options['format'])
+            with open(path, encoding='utf-8', newline='') as source:
+                report = import_products(
+                    read_rows(source, file_format), options['batch_size']
+                )
+
+        for error in report.errors:
+            self.stderr.write(f'Row {error["row"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created: {report.created}, updated: {report.updated}, '
+            f'errors: {report.error_count}'
+        ))
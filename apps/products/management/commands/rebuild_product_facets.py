@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.facets import rebuild_facets
+from apps.products.models import CategoryFacet
+
+
+class Command(BaseCommand):
+    help = (
+        'Полностью пересчитывает фасеты каталога: число продуктов '
+        'по категориям и корзинам цен.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(
+            f'Product facets rebuilt: '
+            f'{CategoryFacet.objects.count()} categories.'
+        ))
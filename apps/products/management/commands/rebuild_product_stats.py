@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.stats import rebuild_product_stats
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает статистику по продуктам.'
+
+    def handle(self, *args, **options):
+        stats = rebuild_product_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Product stats rebuilt: {stats.product_count} products, '
+            f'min_price={stats.min_price}, max_price={stats.max_price}, '
+            f'total_stock={stats.total_stock}'
+        ))
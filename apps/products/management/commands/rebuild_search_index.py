@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.products.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересоздает полнотекстовый индекс продуктов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with connection.schema_editor() as schema_editor:
+            rebuild_search_index(schema_editor)
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
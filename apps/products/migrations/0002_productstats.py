@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:55
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+
+def build_product_stats(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductStats = apps.get_model('products', 'ProductStats')
+    aggregates = Product.objects.aggregate(
+        min_price=Min('regular_price'),
+        max_price=Max('regular_price'),
+        total_stock=Sum('stock'),
+        product_count=Count('id'),
+    )
+    ProductStats.objects.create(
+        pk=1,
+        min_price=aggregates['min_price'],
+        max_price=aggregates['max_price'],
+        total_stock=aggregates['total_stock'] or 0,
+        product_count=aggregates['product_count'],
+        rebuilt_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total_stock', models.PositiveBigIntegerField(default=0)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('rebuilt_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(build_product_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    for category in Category.objects.all().iterator():
+        category.path = f'{category.pk:010d}/'
+        category.save(update_fields=['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_productstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+from django.db import migrations
+
+# SQL полнотекстового индекса на момент миграции. Скопирован из
+# apps.products.search, а не импортирован, чтобы изменения модуля
+# не меняли уже примененную миграцию.
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5(
+        name, description,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_ai
+    AFTER INSERT ON products_product BEGIN
+        INSERT INTO products_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_ad
+    AFTER DELETE ON products_product BEGIN
+        INSERT INTO products_product_fts(
+            products_product_fts, rowid, name, description
+        )
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_au
+    AFTER UPDATE OF name, description ON products_product BEGIN
+        INSERT INTO products_product_fts(
+            products_product_fts, rowid, name, description
+        )
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO products_product_fts(products_product_fts) "
+    "VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS products_product_fts_ai',
+    'DROP TRIGGER IF EXISTS products_product_fts_ad',
+    'DROP TRIGGER IF EXISTS products_product_fts_au',
+    'DROP TABLE IF EXISTS products_product_fts',
+]
+
+POSTGRES_INSTALL = [
+    """
+    ALTER TABLE products_product
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS products_product_search_idx
+    ON products_product USING GIN (search_vector)
+    """,
+    'REINDEX INDEX products_product_search_idx',
+]
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS products_product_search_idx',
+    'ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+    'postgresql': (POSTGRES_INSTALL, POSTGRES_UNINSTALL),
+}
+
+
+def _execute(schema_editor, index):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements:
+        for sql in statements[index]:
+            schema_editor.execute(sql)
+
+
+def install(apps, schema_editor):
+    _execute(schema_editor, 0)
+
+
+def uninstall(apps, schema_editor):
+    _execute(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
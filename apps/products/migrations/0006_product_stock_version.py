@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:54
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+
+def fill_effective_prices(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(
+        effective_price=Coalesce(F('discount_price'), F('regular_price'))
+    )
+    discounted = []
+    for product in Product.objects.filter(
+        discount_price__isnull=False, regular_price__gt=0
+    ).only('regular_price', 'discount_price').iterator():
+        discount = product.regular_price - product.discount_price
+        product.discount_percent = max(
+            0, min(int(discount * 100 / product.regular_price), 100)
+        )
+        discounted.append(product)
+    Product.objects.bulk_update(
+        discounted, ['discount_percent'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_stock_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_eff_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['discount_percent', 'id'], name='product_discount_id_idx'),
+        ),
+    ]
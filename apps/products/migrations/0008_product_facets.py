@@ -0,0 +1,67 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:57
+
+from bisect import bisect_right
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_facets(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    CategoryFacet = apps.get_model('products', 'CategoryFacet')
+    PriceFacet = apps.get_model('products', 'PriceFacet')
+    Through = Product.categories.through
+    CategoryFacet.objects.bulk_create([
+        CategoryFacet(
+            category_id=row['category_id'],
+            product_count=row['product_count'],
+            in_stock_count=row['in_stock_count'],
+        )
+        for row in Through.objects.values('category_id').annotate(
+            product_count=Count('product_id'),
+            in_stock_count=Count(
+                'product_id', filter=Q(product__stock__gt=0)
+            ),
+        )
+    ])
+    bounds = settings.PRODUCT_PRICE_BUCKETS
+    counts = {}
+    for price, stock in Product.objects.values_list(
+        'effective_price', 'stock'
+    ).iterator():
+        bucket = max(bisect_right(bounds, price) - 1, 0)
+        count, in_stock = counts.get(bucket, (0, 0))
+        counts[bucket] = (count + 1, in_stock + (stock > 0))
+    PriceFacet.objects.bulk_create([
+        PriceFacet(bucket=bucket, product_count=count, in_stock_count=stock)
+        for bucket, (count, stock) in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryFacet',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facet', serialize=False, to='products.category')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceFacet',
+            fields=[
+                ('bucket', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def create_catalog_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('products', 'CatalogVersion')
+    CatalogVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_catalog_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_catalog_version, migrations.RunPython.noop
+        ),
+    ]
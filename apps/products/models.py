@@ -1,14 +1,125 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 
 
 class Category(models.Model):
+    """
+    Категория товаров. Иерархия хранится через ``parent`` и
+    материализованный путь ``path`` из id всех предков, например
+    ``0000000001/0000000007/``, поэтому все подкатегории выбираются
+    одним индексным условием ``path LIKE 'prefix%'``.
+    """
+    PATH_STEP_WIDTH = 10
+    PATH_SEPARATOR = '/'
+
     name = models.CharField(max_length=255, unique=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='children'
+    )
+    path = models.CharField(
+        max_length=255, db_index=True, editable=False, default=''
+    )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    def build_path(self):
+        prefix = ''
+        if self.parent_id:
+            prefix = Category.objects.values_list(
+                'path', flat=True
+            ).get(pk=self.parent_id)
+        return (
+            f'{prefix}{self.pk:0{self.PATH_STEP_WIDTH}d}{self.PATH_SEPARATOR}'
+        )
+
+    def is_descendant_of(self, category):
+        return bool(category.path) and self.path.startswith(category.path)
+
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет категорию и пересчитывает пути ее и всех ее
+        подкатегорий, если изменился родитель.
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            old_path = self.path
+            new_path = self.build_path()
+            if new_path == old_path:
+                return
+            if old_path:
+                Category.objects.filter(
+                    path__startswith=old_path
+                ).exclude(pk=self.pk).update(path=Concat(
+                    Value(new_path), Substr('path', len(old_path) + 1)
+                ))
+            Category.objects.filter(pk=self.pk).update(path=new_path)
+            self.path = new_path
+
+
+PRICE_FIELDS = ('regular_price', 'discount_price')
+DERIVED_PRICE_FIELDS = ('effective_price', 'discount_percent')
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Массовые создание и обновление продуктов пересчитывают
+    производные поля цены и обновляют ``updated_at`` так же,
+    как ``Product.save``.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.update_prices()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        objs = list(objs)
+        if set(fields) & set(PRICE_FIELDS):
+            for obj in objs:
+                obj.update_prices()
+            fields += [
+                field for field in DERIVED_PRICE_FIELDS
+                if field not in fields
+            ]
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        if 'updated_at' not in fields:
+            fields.append('updated_at')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
 
 class Product(models.Model):
+    """
+    Продукт каталога. ``stock_version`` увеличивается при каждом
+    изменении остатка и служит предусловием оптимистичной
+    блокировки в массовом обновлении остатков.
+
+    ``effective_price`` (цена, которую платит покупатель) и
+    ``discount_percent`` хранятся в таблице и пересчитываются при
+    каждой записи цен, поэтому фильтр и сортировка по ним
+    используют индекс вместо ``Coalesce`` по двум колонкам.
+
+    ``updated_at`` меняется при любой записи продукта, включая
+    массовые UPDATE, и изменении его категорий; из него строятся
+    ETag и Last-Modified ответа продукта.
+    """
     name = models.CharField(max_length=255)
     regular_price = models.DecimalField(
         max_digits=10, decimal_places=2
@@ -16,9 +127,144 @@ class Product(models.Model):
     discount_price = models.DecimalField(
         max_digits=10, decimal_places=2, null=True, blank=True
     )
+    effective_price = models.DecimalField(
+        max_digits=10, decimal_places=2, editable=False
+    )
+    discount_percent = models.PositiveSmallIntegerField(
+        default=0, editable=False
+    )
     stock = models.PositiveIntegerField()
+    stock_version = models.PositiveIntegerField(default=0, editable=False)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
     categories = models.ManyToManyField(Category, related_name='products')
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['regular_price', 'id'], name='product_price_id_idx'
+            ),
+            models.Index(
+                fields=['effective_price', 'id'],
+                name='product_eff_price_id_idx'
+            ),
+            models.Index(
+                fields=['discount_percent', 'id'],
+                name='product_discount_id_idx'
+            ),
+            models.Index(fields=['name'], name='product_name_idx'),
+            models.Index(fields=['stock'], name='product_stock_idx'),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(stock__gt=0),
+                name='product_in_stock_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+    def update_prices(self):
+        """
+        Пересчитывает ``effective_price`` и ``discount_percent``.
+        Процент скидки округляется вниз, чтобы фильтр «скидка не
+        меньше N%» не включал продукты с меньшей скидкой.
+        """
+        regular_price = Decimal(str(self.regular_price))
+        if self.discount_price is None:
+            self.effective_price = regular_price
+            self.discount_percent = 0
+            return
+        discount_price = Decimal(str(self.discount_price))
+        self.effective_price = discount_price
+        percent = 0
+        if regular_price > 0:
+            discount = regular_price - discount_price
+            percent = int(discount * 100 / regular_price)
+        self.discount_percent = max(0, min(percent, 100))
+
+    def save(self, *args, **kwargs):
+        self.update_prices()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {*update_fields, 'updated_at'}
+            if update_fields & set(PRICE_FIELDS):
+                update_fields |= set(DERIVED_PRICE_FIELDS)
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+
+class ProductStats(models.Model):
+    """
+    Агрегированная статистика по всем продуктам, хранится одной строкой.
+    Поддерживается сигналами при сохранении и удалении продуктов и
+    полностью пересчитывается командой rebuild_product_stats или при
+    чтении, если последний пересчет старше PRODUCT_STATS_MAX_AGE.
+    """
+    SINGLETON_ID = 1
+
+    min_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    max_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    total_stock = models.PositiveBigIntegerField(default=0)
+    product_count = models.PositiveIntegerField(default=0)
+    rebuilt_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'ProductStats({self.rebuilt_at})'
+
+
+class CatalogVersion(models.Model):
+    """
+    Версия каталога одной строкой. ``version`` увеличивается при
+    любом изменении продуктов или категорий, ``categories_version``
+    — только категорий. Из них строятся ETag и Last-Modified
+    ответов каталога, поэтому условный запрос проверяется чтением
+    по первичному ключу без основного запроса.
+    """
+    SINGLETON_ID = 1
+
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+    categories_version = models.PositiveBigIntegerField(default=1)
+    categories_updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'CatalogVersion({self.version})'
+
+
+class CategoryFacet(models.Model):
+    """
+    Материализованное число продуктов, привязанных к категории
+    напрямую, и из них имеющихся в наличии. Поддерживается
+    сигналами, полностью пересчитывается rebuild_product_facets.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='facet'
+    )
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'CategoryFacet({self.category_id}: {self.product_count})'
+
+
+class PriceFacet(models.Model):
+    """
+    Материализованное число продуктов в корзине гистограммы цен.
+    ``bucket`` — номер нижней границы в PRODUCT_PRICE_BUCKETS.
+    """
+    bucket = models.PositiveSmallIntegerField(primary_key=True)
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'PriceFacet({self.bucket}: {self.product_count})'
@@ -0,0 +1,385 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.pagination import (
+    BasePagination, Cursor, CursorPagination, PageNumberPagination,
+    _reverse_ordering,
+)
+from rest_framework.response import Response
+
+PRODUCT_ORDERING_FIELDS = [
+    'id', 'regular_price', 'effective_price', 'discount_percent',
+]
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """
+    Сортировка списка продуктов по параметру ``ordering``.
+    Всегда добавляет ``id`` последним полем, чтобы порядок был
+    однозначным и по нему можно было строить курсор.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if not ordering or ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('id')
+        return ordering
+
+
+class ProductPriceFilter(BaseFilterBackend):
+    """
+    Фильтр по цене, которую платит покупатель: ``min_price`` и
+    ``max_price`` сравниваются с хранимым ``effective_price``,
+    поэтому условие выполняется по индексу.
+    """
+    bounds = (('min_price', 'gte'), ('max_price', 'lte'))
+
+    def parse_price(self, param, value):
+        try:
+            price = Decimal(value)
+        except InvalidOperation:
+            price = None
+        if price is None or not price.is_finite() or price < 0:
+            raise serializers.ValidationError(
+                {param: 'A valid non-negative number is required.'}
+            )
+        return price
+
+    def filter_queryset(self, request, queryset, view):
+        for param, lookup in self.bounds:
+            value = request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{
+                    f'effective_price__{lookup}': self.parse_price(
+                        param, value
+                    )
+                })
+        return queryset
+
+
+class _CountlessPage:
+    """
+    Минимальная замена django Page для пагинации без COUNT(*).
+    """
+
+    def __init__(self, number, has_next):
+        self.number = number
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class ProductPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная пагинация. С параметром ``?count=false`` не выполняет
+    COUNT(*), а определяет наличие следующей страницы, выбирая
+    на одну запись больше.
+    """
+    count_query_param = 'count'
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in ('false', '0', 'no')
+
+    def get_page_number_or_404(self, request):
+        try:
+            page_number = int(
+                request.query_params.get(self.page_query_param) or 1
+            )
+            if page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        return page_number
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.with_count = self.include_count(request)
+        if self.with_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        page_number = self.get_page_number_or_404(request)
+        offset = (page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        if not results and page_number > 1:
+            raise NotFound(self.invalid_page_message)
+
+        self.page = _CountlessPage(page_number, len(results) > page_size)
+        return results[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.with_count:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class AsyncProductPageNumberPagination(ProductPageNumberPagination):
+    """
+    Постраничная пагинация для async-вью. Страница читается через
+    ``aiterator()``, COUNT(*) выполняется через ``acount()``
+    (не выполняется с ``?count=false``). Формат ответа тот же,
+    что у ProductPageNumberPagination.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.with_count = self.include_count(request)
+        page_size = self.get_page_size(request)
+        page_number = self.get_page_number_or_404(request)
+        offset = (page_number - 1) * page_size
+        page = queryset[offset:offset + page_size + 1]
+        results = [
+            obj async for obj in page.aiterator(chunk_size=page_size + 1)
+        ]
+        if not results and page_number > 1:
+            raise NotFound(self.invalid_page_message)
+
+        self.count = await queryset.acount() if self.with_count else None
+        self.page = _CountlessPage(page_number, len(results) > page_size)
+        return results[:page_size]
+
+    def get_paginated_data(self, data):
+        paginated = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.with_count:
+            paginated = {'count': self.count, **paginated}
+        return paginated
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация. Курсор хранит значения всех полей
+    сортировки последней записи страницы, поэтому следующая страница
+    выбирается условием ``WHERE (price, id) > (...)`` по индексу,
+    без OFFSET и COUNT(*), за одно и то же время на любой глубине.
+    """
+    ordering = ('id',)
+    position_separator = ','
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self._page_queryset(queryset, request, view)
+        if page is None:
+            return None
+        try:
+            results = list(page)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return self._set_page(results)
+
+    def _page_queryset(self, queryset, request, view):
+        """
+        Запрос страницы: записи после позиции курсора в порядке
+        сортировки и еще одна, по которой видно, есть ли следующая.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self.reverse, self.position = False, None
+        else:
+            self.reverse = self.cursor.reverse
+            self.position = self.cursor.position
+
+        ordering = (
+            _reverse_ordering(self.ordering) if self.reverse
+            else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(
+                    ordering, self.decode_position(self.position)
+                ))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        position = self.position
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+        else:
+            self.next_position = self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_keyset_filter(self, ordering, values):
+        """
+        Строит условие «строго после позиции» для составного ключа
+        сортировки: ``a > x OR (a = x AND b > y)``.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            attr = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            condition |= Q(**equal, **{attr + lookup: value})
+            equal[attr] = value
+        return condition
+
+    def decode_position(self, position):
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            attr = field.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(str(instance[attr]))
+            else:
+                values.append(str(getattr(instance, attr)))
+        return self.position_separator.join(values)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.next_position
+        ))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.previous_position
+        ))
+
+
+class AsyncProductCursorPagination(ProductCursorPagination):
+    """
+    Курсорная пагинация для async-вью. Страница читается через
+    ``aiterator()``, формат ответа тот же, что у
+    ProductCursorPagination.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page = self._page_queryset(queryset, request, view)
+        if page is None:
+            return None
+        try:
+            results = [
+                obj async for obj in page.aiterator(
+                    chunk_size=self.page_size + 1
+                )
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return self._set_page(results)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+
+class ProductPagination(BasePagination):
+    """
+    Пагинация списков продуктов. По умолчанию постраничная,
+    ``?pagination=cursor`` включает курсорный режим.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    page_number_class = ProductPageNumberPagination
+    cursor_class = ProductCursorPagination
+
+    def get_paginator(self, request):
+        mode = request.query_params.get(self.mode_query_param)
+        if mode == self.cursor_mode:
+            return self.cursor_class()
+        return self.page_number_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    @property
+    def display_page_controls(self):
+        paginator = getattr(self, 'paginator', None)
+        return getattr(paginator, 'display_page_controls', False)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_number_class().get_schema_operation_parameters(view),
+            *self.cursor_class().get_schema_operation_parameters(view),
+        ]
+
+
+class AsyncProductPagination(ProductPagination):
+    """
+    Выбор пагинации для async-вью по тому же параметру
+    ``pagination``, что и у ProductPagination.
+    """
+    page_number_class = AsyncProductPageNumberPagination
+    cursor_class = AsyncProductCursorPagination
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return await self.paginator.apaginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_data(self, data):
+        return self.paginator.get_paginated_data(data)
@@ -0,0 +1,259 @@
+import copy
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from .models import Product
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def parse_terms(query):
+    """
+    Разбивает поисковую строку на слова. Остальные символы
+    отбрасываются, поэтому слова безопасно подставлять в синтаксис
+    полнотекстовых запросов.
+    """
+    return TERM_RE.findall(query or '')
+
+
+class SQLiteSearchBackend:
+    """
+    Полнотекстовый поиск на SQLite FTS5.
+    Индекс — external content таблица над products_product,
+    синхронизируется триггерами на INSERT/UPDATE/DELETE.
+    """
+    table = 'products_product_fts'
+    name_weight = 10.0
+    description_weight = 1.0
+
+    install_sql = [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            name, description,
+            content='products_product', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ai
+        AFTER INSERT ON products_product BEGIN
+            INSERT INTO {table}(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ad
+        AFTER DELETE ON products_product BEGIN
+            INSERT INTO {table}({table}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_au
+        AFTER UPDATE OF name, description ON products_product BEGIN
+            INSERT INTO {table}({table}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {table}(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+        """,
+    ]
+    uninstall_sql = [
+        f'DROP TRIGGER IF EXISTS {table}_ai',
+        f'DROP TRIGGER IF EXISTS {table}_ad',
+        f'DROP TRIGGER IF EXISTS {table}_au',
+        f'DROP TABLE IF EXISTS {table}',
+    ]
+    rebuild_sql = [f"INSERT INTO {table}({table}) VALUES ('rebuild')"]
+
+    def build_query(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def _where(self, terms, category_sql):
+        sql = f'WHERE {self.table} MATCH %s'
+        params = [self.build_query(terms)]
+        if category_sql:
+            subquery, subquery_params = category_sql
+            sql += f' AND rowid IN ({subquery})'
+            params.extend(subquery_params)
+        return sql, params
+
+    def search_ids(self, terms, category_sql, limit, offset):
+        where, params = self._where(terms, category_sql)
+        sql = (
+            f'SELECT rowid FROM {self.table} {where} '
+            f'ORDER BY bm25({self.table}, %s, %s), rowid '
+            f'LIMIT %s OFFSET %s'
+        )
+        params.extend([
+            self.name_weight, self.description_weight, limit, offset
+        ])
+        return sql, params
+
+    def count(self, terms, category_sql):
+        where, params = self._where(terms, category_sql)
+        return f'SELECT COUNT(*) FROM {self.table} {where}', params
+
+
+class PostgresSearchBackend:
+    """
+    Полнотекстовый поиск на PostgreSQL.
+    Вектор хранится в генерируемой колонке search_vector (название
+    с весом A, описание с весом B) и индексируется GIN, поэтому
+    синхронизируется самой базой данных.
+    """
+    config = 'simple'
+
+    install_sql = [
+        f"""
+        ALTER TABLE products_product
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{config}', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('{config}', coalesce(description, '')), 'B')
+        ) STORED
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS products_product_search_idx
+        ON products_product USING GIN (search_vector)
+        """,
+    ]
+    uninstall_sql = [
+        'DROP INDEX IF EXISTS products_product_search_idx',
+        'ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector',
+    ]
+    rebuild_sql = ['REINDEX INDEX products_product_search_idx']
+
+    def build_query(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def _from_where(self, terms, category_sql):
+        sql = (
+            f"FROM products_product, to_tsquery('{self.config}', %s) query "
+            f'WHERE search_vector @@ query'
+        )
+        params = [self.build_query(terms)]
+        if category_sql:
+            subquery, subquery_params = category_sql
+            sql += f' AND id IN ({subquery})'
+            params.extend(subquery_params)
+        return sql, params
+
+    def search_ids(self, terms, category_sql, limit, offset):
+        from_where, params = self._from_where(terms, category_sql)
+        sql = (
+            f'SELECT id {from_where} '
+            f'ORDER BY ts_rank(search_vector, query) DESC, id '
+            f'LIMIT %s OFFSET %s'
+        )
+        params.extend([limit, offset])
+        return sql, params
+
+    def count(self, terms, category_sql):
+        from_where, params = self._from_where(terms, category_sql)
+        return f'SELECT COUNT(*) {from_where}', params
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using=None):
+    vendor = (using or connection).vendor
+    backend_class = SEARCH_BACKENDS.get(vendor)
+    return backend_class() if backend_class else None
+
+
+def _execute(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def install_search_index(schema_editor):
+    backend = get_search_backend(schema_editor.connection)
+    if backend:
+        _execute(schema_editor, backend.install_sql)
+
+
+def uninstall_search_index(schema_editor):
+    backend = get_search_backend(schema_editor.connection)
+    if backend:
+        _execute(schema_editor, backend.uninstall_sql)
+
+
+def rebuild_search_index(schema_editor):
+    backend = get_search_backend(schema_editor.connection)
+    if backend:
+        _execute(schema_editor, backend.install_sql)
+        _execute(schema_editor, backend.rebuild_sql)
+
+
+class SearchResults:
+    """
+    Ленивый результат поиска, совместимый с django Paginator:
+    ``count()`` выполняет COUNT по индексу, срез выбирает id
+    нужной страницы в порядке релевантности и загружает продукты
+    одним запросом с категориями. После ``values(*fields)`` срез
+    возвращает словари полей, как ``QuerySet.values()``.
+    """
+
+    def __init__(self, terms, category=None):
+        self.terms = terms
+        self.fields = None
+        self.backend = get_search_backend()
+        if self.backend is None:
+            raise ImproperlyConfigured(
+                f'Full-text search is not supported on {connection.vendor}.'
+            )
+        self.category_sql = None
+        if category is not None:
+            self.category_sql = Product.categories.through.objects.filter(
+                category__path__startswith=category.path
+            ).values('product_id').query.sql_with_params()
+
+    def count(self):
+        sql, params = self.backend.count(self.terms, self.category_sql)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def values(self, *fields):
+        clone = copy.copy(self)
+        clone.fields = fields
+        return clone
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = index.stop - offset
+        if limit <= 0:
+            return []
+        sql, params = self.backend.search_ids(
+            self.terms, self.category_sql, limit, offset
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ids = [row[0] for row in cursor.fetchall()]
+        if self.fields is None:
+            products = Product.objects.prefetch_related(
+                'categories'
+            ).in_bulk(ids)
+        else:
+            products = {
+                row['id']: row for row in Product.objects.filter(
+                    id__in=ids
+                ).values(*self.fields)
+            }
+        return [products[pk] for pk in ids if pk in products]
+
+
+def search_products(query, category=None):
+    return SearchResults(parse_terms(query), category)
@@ -4,9 +4,26 @@ from .models import Category, Product
 
 
 class CategorySerializer(serializers.ModelSerializer):
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(),
+        allow_null=True,
+        required=False
+    )
+
     class Meta:
         model = Category
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'parent']
+
+    def validate_parent(self, value):
+        """Проверка, что категория не становится своей же подкатегорией"""
+        if (
+            value and self.instance and
+            value.is_descendant_of(self.instance)
+        ):
+            raise serializers.ValidationError(
+                "Category cannot be moved into itself or its subcategory."
+            )
+        return value
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -18,7 +35,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['updated_at']
 
     def validate_regular_price(self, value):
         """Проверка, что обычная цена больше нуля"""
@@ -55,3 +72,121 @@ class ProductSerializer(serializers.ModelSerializer):
             )
 
         return data
+
+
+PRODUCT_READ_FIELDS = (
+    'id', 'name', 'regular_price', 'discount_price', 'effective_price',
+    'discount_percent', 'stock', 'stock_version', 'description',
+)
+
+
+def _format_decimal(value):
+    return None if value is None else format(value, 'f')
+
+
+def _represent_products(rows, category_names):
+    # Порядок ключей как у ProductSerializer: объявленное поле
+    # categories идет сразу после id.
+    return [
+        {
+            'id': row['id'],
+            'categories': category_names.get(row['id'], []),
+            'name': row['name'],
+            'regular_price': _format_decimal(row['regular_price']),
+            'discount_price': _format_decimal(row['discount_price']),
+            'effective_price': _format_decimal(row['effective_price']),
+            'discount_percent': row['discount_percent'],
+            'stock': row['stock'],
+            'stock_version': row['stock_version'],
+            'description': row['description'],
+        }
+        for row in rows
+    ]
+
+
+def _category_names_queryset(product_ids):
+    # Категории в порядке добавления связей (pk промежуточной
+    # таблицы), а не в порядке, который выберет план запроса.
+    return Product.categories.through.objects.filter(
+        product__in=product_ids
+    ).order_by('pk').values_list('product', 'category__name')
+
+
+def product_category_names(product_ids):
+    """
+    Имена категорий продуктов одним запросом: {product_id: [name]}.
+    """
+    names = {}
+    for product_id, name in _category_names_queryset(product_ids):
+        names.setdefault(product_id, []).append(name)
+    return names
+
+
+async def aproduct_category_names(product_ids):
+    names = {}
+    async for product_id, name in _category_names_queryset(product_ids):
+        names.setdefault(product_id, []).append(name)
+    return names
+
+
+def read_products(rows):
+    """
+    Представление продуктов только для чтения из строк
+    ``.values(*PRODUCT_READ_FIELDS)`` без полей сериализатора.
+    Совпадает с ProductSerializer(many=True).data.
+    """
+    rows = list(rows)
+    if not rows:
+        return rows
+    return _represent_products(
+        rows, product_category_names([row['id'] for row in rows])
+    )
+
+
+async def aread_products(rows):
+    if not rows:
+        return rows
+    return _represent_products(
+        rows, await aproduct_category_names([row['id'] for row in rows])
+    )
+
+
+class ProductImportSerializer(ProductSerializer):
+    """
+    Сериализатор строки массового импорта. Категории принимаются
+    списком имен без запросов к БД, они разрешаются одним
+    запросом на пачку строк.
+    """
+    id = serializers.IntegerField(required=False, allow_null=True)
+    categories = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        default=list
+    )
+
+
+MAX_STOCK = 2147483647
+
+
+class StockChangeSerializer(serializers.Serializer):
+    """
+    Изменение остатка одного продукта: относительное ``delta``
+    или абсолютное ``stock`` и необязательное предусловие
+    ``version`` — ожидаемый ``stock_version`` продукта.
+    """
+    id = serializers.IntegerField(min_value=1)
+    delta = serializers.IntegerField(
+        required=False, min_value=-MAX_STOCK, max_value=MAX_STOCK
+    )
+    stock = serializers.IntegerField(
+        required=False, min_value=0, max_value=MAX_STOCK
+    )
+    version = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, data):
+        """Проверка, что задано ровно одно из delta и stock"""
+        if ('delta' in data) == ('stock' in data):
+            raise serializers.ValidationError(
+                "Provide exactly one of delta or stock."
+            )
+        return data
@@ -0,0 +1,181 @@
+from django.db import connections
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import facets
+from .cache import invalidate_categories, invalidate_products
+from .models import Category, Product
+from .search import SQLiteSearchBackend, install_search_index
+from .stats import apply_product_change
+from .versions import bump_catalog_version
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    """
+    Запоминает цены и остаток продукта до сохранения и увеличивает
+    ``stock_version``, если остаток изменился.
+    """
+    instance._stats_previous = instance._facets_previous = None
+    if instance.pk is None:
+        return
+    previous = Product.objects.filter(pk=instance.pk).values_list(
+        'regular_price', 'effective_price', 'stock', 'stock_version'
+    ).first()
+    if previous is None:
+        return
+    price, effective_price, stock, stock_version = previous
+    instance._stats_previous = (price, stock)
+    instance._facets_previous = (effective_price, stock)
+    if instance.stock != stock:
+        instance.stock_version = stock_version + 1
+
+
+@receiver(post_save, sender=Product)
+def update_stats_on_save(sender, instance, **kwargs):
+    apply_product_change(
+        previous=getattr(instance, '_stats_previous', None),
+        current=(instance.regular_price, instance.stock),
+    )
+
+
+@receiver(post_delete, sender=Product)
+def update_stats_on_delete(sender, instance, **kwargs):
+    apply_product_change(
+        previous=(instance.regular_price, instance.stock),
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_facets_on_save(sender, instance, **kwargs):
+    facets.apply_product_change(
+        instance.pk,
+        previous=getattr(instance, '_facets_previous', None),
+        current=(instance.effective_price, instance.stock),
+    )
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_categories(sender, instance, **kwargs):
+    """
+    Связи с категориями удаляются каскадно без m2m_changed,
+    поэтому категории продукта запоминаются до удаления.
+    """
+    instance._facets_categories = list(
+        instance.categories.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def update_facets_on_delete(sender, instance, **kwargs):
+    facets.apply_product_change(
+        instance.pk,
+        previous=(instance.effective_price, instance.stock),
+        category_ids=getattr(instance, '_facets_categories', []),
+    )
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def update_facets_on_categories_change(sender, instance, action, reverse,
+                                       pk_set, **kwargs):
+    """
+    Добавление и удаление связей продукта и категории с любой
+    стороны. Для ``clear`` связи запоминаются до очистки.
+    """
+    related = instance.products if reverse else instance.categories
+    if action == 'pre_clear':
+        instance._facets_cleared = set(
+            related.values_list('pk', flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set, sign = getattr(instance, '_facets_cleared', set()), -1
+    elif action in ('post_add', 'post_remove'):
+        sign = 1 if action == 'post_add' else -1
+    else:
+        return
+    if not pk_set:
+        return
+    if reverse:
+        facets.apply_links(pk_set, [instance.pk], sign)
+    else:
+        facets.apply_links([instance.pk], pk_set, sign)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    """
+    SQLite теряет триггеры при пересоздании таблицы в миграциях
+    (ALTER через копирование), поэтому после миграций они
+    восстанавливаются, если поисковый индекс установлен.
+    """
+    if sender.name != 'apps.products':
+        return
+    connection = connections[using]
+    if (
+        connection.vendor == 'sqlite' and
+        SQLiteSearchBackend.table in connection.introspection.table_names()
+    ):
+        with connection.schema_editor() as schema_editor:
+            install_search_index(schema_editor)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def invalidate_product_categories_cache(sender, instance, action, reverse,
+                                        pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_products([instance.pk])
+    elif pk_set:
+        invalidate_products(pk_set)
+    else:
+        invalidate_categories()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    invalidate_categories()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def update_catalog_version_on_product_change(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def update_catalog_version_on_categories_change(sender, instance, action,
+                                                reverse, pk_set, **kwargs):
+    """
+    Изменение категорий меняет ответы продуктов, поэтому их
+    ``updated_at`` обновляется. При очистке категории от продуктов
+    их id неизвестны, и меняется версия категорий.
+    """
+    if not action.startswith('post_'):
+        return
+    if reverse and action == 'post_clear':
+        bump_catalog_version(categories=True)
+        return
+    product_ids = pk_set if reverse else [instance.pk]
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(
+            updated_at=timezone.now()
+        )
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def update_catalog_version_on_category_change(sender, instance, **kwargs):
+    bump_catalog_version(categories=True)
@@ -0,0 +1,183 @@
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    Case, Count, F, Max, Min, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import Product, ProductStats
+
+
+def rebuild_product_stats(if_stale=False):
+    """
+    Полностью пересчитывает статистику по продуктам.
+
+    Строка статистики блокируется до выполнения агрегации, поэтому
+    параллельные инкрементальные обновления либо попадают в агрегат,
+    либо применяются поверх уже пересчитанных значений.
+    С ``if_stale`` свежесть проверяется повторно под блокировкой:
+    параллельные чтения устаревшей статистики ждут один пересчет,
+    а не выполняют каждое свой.
+    """
+    with transaction.atomic():
+        stats, created = (
+            ProductStats.objects.select_for_update().get_or_create(
+                pk=ProductStats.SINGLETON_ID,
+                defaults={'rebuilt_at': timezone.now()}
+            )
+        )
+        if if_stale and not created and not _is_stale(stats):
+            return stats
+        aggregates = Product.objects.aggregate(
+            min_price=Min('regular_price'),
+            max_price=Max('regular_price'),
+            total_stock=Sum('stock'),
+            product_count=Count('id'),
+        )
+        stats.min_price = aggregates['min_price']
+        stats.max_price = aggregates['max_price']
+        stats.total_stock = aggregates['total_stock'] or 0
+        stats.product_count = aggregates['product_count']
+        stats.rebuilt_at = timezone.now()
+        stats.save()
+    return stats
+
+
+def _is_stale(stats):
+    max_age = settings.PRODUCT_STATS_MAX_AGE
+    return stats is None or stats.rebuilt_at < timezone.now() - max_age
+
+
+def _stats_data(stats):
+    return {
+        'min_price': stats.min_price,
+        'max_price': stats.max_price,
+        'total_stock': stats.total_stock,
+    }
+
+
+def get_product_stats():
+    """
+    Возвращает статистику одним чтением по первичному ключу.
+    Пересчитывает ее, если строки нет или она старше
+    PRODUCT_STATS_MAX_AGE.
+    """
+    stats = ProductStats.objects.filter(
+        pk=ProductStats.SINGLETON_ID
+    ).first()
+    if _is_stale(stats):
+        stats = rebuild_product_stats(if_stale=True)
+    return _stats_data(stats)
+
+
+async def aget_product_stats():
+    """
+    Асинхронная версия ``get_product_stats``. Пересчет выполняется
+    в транзакции с блокировкой, поэтому остается синхронным.
+    """
+    stats = await ProductStats.objects.filter(
+        pk=ProductStats.SINGLETON_ID
+    ).afirst()
+    if _is_stale(stats):
+        stats = await sync_to_async(rebuild_product_stats)(if_stale=True)
+    return _stats_data(stats)
+
+
+def _price_bound(field, extreme_ordering, combine, previous, current):
+    """
+    Выражение нового значения min_price/max_price.
+    Если одна из старых цен ``previous`` была границей диапазона,
+    граница пересчитывается подзапросом, иначе расширяется новой
+    ценой ``current``.
+    """
+    output_field = models.DecimalField(max_digits=10, decimal_places=2)
+    value = F(field)
+    if current is not None:
+        price = Value(current, output_field=output_field)
+        value = combine(Coalesce(F(field), price), price)
+    if not previous:
+        return value
+    extreme = Subquery(
+        Product.objects.order_by(extreme_ordering).values('regular_price')[:1]
+    )
+    return Case(
+        When(**{f'{field}__in': previous}, then=extreme),
+        default=value,
+        output_field=output_field,
+    )
+
+
+def _price(price):
+    return None if price is None else Decimal(str(price))
+
+
+def apply_product_changes(changes):
+    """
+    Инкрементально применяет изменения продуктов к статистике.
+
+    ``changes`` — пары ``(previous, current)``, каждая из которых —
+    ``(regular_price, stock)`` до и после изменения или ``None``,
+    если продукта не было (создание) или больше нет (удаление).
+    Обновление выполняется одним атомарным UPDATE, поэтому безопасно
+    при параллельной записи.
+    """
+    stock_delta = count_delta = 0
+    removed_prices = set()
+    added_prices = []
+    for previous, current in changes:
+        previous_price, previous_stock = previous or (None, 0)
+        current_price, current_stock = current or (None, 0)
+        previous_price = _price(previous_price)
+        current_price = _price(current_price)
+        stock_delta += int(current_stock) - int(previous_stock)
+        count_delta += int(current is not None) - int(previous is not None)
+        if previous_price != current_price:
+            if previous_price is not None:
+                removed_prices.add(previous_price)
+            if current_price is not None:
+                added_prices.append(current_price)
+
+    updates = {
+        'total_stock': F('total_stock') + stock_delta,
+        'product_count': F('product_count') + count_delta,
+    }
+    if removed_prices or added_prices:
+        updates['min_price'] = _price_bound(
+            'min_price', 'regular_price', Least,
+            removed_prices, min(added_prices, default=None)
+        )
+        updates['max_price'] = _price_bound(
+            'max_price', '-regular_price', Greatest,
+            removed_prices, max(added_prices, default=None)
+        )
+    ProductStats.objects.filter(pk=ProductStats.SINGLETON_ID).update(**updates)
+
+
+def apply_product_change(previous=None, current=None):
+    """
+    Инкрементально применяет изменение одного продукта к статистике
+    (см. ``apply_product_changes``).
+    """
+    apply_product_changes([(previous, current)])
+
+
+def adjust_total_stock(delta):
+    """
+    Учитывает изменение остатков, выполненное массовым UPDATE
+    в обход сигналов модели. Строка статистики общая, поэтому
+    обновляется после фиксации транзакции, а не блокируется до ее
+    конца; расхождение с пересчетом, выполненным между фиксацией
+    и обновлением, исправит следующий пересчет.
+    """
+    if delta:
+        transaction.on_commit(
+            lambda: ProductStats.objects.filter(
+                pk=ProductStats.SINGLETON_ID
+            ).update(total_stock=F('total_stock') + delta),
+            robust=True,
+        )
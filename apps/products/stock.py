@@ -0,0 +1,107 @@
+from django.db import transaction
+
+from .cache import invalidate_products
+from .facets import apply_stock_transitions
+from .models import Product
+from .serializers import MAX_STOCK
+from .stats import adjust_total_stock
+from .versions import bump_catalog_version
+
+APPLIED = 'applied'
+NOT_FOUND = 'not_found'
+CONFLICT = 'conflict'
+INSUFFICIENT_STOCK = 'insufficient_stock'
+OUT_OF_RANGE = 'out_of_range'
+
+
+def _lock_products(ids, chunk_size):
+    """
+    Блокирует строки продуктов пачками по ``chunk_size`` и
+    возвращает ``{id: (stock, stock_version)}``. Id сортируются
+    по всему запросу, а не внутри пачки, поэтому параллельные
+    запросы блокируют общие строки в одном порядке и не
+    взаимоблокируются.
+    """
+    ids = sorted(set(ids))
+    state = {}
+    for start in range(0, len(ids), chunk_size):
+        state.update(
+            (pk, (stock, stock_version))
+            for pk, stock, stock_version in Product.objects
+            .select_for_update()
+            .filter(pk__in=ids[start:start + chunk_size]).order_by('pk')
+            .values_list('pk', 'stock', 'stock_version')
+        )
+    return state
+
+
+def _apply_change(change, current):
+    """
+    Проверяет предусловие по версии и границы остатка для одного
+    изменения. Возвращает новые ``(stock, stock_version)`` или
+    статус отказа.
+    """
+    stock, stock_version = current
+    if 'version' in change and change['version'] != stock_version:
+        return CONFLICT
+    if 'stock' in change:
+        return change['stock'], stock_version + 1
+    stock += change['delta']
+    if stock < 0:
+        return INSUFFICIENT_STOCK
+    if stock > MAX_STOCK:
+        return OUT_OF_RANGE
+    return stock, stock_version + 1
+
+
+def apply_stock_changes(changes, chunk_size=500):
+    """
+    Применяет проверенные изменения остатков (см.
+    StockChangeSerializer) в одной транзакции и возвращает
+    результат по каждому изменению в исходном порядке.
+
+    Строки всех продуктов запроса блокируются до применения
+    изменений, поэтому изменения проверяются по заблокированному
+    снимку, а итоговые остатки записываются одним UPDATE с CASE
+    на пачку из ``chunk_size`` продуктов, а не UPDATE на изменение.
+
+    Изменения независимы: неудачное предусловие или нехватка
+    остатка не откатывают остальные. Массовые UPDATE не вызывают
+    сигналы, поэтому общий остаток в статистике, фасеты, версия
+    каталога и кеш продуктов обновляются явно.
+    """
+    changes = list(changes)
+    results = []
+    with transaction.atomic():
+        state = _lock_products(
+            [change['id'] for change in changes], chunk_size
+        )
+        before = dict(state)
+        for change in changes:
+            current = state.get(change['id'])
+            if current is None:
+                results.append({'id': change['id'], 'status': NOT_FOUND})
+                continue
+            outcome = _apply_change(change, current)
+            if isinstance(outcome, tuple):
+                current = state[change['id']] = outcome
+                outcome = APPLIED
+            results.append({
+                'id': change['id'], 'status': outcome,
+                'stock': current[0], 'stock_version': current[1],
+            })
+        changed = [pk for pk in state if state[pk] != before[pk]]
+        Product.objects.bulk_update(
+            [
+                Product(pk=pk, stock=state[pk][0], stock_version=state[pk][1])
+                for pk in changed
+            ],
+            ['stock', 'stock_version'], batch_size=chunk_size,
+        )
+        stocks = {pk: (before[pk][0], state[pk][0]) for pk in changed}
+        adjust_total_stock(sum(new - old for old, new in stocks.values()))
+        apply_stock_transitions(stocks)
+        if changed:
+            bump_catalog_version()
+        invalidate_products(changed)
+    return results
@@ -1,14 +1,55 @@
+import json
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import (
+    async_to_sync, iscoroutinefunction, sync_to_async,
+)
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max, Min, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIClient, APIRequestFactory, APITestCase, force_authenticate,
+)
 
-from .models import Category, Product
+from .cache import aget_cached_entry, get_cached_entry
+from .facets import get_facets
+from .imports import read_rows
+from .models import (
+    CatalogVersion, Category, CategoryFacet, PriceFacet, Product,
+    ProductStats,
+)
+from .serializers import (
+    PRODUCT_READ_FIELDS, ProductSerializer, read_products,
+)
+from .stats import rebuild_product_stats
+from .views import ProductDetailView, ProductExportView, ProductStockView
 from apps.users.models import User
+from apps.users.tokens import UserRefreshToken
+from mini_online_store.renderers import FastJSONRenderer
+from mini_online_store.routers import (
+    PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter,
+)
 
 
 class ProductTests(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.employee_user = User.objects.create_user(
             username='employeeuser',
@@ -142,3 +183,1787 @@ class ProductTests(APITestCase):
         self.assertIn('min_price', response.data)
         self.assertIn('max_price', response.data)
         self.assertIn('total_stock', response.data)
+
+
+class ProductQueryCountTests(APITestCase):
+    """
+    Проверяет, что количество запросов к БД на эндпоинтах продуктов
+    не зависит от количества продуктов на странице.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category_1 = Category.objects.create(name='Electronics')
+        self.category_2 = Category.objects.create(name='Books')
+
+    def _create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Product {i}',
+                regular_price='100.00',
+                stock=i,
+                description='Description'
+            )
+            product.categories.add(self.category_1, self.category_2)
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context)
+
+    def _assert_constant_queries(self, url, expected):
+        self._create_products(2)
+        self.assertEqual(self._count_queries(url), expected)
+        self._create_products(20)
+        self.assertEqual(self._count_queries(url), expected)
+
+    def test_product_viewset_list_queries(self):
+        """
+        Версия каталога, COUNT, выборка продуктов и одна выборка
+        категорий.
+        """
+        self._assert_constant_queries(reverse('product-list'), 4)
+
+    def test_product_list_view_queries(self):
+        """
+        Версия каталога, COUNT, выборка продуктов и одна выборка
+        категорий.
+        """
+        self._assert_constant_queries(reverse('product-list-view'), 4)
+
+    def test_products_by_category_queries(self):
+        """
+        Версия каталога, поиск категории, COUNT, выборка продуктов
+        и категорий.
+        """
+        url = reverse(
+            'products-by-category', kwargs={'category_name': 'Electronics'}
+        )
+        self._assert_constant_queries(url, 5)
+
+    def test_product_detail_queries(self):
+        """
+        Версия каталога и время изменения продукта для валидаторов,
+        выборка продукта и одна выборка его категорий.
+        """
+        self._create_products(1)
+        product = Product.objects.get()
+        url = reverse('product-detail', kwargs={'pk': product.pk})
+        self.assertEqual(self._count_queries(url), 4)
+
+    def test_category_list_queries(self):
+        """
+        Версия категорий, COUNT и выборка категорий при промахе
+        кеша, ни одного запроса при попадании.
+        """
+        self.assertEqual(self._count_queries(reverse('category-list')), 3)
+        self.assertEqual(self._count_queries(reverse('category-list')), 0)
+
+    def test_product_stats_queries(self):
+        """
+        Версия каталога и одно чтение предрассчитанной строки
+        статистики.
+        """
+        rebuild_product_stats()
+        self._assert_constant_queries(reverse('product-stats'), 2)
+
+
+class ProductPaginationTests(APITestCase):
+    """
+    Тесты курсорной пагинации и пагинации без подсчета количества.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Electronics')
+        for i in range(25):
+            product = Product.objects.create(
+                name=f'Product {i}',
+                regular_price=f'{100 + i % 4}.00',
+                stock=i,
+                description='Description'
+            )
+            product.categories.add(self.category)
+        self.url = reverse('product-list-view')
+
+    def _walk(self, url):
+        results = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            results.extend(response.data['results'])
+            url = response.data['next']
+        return results
+
+    def test_cursor_pagination_by_id(self):
+        """Курсорный обход возвращает все продукты по возрастанию id."""
+        results = self._walk(self.url + '?pagination=cursor')
+        ids = [item['id'] for item in results]
+        expected = list(
+            Product.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cursor_pagination_by_price(self):
+        """
+        Курсорный обход с сортировкой по цене корректно проходит
+        одинаковые цены и не теряет и не дублирует продукты.
+        """
+        url = reverse(
+            'products-by-category', kwargs={'category_name': 'Electronics'}
+        )
+        results = self._walk(
+            url + '?pagination=cursor&ordering=-regular_price'
+        )
+        expected = list(
+            Product.objects.order_by('-regular_price', 'id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual([item['id'] for item in results], expected)
+
+    def test_cursor_pagination_previous_link(self):
+        """Ссылка previous возвращает предыдущую страницу."""
+        first = self.client.get(self.url + '?pagination=cursor')
+        second = self.client.get(first.data['next'])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual(previous.data['results'], first.data['results'])
+
+    def test_cursor_pagination_queries(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        first = self.client.get(self.url + '?pagination=cursor')
+        with self.assertNumQueries(3):
+            response = self.client.get(first.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор возвращает 404."""
+        response = self.client.get(self.url + '?pagination=cursor&cursor=bad')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_pagination_without_count(self):
+        """?count=false убирает count и не выполняет COUNT(*)."""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url + '?count=false&page=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        self.assertEqual(len(self._walk(self.url + '?count=false')), 25)
+
+
+class ProductEffectivePriceTests(APITestCase):
+    """
+    Тесты хранимой цены со скидкой и фильтров по ней.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Electronics')
+        prices = [
+            ('100.00', None), ('80.00', '60.00'), ('300.00', '99.99'),
+            ('50.00', None), ('120.00', '119.99'),
+        ]
+        self.products = []
+        for number, (regular_price, discount_price) in enumerate(prices):
+            product = Product.objects.create(
+                name=f'Product {number}',
+                regular_price=regular_price,
+                discount_price=discount_price,
+                stock=1,
+                description=''
+            )
+            if number % 2 == 0:
+                product.categories.add(self.category)
+            self.products.append(product)
+        self.url = reverse('product-list-view')
+
+    def _ids(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = json.loads(response.content)['results']
+        return [item['id'] for item in results]
+
+    def test_prices_kept_in_sync_on_save(self):
+        product = Product.objects.get(pk=self.products[2].pk)
+        self.assertEqual(product.effective_price, Decimal('99.99'))
+        self.assertEqual(product.discount_percent, 66)
+        product.discount_price = None
+        product.save(update_fields=['discount_price'])
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal('300.00'))
+        self.assertEqual(product.discount_percent, 0)
+
+    def test_prices_kept_in_sync_on_bulk_writes(self):
+        created = Product.objects.bulk_create([Product(
+            name='Bulk', regular_price=Decimal('40.00'),
+            discount_price=Decimal('30.00'), stock=1, description=''
+        )])
+        product = Product.objects.get(pk=created[0].pk)
+        self.assertEqual(
+            (product.effective_price, product.discount_percent),
+            (Decimal('30.00'), 25)
+        )
+        product.discount_price = Decimal('10.00')
+        Product.objects.bulk_update([product], ['discount_price'])
+        product.refresh_from_db()
+        self.assertEqual(
+            (product.effective_price, product.discount_percent),
+            (Decimal('10.00'), 75)
+        )
+
+    def test_min_max_price_filter(self):
+        response = self.client.get(
+            self.url, {'min_price': '60', 'max_price': '100'}
+        )
+        self.assertEqual(self._ids(response), [
+            self.products[0].pk, self.products[1].pk, self.products[2].pk,
+        ])
+        response = self.client.get(self.url, {'min_price': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('min_price', response.data)
+        response = self.client.get(self.url, {'max_price': '-1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_by_effective_price(self):
+        response = self.client.get(self.url, {'ordering': 'effective_price'})
+        self.assertEqual(self._ids(response), [
+            self.products[index].pk for index in (3, 1, 2, 0, 4)
+        ])
+        self.assertEqual(
+            response.data['results'][1]['effective_price'], '60.00'
+        )
+        response = self.client.get(self.url, {
+            'ordering': '-discount_percent', 'pagination': 'cursor',
+        })
+        self.assertEqual(self._ids(response), [
+            self.products[index].pk for index in (2, 1, 0, 3, 4)
+        ])
+
+    def test_category_filter_and_ordering(self):
+        url = reverse(
+            'products-by-category', kwargs={'category_name': 'Electronics'}
+        )
+        response = self.client.get(url, {
+            'min_price': '99.99', 'ordering': '-effective_price',
+        })
+        self.assertEqual(self._ids(response), [
+            self.products[4].pk, self.products[0].pk, self.products[2].pk,
+        ])
+        response = self.client.get(
+            reverse('async-product-list'), {'max_price': '60'}
+        )
+        self.assertEqual(self._ids(response), [
+            self.products[1].pk, self.products[3].pk,
+        ])
+
+    def test_price_filter_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan format is specific to SQLite.')
+        queryset = Product.objects.filter(
+            effective_price__gte=10
+        ).order_by('effective_price', 'id')
+        self.assertIn('product_eff_price_id_idx', queryset.explain())
+
+
+class ProductStatsTests(APITestCase):
+    """
+    Тесты инкрементально поддерживаемой статистики по продуктам.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=self.user)
+        rebuild_product_stats()
+        self.cheap = self._create('10.00', 5)
+        self.middle = self._create('50.00', 7)
+        self.expensive = self._create('90.00', 3)
+
+    def _create(self, price, stock):
+        return Product.objects.create(
+            name=f'Product {price}',
+            regular_price=price,
+            stock=stock,
+            description='Description'
+        )
+
+    def _assert_stats_match_table(self):
+        expected = Product.objects.aggregate(
+            min_price=Min('regular_price'),
+            max_price=Max('regular_price'),
+            total_stock=Sum('stock')
+        )
+        expected['total_stock'] = expected['total_stock'] or 0
+        stats = ProductStats.objects.get()
+        self.assertEqual(stats.min_price, expected['min_price'])
+        self.assertEqual(stats.max_price, expected['max_price'])
+        self.assertEqual(stats.total_stock, expected['total_stock'])
+        self.assertEqual(stats.product_count, Product.objects.count())
+
+    def test_stats_follow_create(self):
+        """Создание продукта расширяет диапазон цен и остаток."""
+        self._create('5.00', 1)
+        self._create('120.00', 2)
+        self._assert_stats_match_table()
+
+    def test_stats_follow_update(self):
+        """Изменение цены граничного продукта пересчитывает границу."""
+        self.cheap.regular_price = Decimal('70.00')
+        self.cheap.stock = 20
+        self.cheap.save()
+        self.expensive.regular_price = Decimal('60.00')
+        self.expensive.save()
+        self._assert_stats_match_table()
+
+    def test_stats_follow_delete(self):
+        """Удаление продуктов корректно обновляет статистику."""
+        self.expensive.delete()
+        self._assert_stats_match_table()
+        self.cheap.delete()
+        self.middle.delete()
+        self._assert_stats_match_table()
+
+    def test_stale_stats_are_rebuilt_on_read(self):
+        """Статистика старше PRODUCT_STATS_MAX_AGE пересчитывается."""
+        Product.objects.filter(pk=self.middle.pk).update(stock=100)
+        ProductStats.objects.update(
+            rebuilt_at=timezone.now() - timedelta(days=1)
+        )
+        response = self.client.get(reverse('product-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_stock'], 108)
+        self.assertEqual(response.data['min_price'], Decimal('10.00'))
+        self.assertEqual(response.data['max_price'], Decimal('90.00'))
+
+    def test_rebuild_skipped_if_fresh(self):
+        """
+        Чтение, дождавшееся блокировки после чужого пересчета,
+        не пересчитывает статистику повторно.
+        """
+        rebuild_product_stats()
+        with self.assertNumQueries(3):
+            rebuild_product_stats(if_stale=True)
+        ProductStats.objects.update(
+            rebuilt_at=timezone.now() - timedelta(days=1)
+        )
+        with self.assertNumQueries(5):
+            rebuild_product_stats(if_stale=True)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_product_stats пересчитывает статистику."""
+        Product.objects.filter(pk=self.cheap.pk).update(regular_price=1)
+        call_command('rebuild_product_stats', stdout=StringIO())
+        self._assert_stats_match_table()
+
+
+class CategoryTreeTests(APITestCase):
+    """
+    Тесты иерархии категорий и выборки продуктов по поддереву.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.employee_user = User.objects.create_user(
+            username='employeeuser',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.employee_user)
+        self.electronics = Category.objects.create(name='Electronics')
+        self.computers = Category.objects.create(
+            name='Computers', parent=self.electronics
+        )
+        self.laptops = Category.objects.create(
+            name='Laptops', parent=self.computers
+        )
+        self.books = Category.objects.create(name='Books')
+        self.laptop = self._create('Laptop', self.laptops, self.computers)
+        self.monitor = self._create('Monitor', self.computers)
+        self.book = self._create('Book', self.books)
+
+    def _create(self, name, *categories):
+        product = Product.objects.create(
+            name=name,
+            regular_price='100.00',
+            stock=1,
+            description='Description'
+        )
+        product.categories.add(*categories)
+        return product
+
+    def _names(self, category_name):
+        url = reverse(
+            'products-by-category', kwargs={'category_name': category_name}
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.data['results']]
+
+    def test_category_path(self):
+        """Путь категории состоит из id всех ее предков."""
+        self.assertEqual(
+            self.laptops.path,
+            f'{self.electronics.pk:010d}/{self.computers.pk:010d}/'
+            f'{self.laptops.pk:010d}/'
+        )
+
+    def test_products_from_subcategories(self):
+        """
+        Возвращаются продукты категории и всех ее подкатегорий
+        без дубликатов.
+        """
+        self.assertEqual(self._names('Electronics'), ['Laptop', 'Monitor'])
+        self.assertEqual(self._names('Laptops'), ['Laptop'])
+        self.assertEqual(self._names('Books'), ['Book'])
+
+    def test_unknown_category(self):
+        """Для несуществующей категории возвращается 404."""
+        url = reverse(
+            'products-by-category', kwargs={'category_name': 'Unknown'}
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_move_category_updates_subtree(self):
+        """Перенос категории пересчитывает пути всех подкатегорий."""
+        response = self.client.patch(
+            reverse('category-detail', kwargs={'pk': self.computers.pk}),
+            {'parent': self.books.pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.laptops.refresh_from_db()
+        self.assertTrue(self.laptops.path.startswith(self.books.path))
+        self.assertEqual(self._names('Electronics'), [])
+        self.assertEqual(self._names('Books'), ['Laptop', 'Monitor', 'Book'])
+
+    def test_move_category_into_descendant(self):
+        """Категорию нельзя перенести в ее подкатегорию."""
+        response = self.client.patch(
+            reverse('category-detail', kwargs={'pk': self.electronics.pk}),
+            {'parent': self.laptops.pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTests(APITestCase):
+    """
+    Тесты полнотекстового поиска продуктов.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=self.user)
+        self.electronics = Category.objects.create(name='Electronics')
+        self.laptops = Category.objects.create(
+            name='Laptops', parent=self.electronics
+        )
+        self.books = Category.objects.create(name='Books')
+        self.laptop = self._create(
+            'Gaming laptop', 'Fast laptop for games', self.laptops
+        )
+        self.bag = self._create(
+            'Backpack', 'Bag that fits a laptop', self.electronics
+        )
+        self.book = self._create(
+            'Laptop repair guide', 'Book about hardware', self.books
+        )
+        self.url = reverse('product-search')
+
+    def _create(self, name, description, category):
+        product = Product.objects.create(
+            name=name,
+            regular_price='100.00',
+            stock=1,
+            description=description
+        )
+        product.categories.add(category)
+        return product
+
+    def _search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_ranks_name_matches_first(self):
+        """Совпадения в названии ранжируются выше, чем в описании."""
+        ids = self._search(q='laptop')
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids[-1], self.bag.pk)
+
+    def test_search_by_prefix(self):
+        """Слова запроса ищутся по префиксу."""
+        self.assertEqual(self._search(q='backp'), [self.bag.pk])
+        self.assertEqual(self._search(q='gam lap'), [self.laptop.pk])
+
+    def test_search_with_category(self):
+        """Поиск ограничивается категорией и ее подкатегориями."""
+        ids = self._search(q='laptop', category='Electronics')
+        self.assertCountEqual(ids, [self.laptop.pk, self.bag.pk])
+        self.assertEqual(
+            self._search(q='laptop', category='Books'), [self.book.pk]
+        )
+
+    def test_search_index_follows_writes(self):
+        """Индекс обновляется при изменении и удалении продуктов."""
+        self.bag.name = 'Tablet sleeve'
+        self.bag.description = 'Sleeve'
+        self.bag.save()
+        self.assertEqual(self._search(q='sleeve'), [self.bag.pk])
+        self.assertNotIn(self.bag.pk, self._search(q='laptop'))
+        self.book.delete()
+        self.assertEqual(self._search(q='repair'), [])
+
+    def test_search_requires_query(self):
+        """Пустой запрос возвращает 400."""
+        response = self.client.get(self.url, {'q': ' !'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductImportTests(APITestCase):
+    """
+    Тесты массовой загрузки продуктов.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.employee_user = User.objects.create_user(
+            username='employeeuser',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.employee_user)
+        self.electronics = Category.objects.create(name='Electronics')
+        self.books = Category.objects.create(name='Books')
+        self.existing = Product.objects.create(
+            name='Old laptop',
+            regular_price='1000.00',
+            stock=1,
+            description='Old'
+        )
+        self.existing.categories.add(self.books)
+        self.url = reverse('product-import')
+
+    def _import(self, body, content_type, **params):
+        url = self.url
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return self.client.post(url, body, content_type=content_type)
+
+    def test_import_csv(self):
+        """
+        CSV создает новые продукты, обновляет существующие по id
+        и сообщает об ошибочных строках, не прерывая загрузку.
+        """
+        body = (
+            'id,name,regular_price,discount_price,stock,description,'
+            'categories\n'
+            ',Phone,500.00,450.00,10,New phone,Electronics\n'
+            f'{self.existing.pk},New laptop,900.00,,3,Updated,'
+            'Electronics|Books\n'
+            ',Broken,-1,,1,Bad price,Electronics\n'
+            ',Ghost,10.00,,1,Unknown category,Unknown\n'
+        )
+        response = self._import(body, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['error_count'], 2)
+        self.assertEqual(
+            [error['row'] for error in response.data['errors']], [3, 4]
+        )
+        phone = Product.objects.get(name='Phone')
+        self.assertEqual(phone.discount_price, Decimal('450.00'))
+        self.assertEqual(
+            list(phone.categories.values_list('name', flat=True)),
+            ['Electronics']
+        )
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'New laptop')
+        self.assertIsNone(self.existing.discount_price)
+        self.assertEqual(self.existing.categories.count(), 2)
+        self.assertEqual(ProductStats.objects.get().total_stock, 13)
+
+    def test_import_updates_stats_and_facets_per_batch(self):
+        """
+        Статистика и фасеты обновляются изменениями пачек без полного
+        пересчета; повтор id в пачке — ошибка строки.
+        """
+        cheap = Product.objects.create(
+            name='Cheap', regular_price='5.00', stock=0, description='-'
+        )
+        body = (
+            'id,name,regular_price,stock,description,categories\n'
+            f'{self.existing.pk},Laptop,700.00,0,Sale,Electronics\n'
+            f'{cheap.pk},Cheap,50.00,4,-,Books|Electronics\n'
+            f'{self.existing.pk},Laptop,800.00,1,Again,Books\n'
+            ',Tablet,300.00,2,New,Books\n'
+        )
+        with mock.patch(
+            'apps.products.stats.rebuild_product_stats'
+        ) as rebuild, self.captureOnCommitCallbacks(execute=True):
+            response = self._import(body, 'text/csv', batch_size=3)
+        rebuild.assert_not_called()
+        self.assertEqual(
+            (response.data['created'], response.data['updated']), (1, 2)
+        )
+        self.assertEqual(response.data['errors'], [{
+            'row': 3, 'errors': {'id': [
+                f'Product with id {self.existing.pk} is repeated '
+                'in this batch.'
+            ]},
+        }])
+        stats = ProductStats.objects.get()
+        self.assertEqual(
+            (stats.min_price, stats.max_price, stats.total_stock,
+             stats.product_count),
+            (Decimal('50.00'), Decimal('700.00'), 6, 3)
+        )
+        self.assertEqual(get_facets(), get_facets(Product.objects.all()))
+
+    def test_import_ndjson(self):
+        """NDJSON загружается, некорректная строка попадает в отчет."""
+        body = (
+            '{"name": "Book", "regular_price": "10.00", "stock": 5, '
+            '"description": "Novel", "categories": ["Books"]}\n'
+            'not json\n'
+        )
+        response = self._import(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertTrue(Product.objects.filter(name='Book').exists())
+
+    def test_import_queries_do_not_depend_on_rows(self):
+        """Категории и продукты разрешаются одним запросом на пачку."""
+        def body(count):
+            lines = ['name,regular_price,stock,description,categories']
+            lines += [
+                f'Item {i},10.00,1,Item,Electronics|Books'
+                for i in range(count)
+            ]
+            return '\n'.join(lines) + '\n'
+
+        with CaptureQueriesContext(connection) as small:
+            self._import(body(2), 'text/csv', batch_size=100)
+        with CaptureQueriesContext(connection) as large:
+            self._import(body(50), 'text/csv', batch_size=100)
+        self.assertEqual(len(small), len(large))
+
+    def test_import_keeps_version_without_stock_change(self):
+        """
+        ``stock_version`` увеличивается, только если импорт изменил
+        остаток.
+        """
+        other = Product.objects.create(
+            name='Other', regular_price='10.00', stock=5, description='-'
+        )
+        body = (
+            'id,name,regular_price,stock,description,categories\n'
+            f'{self.existing.pk},Old laptop,800.00,1,Cheaper,Books\n'
+            f'{other.pk},Other,10.00,6,-,Books\n'
+        )
+        response = self._import(body, 'text/csv')
+        self.assertEqual(response.data['updated'], 2)
+        self.existing.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.existing.regular_price, Decimal('800.00'))
+        self.assertEqual(self.existing.stock_version, 0)
+        self.assertEqual(other.stock_version, 1)
+
+    def test_import_invalid_encoding(self):
+        """Тело не в UTF-8 возвращает 400, а не 500."""
+        body = (
+            'name,regular_price,stock,description,categories\n'
+            'Чайник,10.00,1,Кухня,Books\n'
+        ).encode('cp1251')
+        response = self._import(body, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+        self.assertFalse(Product.objects.filter(description='Кухня'))
+
+    def test_import_unsupported_content_type(self):
+        """Неподдерживаемый формат возвращает 415."""
+        response = self._import('{}', 'application/xml')
+        self.assertEqual(
+            response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    def test_import_forbidden_for_user(self):
+        """Обычный пользователь не может загружать продукты."""
+        user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=user)
+        response = self._import('name\n', 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_command(self):
+        """Команда import_products загружает файл."""
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', delete=False
+        ) as source:
+            source.write(
+                'name,regular_price,stock,description,categories\n'
+                'Tablet,300.00,4,Tablet,Electronics\n'
+            )
+        self.addCleanup(os.remove, source.name)
+        out = StringIO()
+        call_command('import_products', source.name, stdout=out)
+        self.assertIn('Created: 1', out.getvalue())
+        self.assertTrue(Product.objects.filter(name='Tablet').exists())
+
+
+class ProductStockTests(APITestCase):
+    """
+    Тесты массового изменения остатков.
+    """
+    LOCK_QUERY = (
+        'SELECT "products_product"."id", "products_product"."stock", '
+        '"products_product"."stock_version"'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.employee_user = User.objects.create_user(
+            username='employeeuser',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.employee_user)
+        self.phone = Product.objects.create(
+            name='Phone', regular_price='500.00', stock=10, description=''
+        )
+        self.laptop = Product.objects.create(
+            name='Laptop', regular_price='900.00', stock=2, description=''
+        )
+        rebuild_product_stats()
+        self.url = reverse('product-stock')
+
+    def _post(self, changes):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, changes, format='json')
+
+    def test_deltas_and_absolute_values(self):
+        response = self._post([
+            {'id': self.phone.pk, 'delta': -3},
+            {'id': self.laptop.pk, 'stock': 7},
+            {'id': self.phone.pk, 'delta': 5},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(response.data['failed'], 0)
+        self.assertEqual(response.data['results'], [
+            {'id': self.phone.pk, 'status': 'applied',
+             'stock': 7, 'stock_version': 1},
+            {'id': self.laptop.pk, 'status': 'applied',
+             'stock': 7, 'stock_version': 1},
+            {'id': self.phone.pk, 'status': 'applied',
+             'stock': 12, 'stock_version': 2},
+        ])
+        self.phone.refresh_from_db()
+        self.assertEqual(
+            (self.phone.stock, self.phone.stock_version), (12, 2)
+        )
+        self.assertEqual(
+            ProductStats.objects.get().total_stock, 19
+        )
+
+    def test_stock_never_goes_negative(self):
+        response = self._post([
+            {'id': self.laptop.pk, 'delta': -3},
+            {'id': self.laptop.pk, 'delta': -2},
+            {'id': self.laptop.pk, 'delta': -1},
+        ])
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['insufficient_stock', 'applied', 'insufficient_stock']
+        )
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock, 0)
+        self.assertEqual(ProductStats.objects.get().total_stock, 10)
+
+    def test_version_precondition(self):
+        response = self._post([
+            {'id': self.phone.pk, 'delta': 1, 'version': 0},
+            {'id': self.phone.pk, 'stock': 100, 'version': 0},
+            {'id': self.laptop.pk, 'delta': 1},
+            {'id': 999999, 'delta': 1},
+        ])
+        self.assertEqual(response.data['applied'], 2)
+        self.assertEqual(response.data['results'][1], {
+            'id': self.phone.pk, 'status': 'conflict',
+            'stock': 11, 'stock_version': 1,
+        })
+        self.assertEqual(
+            response.data['results'][3], {'id': 999999, 'status': 'not_found'}
+        )
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.stock, 11)
+
+    def test_version_changes_with_stock_on_save(self):
+        self.phone.stock = 4
+        self.phone.save()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.stock_version, 1)
+        self.phone.name = 'Renamed phone'
+        self.phone.save()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.stock_version, 1)
+        response = self.client.get(
+            reverse('product-detail', args=[self.phone.pk])
+        )
+        self.assertEqual(response.data['stock_version'], 1)
+
+    def test_invalid_request_changes_nothing(self):
+        response = self._post([
+            {'id': self.phone.pk, 'delta': -1},
+            {'id': self.laptop.pk, 'delta': 1, 'stock': 3},
+            {'id': self.laptop.pk, 'stock': -1},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('non_field_errors', response.data[1])
+        self.assertIn('stock', response.data[2])
+        response = self._post({'id': self.phone.pk, 'delta': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.stock, 10)
+
+    def test_chunked_changes_query_count(self):
+        """
+        На пачку продуктов — один запрос блокировки строк и один
+        UPDATE, независимо от числа изменений.
+        """
+        changes = [
+            {'id': self.laptop.pk, 'delta': 1},
+            {'id': self.phone.pk, 'delta': 1},
+        ] * 3
+        for chunk_size, expected in ((2, 1), (1, 2)):
+            with mock.patch.object(ProductStockView, 'chunk_size', chunk_size):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self._post(changes)
+            self.assertEqual(response.data['applied'], 6)
+            sql = [query['sql'] for query in queries.captured_queries]
+            locks = [
+                query for query in sql
+                if query.startswith(self.LOCK_QUERY)
+            ]
+            updates = [
+                query for query in sql
+                if query.startswith('UPDATE "products_product"')
+            ]
+            self.assertEqual((len(locks), len(updates)), (expected, expected))
+        self.phone.refresh_from_db()
+        self.assertEqual(
+            (self.phone.stock, self.phone.stock_version), (16, 6)
+        )
+
+    def test_rows_locked_in_id_order(self):
+        """
+        Строки блокируются в порядке id по всему запросу, а не
+        внутри пачки, независимо от порядка изменений.
+        """
+        with mock.patch.object(ProductStockView, 'chunk_size', 1):
+            with CaptureQueriesContext(connection) as queries:
+                self._post([
+                    {'id': self.laptop.pk, 'delta': 1},
+                    {'id': self.phone.pk, 'delta': 1},
+                ])
+        locks = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(self.LOCK_QUERY)
+        ]
+        self.assertEqual(len(locks), 2)
+        first, second = sorted([self.phone.pk, self.laptop.pk])
+        self.assertIn(f'IN ({first})', locks[0])
+        self.assertIn(f'IN ({second})', locks[1])
+
+    def test_detail_cache_invalidated(self):
+        url = reverse('product-detail', args=[self.phone.pk])
+        self.assertEqual(self.client.get(url).data['stock'], 10)
+        self._post([{'id': self.phone.pk, 'delta': -4}])
+        self.assertEqual(self.client.get(url).data['stock'], 6)
+
+    def test_requires_employee(self):
+        user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(
+            self.url, [{'id': self.phone.pk, 'delta': 1}], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductFacetsTests(APITestCase):
+    """
+    Тесты фасетов каталога и материализованных счетчиков.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.employee_user = User.objects.create_user(
+            username='employeeuser',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.employee_user)
+        self.electronics = Category.objects.create(name='Electronics')
+        self.phones = Category.objects.create(
+            name='Phones', parent=self.electronics
+        )
+        self.books = Category.objects.create(name='Books')
+        self.phone = self._product('Phone', '600.00', 5, self.phones)
+        self.laptop = self._product(
+            'Laptop', '1200.00', 0, self.electronics
+        )
+        self.novel = self._product('Novel', '20.00', 3, self.books)
+        self.atlas = Product.objects.create(
+            name='Atlas', regular_price='80.00', discount_price='45.00',
+            stock=1, description=''
+        )
+        self.atlas.categories.set([self.books, self.electronics])
+        self.url = reverse('product-facets')
+
+    def _product(self, name, price, stock, category):
+        product = Product.objects.create(
+            name=name, regular_price=price, stock=stock, description=''
+        )
+        product.categories.add(category)
+        return product
+
+    def assertFacetsConsistent(self):
+        """Материализованные счетчики совпадают с полным пересчетом."""
+        self.assertEqual(get_facets(), get_facets(Product.objects.all()))
+
+    def test_unfiltered_facets(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['categories'], [
+            {'id': self.electronics.pk, 'name': 'Electronics',
+             'count': 2, 'in_stock': 1},
+            {'id': self.phones.pk, 'name': 'Phones',
+             'count': 1, 'in_stock': 1},
+            {'id': self.books.pk, 'name': 'Books',
+             'count': 2, 'in_stock': 2},
+        ])
+        self.assertEqual(response.data['prices'], [
+            {'min': 0, 'max': 50, 'count': 2, 'in_stock': 2},
+            {'min': 50, 'max': 100, 'count': 0, 'in_stock': 0},
+            {'min': 100, 'max': 500, 'count': 0, 'in_stock': 0},
+            {'min': 500, 'max': 1000, 'count': 1, 'in_stock': 1},
+            {'min': 1000, 'max': 5000, 'count': 1, 'in_stock': 0},
+            {'min': 5000, 'max': None, 'count': 0, 'in_stock': 0},
+        ])
+        self.assertFacetsConsistent()
+
+    def test_filtered_facets(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                self.url, {'category': 'Electronics', 'max_price': '1000'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (item['name'], item['count'])
+                for item in response.data['categories']
+            ],
+            [('Electronics', 1), ('Phones', 1), ('Books', 1)]
+        )
+        self.assertEqual(
+            [item['count'] for item in response.data['prices']],
+            [1, 0, 0, 1, 0, 0]
+        )
+        response = self.client.get(self.url, {'category': 'Unknown'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_counts_follow_product_writes(self):
+        self.phone.stock = 0
+        self.phone.save()
+        self.assertFacetsConsistent()
+        self.laptop.discount_price = '90.00'
+        self.laptop.stock = 2
+        self.laptop.save()
+        self.assertFacetsConsistent()
+        self.atlas.delete()
+        self.assertFacetsConsistent()
+
+    def test_counts_follow_category_links(self):
+        self.electronics.products.add(self.novel, self.phone)
+        self.assertFacetsConsistent()
+        self.books.products.remove(self.novel)
+        self.assertFacetsConsistent()
+        self.electronics.products.clear()
+        self.assertFacetsConsistent()
+        self.phone.categories.set([self.books])
+        self.assertFacetsConsistent()
+        self.phone.categories.clear()
+        self.assertFacetsConsistent()
+        self.books.delete()
+        self.assertFacetsConsistent()
+
+    def test_counts_follow_bulk_stock_changes(self):
+        response = self.client.post(reverse('product-stock'), [
+            {'id': self.novel.pk, 'delta': -3},
+            {'id': self.laptop.pk, 'stock': 4},
+            {'id': self.phone.pk, 'delta': -5},
+            {'id': self.phone.pk, 'delta': 1},
+        ], format='json')
+        self.assertEqual(response.data['applied'], 4)
+        self.assertFacetsConsistent()
+
+    def test_rebuild_command(self):
+        CategoryFacet.objects.all().delete()
+        PriceFacet.objects.update(product_count=0, in_stock_count=0)
+        out = StringIO()
+        call_command('rebuild_product_facets', stdout=out)
+        self.assertIn('3 categories', out.getvalue())
+        self.assertFacetsConsistent()
+
+
+class ProductExportTests(APITestCase):
+    """
+    Тесты потоковой выгрузки каталога.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='normaluser',
+            email='user@example.com',
+            password='userpassword123',
+            role=User.USER
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Electronics')
+        self.url = reverse('product-export')
+        self._create_products(3)
+
+    def _create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Product, "{i}"',
+                regular_price='10.00',
+                stock=i,
+                description='Line one\nline two'
+            )
+            product.categories.add(self.category)
+
+    def _content(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_ndjson(self):
+        """NDJSON совпадает с ответом ProductSerializer."""
+        lines = self._content().splitlines()
+        self.assertEqual(len(lines), 3)
+        product = Product.objects.order_by('id').first()
+        self.assertEqual(
+            json.loads(lines[0]),
+            json.loads(json.dumps(ProductSerializer(product).data))
+        )
+
+    def test_export_csv_round_trip(self):
+        """CSV выгрузки читается импортом."""
+        rows = list(read_rows(
+            StringIO(self._content(output='csv'), newline=''), 'csv'
+        ))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['name'], 'Product, "0"')
+        self.assertEqual(rows[0]['description'], 'Line one\nline two')
+        self.assertEqual(rows[0]['categories'], ['Electronics'])
+
+    def test_export_queries_per_chunk(self):
+        """Категории подгружаются одним запросом на пачку продуктов."""
+        self._create_products(7)
+        with mock.patch.object(ProductExportView, 'chunk_size', 5):
+            response = self.client.get(self.url)
+            with CaptureQueriesContext(connection) as context:
+                b''.join(response.streaming_content)
+        # Выборка продуктов и по запросу категорий на каждую из 2 пачек.
+        self.assertEqual(len(context), 3)
+
+    def test_export_unsupported_output(self):
+        """Неизвестный формат возвращает 400."""
+        response = self.client.get(self.url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CatalogCacheTests(APITestCase):
+    """
+    Тесты кеширования ответов продуктов и категорий.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='employeeuser',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Laptop',
+            regular_price='1000.00',
+            stock=5,
+            description='Laptop'
+        )
+        self.product.categories.add(self.category)
+        self.detail_url = reverse(
+            'product-detail', kwargs={'pk': self.product.pk}
+        )
+        self.detail_view = ProductDetailView.as_view()
+
+    def _get(self, url, **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return response, len(context)
+
+    def test_product_detail_cached(self):
+        """Повторный запрос продукта обслуживается из кеша."""
+        response, queries = self._get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(queries, 4)
+        cached, queries = self._get(self.detail_url)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(queries, 0)
+        self.assertEqual(cached.data, response.data)
+
+    def test_product_detail_view_cached(self):
+        """ProductDetailView использует тот же кеш."""
+        request = APIRequestFactory().get(self.detail_url)
+        force_authenticate(request, user=self.user)
+        first = self.detail_view(request, pk=self.product.pk)
+        request = APIRequestFactory().get(self.detail_url)
+        force_authenticate(request, user=self.user)
+        second = self.detail_view(request, pk=self.product.pk)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+
+    def test_if_none_match(self):
+        """Совпадающий If-None-Match возвращает 304 без тела."""
+        response, _ = self._get(self.detail_url)
+        cached, queries = self._get(
+            self.detail_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_product_changes_invalidate_cache(self):
+        """Изменение продукта и его категорий сбрасывает кеш."""
+        self._get(self.detail_url)
+        self.client.patch(self.detail_url, {'stock': 7}, format='json')
+        response, _ = self._get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['stock'], 7)
+
+        books = Category.objects.create(name='Books')
+        self._get(self.detail_url)
+        books.products.add(self.product)
+        response, _ = self._get(self.detail_url)
+        self.assertEqual(
+            sorted(response.data['categories']), ['Books', 'Electronics']
+        )
+
+    def test_category_changes_invalidate_cache(self):
+        """Переименование категории сбрасывает кеш списков и продуктов."""
+        self._get(reverse('category-list'))
+        self._get(self.detail_url)
+        self.category.name = 'Gadgets'
+        self.category.save()
+        categories, _ = self._get(reverse('category-list'))
+        product, _ = self._get(self.detail_url)
+        self.assertEqual(categories['X-Cache'], 'MISS')
+        self.assertEqual(categories.data['results'][0]['name'], 'Gadgets')
+        self.assertEqual(product.data['categories'], ['Gadgets'])
+
+    def test_cache_metrics(self):
+        """Счетчики попаданий и промахов доступны сотрудникам."""
+        self._get(self.detail_url)
+        self._get(self.detail_url)
+        response, _ = self._get(reverse('catalog-cache-stats'))
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+        self.assertEqual(response.data['hit_ratio'], 0.5)
+
+
+class ConditionalRequestTests(APITestCase):
+    """
+    Тесты условных запросов: ETag и Last-Modified из версий
+    каталога, 304 без основного запроса.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='employeeuser',
+            email='employee@example.com',
+            password='employeepassword123',
+            role=User.EMPLOYEE
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Laptop',
+            regular_price='1000.00',
+            stock=5,
+            description='Laptop'
+        )
+        self.product.categories.add(self.category)
+        self.detail_url = reverse(
+            'product-detail', kwargs={'pk': self.product.pk}
+        )
+
+    def _get(self, url, **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return response, len(context)
+
+    def _assert_not_modified(self, url, queries, **headers):
+        response, count = self._get(url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(count, queries)
+        return response
+
+    def test_list_not_modified(self):
+        """
+        Списки и статистика отвечают 304 одним чтением версии
+        каталога и 200 после изменения продукта.
+        """
+        rebuild_product_stats()
+        for name in (
+            'product-list', 'product-list-view', 'product-stats',
+            'async-product-list', 'async-product-stats',
+        ):
+            url = reverse(name)
+            response, _ = self._get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response['ETag'].startswith('W/"catalog-'))
+            self.assertIn('private', response['Cache-Control'])
+            not_modified = self._assert_not_modified(
+                url, 1, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            self._assert_not_modified(
+                url, 1, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+
+        url = reverse('product-list-view')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Phone', regular_price='100.00', stock=1,
+                description='-'
+            )
+        response, _ = self._get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_if_modified_since(self):
+        """Last-Modified — время последнего изменения каталога."""
+        url = reverse('product-list-view')
+        CatalogVersion.objects.update(
+            updated_at=timezone.now() - timedelta(days=1)
+        )
+        response = self.client.get(url)
+        yesterday = response['Last-Modified']
+        self._assert_not_modified(url, 1, HTTP_IF_MODIFIED_SINCE=yesterday)
+        self.product.stock = 7
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response, _ = self._get(url, HTTP_IF_MODIFIED_SINCE=yesterday)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['Last-Modified'], yesterday)
+
+    def test_product_detail_validators(self):
+        """
+        ETag продукта меняется при массовом изменении остатка,
+        изменении категорий продукта и переименовании категории.
+        """
+        async_url = reverse('async-product-detail', args=[self.product.pk])
+        etag = self.client.get(self.detail_url)['ETag']
+        self._assert_not_modified(
+            self.detail_url, 0, HTTP_IF_NONE_MATCH=etag
+        )
+        self._assert_not_modified(async_url, 0, HTTP_IF_NONE_MATCH=etag)
+
+        def changed(change):
+            nonlocal etag
+            updated_at = Product.objects.get().updated_at
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response, _ = self._get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+            return Product.objects.get().updated_at > updated_at
+
+        self.assertTrue(changed(lambda: self.client.post(
+            reverse('product-stock'),
+            [{'id': self.product.pk, 'delta': -1}], format='json'
+        )))
+        books = Category.objects.create(name='Books')
+        self.assertTrue(changed(lambda: books.products.add(self.product)))
+        self.category.name = 'Gadgets'
+        self.assertFalse(changed(self.category.save))
+
+    def test_non_numeric_pk(self):
+        """Нечисловой id продукта — 404, а не ошибка сервера."""
+        response = self.client.get('/products/abc/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_category_validators(self):
+        """
+        Категории доступны без входа, поэтому их ответы можно
+        хранить в общем кеше; изменение продукта их не меняет.
+        """
+        self.client.force_authenticate(user=None)
+        url = reverse('category-list')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('W/"categories-'))
+        detail_url = reverse('category-detail', args=[self.category.pk])
+        detail = self.client.get(detail_url)
+        self.assertEqual(detail['ETag'], response['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Phone', regular_price='100.00', stock=1,
+                description='-'
+            )
+        self._assert_not_modified(
+            detail_url, 1, HTTP_IF_NONE_MATCH=detail['ETag']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Books')
+        response = self.client.get(
+            detail_url, HTTP_IF_NONE_MATCH=detail['ETag']
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class AsyncProductViewTests(APITestCase):
+    """
+    Тесты async-вью чтения продуктов: ответы совпадают с sync-вью.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='asyncuser',
+            email='async@example.com',
+            password='asyncpassword123',
+        )
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        parent = Category.objects.create(name='Electronics')
+        child = Category.objects.create(name='Laptops', parent=parent)
+        for number in range(15):
+            product = Product.objects.create(
+                name=f'Product {number}',
+                regular_price=Decimal(100 + number % 4),
+                stock=number,
+                description='Product'
+            )
+            product.categories.add(child if number % 2 else parent)
+        self.product = product
+
+    def assertSameResponse(self, sync_url, async_url):
+        expected = self.client.get(sync_url)
+        response = self.client.get(async_url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        self.assertEqual(
+            response.content.replace(b'/async/', b'/'), expected.content
+        )
+        return response
+
+    def test_product_list(self):
+        """Список, сортировка и страницы совпадают с ProductListView."""
+        for query in (
+            '', '?page=2', '?ordering=-regular_price&page=2',
+            '?count=false', '?page=5',
+        ):
+            self.assertSameResponse(
+                reverse('product-list-view') + query,
+                reverse('async-product-list') + query,
+            )
+
+    def test_product_list_cursor(self):
+        """Курсорные страницы совпадают с ProductListView."""
+        for query in (
+            '?pagination=cursor', '?pagination=cursor&cursor=bad',
+            '?pagination=cursor&ordering=-regular_price',
+        ):
+            async_url = reverse('async-product-list') + query
+            while async_url:
+                response = self.assertSameResponse(
+                    async_url.replace('/async/', '/'), async_url
+                )
+                async_url = response.json().get('next')
+
+    def test_products_by_category(self):
+        """Продукты категории и подкатегорий, 404 для неизвестной."""
+        for name in ('Electronics', 'Laptops', 'Missing'):
+            self.assertSameResponse(
+                reverse('products-by-category', args=[name]),
+                reverse('async-products-by-category', args=[name]),
+            )
+
+    def test_product_detail(self):
+        """Продукт отдается из общего с sync-вью кеша."""
+        sync_url = reverse('product-detail', args=[self.product.pk])
+        async_url = reverse('async-product-detail', args=[self.product.pk])
+        response = self.assertSameResponse(sync_url, async_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        cached = self.client.get(
+            async_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertSameResponse(
+            reverse('product-detail', args=[0]),
+            reverse('async-product-detail', args=[0]),
+        )
+
+    def test_product_stats(self):
+        self.assertSameResponse(
+            reverse('product-stats'), reverse('async-product-stats')
+        )
+
+    def test_authentication_required(self):
+        self.client.credentials()
+        self.assertSameResponse(
+            reverse('product-list-view'), reverse('async-product-list')
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertSameResponse(
+            reverse('product-stats'), reverse('async-product-stats')
+        )
+
+
+class ProductReadPathTests(APITestCase):
+    """
+    Ответы чтения продуктов из строк ``.values()`` побайтно совпадают
+    с ProductSerializer и JSONRenderer.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='readerpassword123',
+        )
+        self.client.force_authenticate(user=self.user)
+        parent = Category.objects.create(name='Электроника')
+        child = Category.objects.create(name='Laptops "pro"', parent=parent)
+        other = Category.objects.create(name='Sale')
+        products = [
+            Product.objects.create(
+                name='Ноутбук \u2028 "15"', regular_price='1999.90',
+                discount_price='1500.00', stock=3,
+                description='Line\nbreak \\ tab\t',
+            ),
+            Product.objects.create(
+                name='Phone', regular_price='0.50', stock=0,
+                description='',
+            ),
+            Product.objects.create(
+                name='Cable', regular_price='12345678.00', stock=100,
+                description='No categories',
+            ),
+        ]
+        products[0].categories.add(other, child, parent)
+        products[1].categories.add(child)
+
+    def expected(self, queryset):
+        return ProductSerializer(
+            queryset.prefetch_related('categories'), many=True
+        ).data
+
+    def assertRendersSame(self, response, data):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, JSONRenderer().render(data))
+
+    def test_read_products(self):
+        queryset = Product.objects.order_by('id')
+        self.assertEqual(
+            read_products(queryset.values(*PRODUCT_READ_FIELDS)),
+            self.expected(queryset)
+        )
+        self.assertEqual(
+            list(ProductSerializer().fields),
+            ['id', 'categories', *PRODUCT_READ_FIELDS[1:]]
+        )
+
+    def test_categories_in_link_order(self):
+        """Категории идут в порядке добавления связей."""
+        product = Product.objects.create(
+            name='Tablet', regular_price='10.00', stock=1, description='',
+        )
+        for name in ('Sale', 'Электроника', 'Laptops "pro"'):
+            product.categories.add(Category.objects.get(name=name))
+        rows = Product.objects.filter(pk=product.pk).values(
+            *PRODUCT_READ_FIELDS
+        )
+        self.assertEqual(
+            read_products(rows)[0]['categories'],
+            ['Sale', 'Электроника', 'Laptops "pro"']
+        )
+
+    def test_list_views(self):
+        results = self.expected(Product.objects.order_by('id'))
+        page = {'count': 3, 'next': None, 'previous': None}
+        self.assertRendersSame(
+            self.client.get(reverse('product-list')),
+            {**page, 'results': results}
+        )
+        self.assertRendersSame(
+            self.client.get(reverse('product-list-view')),
+            {**page, 'results': results}
+        )
+        self.assertRendersSame(
+            self.client.get(
+                reverse('product-list-view'), {'count': 'false'}
+            ),
+            {'next': None, 'previous': None, 'results': results}
+        )
+        self.assertRendersSame(
+            self.client.get(
+                reverse('products-by-category', args=['Электроника'])
+            ),
+            {**page, 'count': 2, 'results': results[:2]}
+        )
+
+    def test_detail_views(self):
+        product = Product.objects.order_by('id').first()
+        expected = self.expected(Product.objects.filter(pk=product.pk))[0]
+        for name in ('product-detail', 'async-product-detail'):
+            self.assertRendersSame(
+                self.client.get(reverse(name, args=[product.pk])), expected
+            )
+        response = self.client.get(reverse('product-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            response.json(),
+            {'detail': 'No Product matches the given query.'}
+        )
+
+    def test_search(self):
+        response = self.client.get(reverse('product-search'), {'q': 'phone'})
+        self.assertRendersSame(response, {
+            'count': 1, 'next': None, 'previous': None,
+            'results': self.expected(Product.objects.filter(name='Phone')),
+        })
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'Ünïcode \u2028 \u2029 "quoted" \\ \x00 \x1f',
+            'lazy': gettext_lazy('Not found.'),
+            'decimal': Decimal('10.50'),
+            'datetime': timezone.now(),
+            'date': timezone.now().date(),
+            'uuid': uuid.uuid4(),
+            'nested': [{1: None, 'flag': True}, (1, 2.5)],
+            'big': 2 ** 70,
+        }
+        for value in (data, {'small': data['nested']}, [], 'plain'):
+            self.assertEqual(
+                FastJSONRenderer().render(value), JSONRenderer().render(value)
+            )
+        indented = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(data, indented),
+            JSONRenderer().render(data, indented)
+        )
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def handle(self, request, write=False):
+        """
+        Выполняет запрос через ReplicaPinningMiddleware и возвращает
+        ответ и базы, выбранные для чтения продукта и пользователя.
+        """
+        routes = {}
+
+        def get_response(request):
+            routes['before'] = self.router.db_for_read(Product)
+            routes['user'] = self.router.db_for_read(User)
+            if write:
+                self.assertEqual(
+                    self.router.db_for_write(Product), 'default'
+                )
+                routes['after'] = self.router.db_for_read(Product)
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(get_response)(request)
+        return response, routes
+
+    def test_reads_outside_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_catalog_reads_use_replica(self):
+        response, routes = self.handle(self.factory.get('/products/'))
+        self.assertEqual(routes['before'], 'replica_0')
+        self.assertEqual(routes['user'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_request_and_client(self):
+        response, routes = self.handle(
+            self.factory.get('/product-stats/'), write=True
+        )
+        self.assertEqual(routes['before'], 'replica_0')
+        self.assertEqual(routes['after'], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/products/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        response, routes = self.handle(request)
+        self.assertEqual(routes['before'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_method_pins(self):
+        response, routes = self.handle(self.factory.post('/products/'))
+        self.assertEqual(routes['before'], 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_expired_or_invalid_cookie(self):
+        for value in ('0', 'invalid'):
+            request = self.factory.get('/products/')
+            request.COOKIES[PIN_COOKIE] = value
+            _, routes = self.handle(request)
+            self.assertEqual(routes['before'], 'replica_0')
+
+    def test_async_middleware(self):
+        """
+        В асинхронной цепочке запись из sync_to_async закрепляет
+        запрос и клиента за основной базой.
+        """
+        routes = {}
+
+        def write():
+            routes['before'] = self.router.db_for_read(Product)
+            self.router.db_for_write(Product)
+
+        async def get_response(request):
+            await sync_to_async(write)()
+            routes['after'] = self.router.db_for_read(Product)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.get('/products/'))
+        self.assertEqual(routes, {'before': 'replica_0', 'after': 'default'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_cache_fill_reads_primary(self):
+        """
+        Запись кеша и ее валидаторы при промахе читаются из основной
+        базы, а не с реплики, которая может отставать.
+        """
+        cache.clear()
+        routes = []
+
+        def read():
+            routes.append(self.router.db_for_read(Product))
+
+        def validators():
+            read()
+            return None, None
+
+        def get_response(request):
+            get_cached_entry('replica-test', read, validators)
+            read()
+            return HttpResponse()
+
+        ReplicaPinningMiddleware(get_response)(self.factory.get('/'))
+        self.assertEqual(routes, ['default', 'default', 'replica_0'])
+
+        routes.clear()
+
+        async def aread():
+            await sync_to_async(read)()
+
+        async def avalidators():
+            await aread()
+            return None, None
+
+        async def aget_response(request):
+            await aget_cached_entry('replica-test-async', aread, avalidators)
+            await aread()
+            return HttpResponse()
+
+        async_to_sync(ReplicaPinningMiddleware(aget_response))(
+            self.factory.get('/')
+        )
+        self.assertEqual(routes, ['default', 'default', 'replica_0'])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(
+            self.router.allow_migrate('replica_0', 'products'), False
+        )
+        self.assertIsNone(self.router.allow_migrate('default', 'products'))
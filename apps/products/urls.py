@@ -1,8 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import (
+    AsyncProductDetailView, AsyncProductListView,
+    AsyncProductsByCategoryView, AsyncProductStatsView,
+)
 from .views import (
-    CategoryViewSet, ProductViewSet, ProductListView,
-    ProductDetailView, ProductsByCategoryView, ProductStatsView
+    CatalogCacheStatsView, CategoryViewSet, ProductViewSet, ProductListView,
+    ProductDetailView, ProductExportView, ProductFacetsView,
+    ProductImportView, ProductsByCategoryView, ProductSearchView,
+    ProductStatsView, ProductStockView,
 )
 
 router = DefaultRouter()
@@ -10,6 +16,31 @@ router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'products', ProductViewSet, basename='product')
 
 urlpatterns = [
+    path(
+        'products/search/',
+        ProductSearchView.as_view(),
+        name='product-search'
+    ),
+    path(
+        'products/import/',
+        ProductImportView.as_view(),
+        name='product-import'
+    ),
+    path(
+        'products/export/',
+        ProductExportView.as_view(),
+        name='product-export'
+    ),
+    path(
+        'products/stock/',
+        ProductStockView.as_view(),
+        name='product-stock'
+    ),
+    path(
+        'products/facets/',
+        ProductFacetsView.as_view(),
+        name='product-facets'
+    ),
     path('', include(router.urls)),
     path(
         'product-list/',
@@ -27,4 +58,29 @@ urlpatterns = [
         name='products-by-category'
     ),
     path('product-stats/', ProductStatsView.as_view(), name='product-stats'),
+    path(
+        'catalog-cache-stats/',
+        CatalogCacheStatsView.as_view(),
+        name='catalog-cache-stats'
+    ),
+    path(
+        'async/product-list/',
+        AsyncProductListView.as_view(),
+        name='async-product-list'
+    ),
+    path(
+        'async/products/<int:pk>/',
+        AsyncProductDetailView.as_view(),
+        name='async-product-detail'
+    ),
+    path(
+        'async/products/category/<str:category_name>/',
+        AsyncProductsByCategoryView.as_view(),
+        name='async-products-by-category'
+    ),
+    path(
+        'async/product-stats/',
+        AsyncProductStatsView.as_view(),
+        name='async-product-stats'
+    ),
 ]
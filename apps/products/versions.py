@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion, Product
+
+
+def bump_catalog_version(categories=False):
+    """
+    Увеличивает версию каталога, а с ``categories`` — и версию
+    категорий, после фиксации транзакции изменения: строка версии
+    общая для всех записей, и ее блокировка до конца транзакции
+    выстраивала бы их в очередь. До увеличения версии клиент может
+    получить новые данные со старыми валидаторами, но не наоборот.
+    """
+    transaction.on_commit(
+        lambda: _bump_catalog_version(categories), robust=True
+    )
+
+
+def _bump_catalog_version(categories):
+    now = timezone.now()
+    updates = {'version': F('version') + 1, 'updated_at': now}
+    if categories:
+        updates.update(
+            categories_version=F('categories_version') + 1,
+            categories_updated_at=now,
+        )
+    if not CatalogVersion.objects.filter(
+        pk=CatalogVersion.SINGLETON_ID
+    ).update(**updates):
+        CatalogVersion.objects.get_or_create(pk=CatalogVersion.SINGLETON_ID)
+
+
+def get_catalog_version():
+    """Строка версии каталога; создается при первом чтении."""
+    catalog = CatalogVersion.objects.filter(
+        pk=CatalogVersion.SINGLETON_ID
+    ).first()
+    if catalog is None:
+        catalog, _ = CatalogVersion.objects.get_or_create(
+            pk=CatalogVersion.SINGLETON_ID
+        )
+    return catalog
+
+
+async def aget_catalog_version():
+    catalog = await CatalogVersion.objects.filter(
+        pk=CatalogVersion.SINGLETON_ID
+    ).afirst()
+    if catalog is None:
+        catalog, _ = await CatalogVersion.objects.aget_or_create(
+            pk=CatalogVersion.SINGLETON_ID
+        )
+    return catalog
+
+
+# Слабые ETag: JSON и HTML browsable API одного ресурса имеют
+# одну версию, но разные байты.
+
+def catalog_validators(catalog):
+    """ETag и Last-Modified списков продуктов и статистики."""
+    return f'W/"catalog-{catalog.version}"', catalog.updated_at
+
+
+def category_validators(catalog):
+    """ETag и Last-Modified ответов категорий."""
+    return (
+        f'W/"categories-{catalog.categories_version}"',
+        catalog.categories_updated_at,
+    )
+
+
+def _product_validators(pk, updated_at, catalog):
+    if updated_at is None:
+        return None, None
+    stamp = int(updated_at.timestamp() * 1000000)
+    return (
+        f'W/"product-{pk}-{stamp}-{catalog.categories_version}"',
+        max(updated_at, catalog.categories_updated_at),
+    )
+
+
+def product_validators(pk):
+    """
+    ETag и Last-Modified продукта: время его изменения и версия
+    категорий, имена которых есть в ответе. ``(None, None)``, если
+    продукта нет.
+    """
+    catalog = get_catalog_version()
+    updated_at = Product.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True
+    ).first()
+    return _product_validators(pk, updated_at, catalog)
+
+
+async def aproduct_validators(pk):
+    catalog = await aget_catalog_version()
+    updated_at = await Product.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True
+    ).afirst()
+    return _product_validators(pk, updated_at, catalog)
@@ -1,85 +1,423 @@
-from django.db.models import Min, Max, Sum
-from rest_framework import generics, viewsets
+from django.core.exceptions import ValidationError
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, serializers, status, viewsets
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from .cache import (
+    CachedResponseMixin, ConditionalResponseMixin, category_list_key,
+    get_cache_metrics, product_detail_key,
+)
+from .exports import CHUNK_SIZE, EXPORTERS, iter_products
+from .facets import get_facets
+from .imports import (
+    CSV, NDJSON, ImportReport, import_products, read_rows,
+)
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer
-from apps.users.permissions import IsEmployeeOrHigherChange, IsUserOrHigher
+from .pagination import (
+    PRODUCT_ORDERING_FIELDS, ProductOrderingFilter,
+    ProductPageNumberPagination, ProductPagination, ProductPriceFilter,
+)
+from .search import parse_terms, search_products
+from .serializers import (
+    PRODUCT_READ_FIELDS, CategorySerializer, ProductSerializer,
+    StockChangeSerializer, read_products,
+)
+from .stats import get_product_stats
+from .stock import APPLIED, apply_stock_changes
+from .versions import (
+    catalog_validators, category_validators, get_catalog_version,
+    product_validators,
+)
+from apps.users.permissions import (
+    IsEmployeeOrHigher, IsEmployeeOrHigherChange, IsUserOrHigher,
+)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, ConditionalResponseMixin,
+                      viewsets.ModelViewSet):
     """
     Вьюсет для просмотра и редактирования категорий.
     Только сотрудники и администраторы могут создавать,
     обновлять или удалять категории.
+    Страницы списка категорий кешируются. Ответы чтения
+    поддерживают условные запросы по версии категорий.
     """
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [IsEmployeeOrHigherChange]
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            category_list_key(request.META.get('QUERY_STRING', '')),
+            lambda: super(CategoryViewSet, self).list(
+                request, *args, **kwargs
+            ).data,
+            lambda: category_validators(get_catalog_version()),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            category_validators(get_catalog_version()),
+            lambda: super(CategoryViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+
+class ProductReadMixin(ConditionalResponseMixin):
+    """
+    Списки и детали продуктов без ProductSerializer: строки
+    ``.values()`` и имена категорий одним запросом превращаются
+    в тот же JSON, что выдает сериализатор (см. ``read_products``).
+    ProductSerializer остается для записи и схемы API.
+    Списки поддерживают условные запросы по версии каталога.
+    """
+
+    def get_read_queryset(self):
+        return self.filter_queryset(
+            self.get_queryset()
+        ).prefetch_related(None).values(*PRODUCT_READ_FIELDS)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            catalog_validators(get_catalog_version()),
+            self.list_response,
+        )
+
+    def list_response(self):
+        queryset = self.get_read_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(read_products(page))
+        return Response(read_products(queryset))
+
+    def get_product_data(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            products = read_products(self.get_read_queryset().filter(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg]
+            }))
+        except (TypeError, ValueError, ValidationError):
+            products = None
+        if not products:
+            raise Http404('No Product matches the given query.')
+        return products[0]
+
+
+class CachedProductRetrieveMixin(ProductReadMixin, CachedResponseMixin):
+    """
+    Отдает продукт по id из кеша, пока он не изменится.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        return self.cached_response(
+            request,
+            product_detail_key(pk),
+            self.get_product_data,
+            lambda: product_validators(pk),
+        )
+
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedProductRetrieveMixin, viewsets.ModelViewSet):
     """
     Вьюсет для просмотра и редактирования продуктов.
     Все аутентифицированные пользователи могут просматривать продукты.
     Только сотрудники и администраторы могут создавать,
     обновлять или удалять продукты.
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.prefetch_related('categories').order_by('id')
     serializer_class = ProductSerializer
     permission_classes = [IsUserOrHigher, IsEmployeeOrHigherChange]
+    lookup_value_regex = r'\d+'
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(ProductReadMixin, generics.ListAPIView):
     """
     API-вью для получения списка продуктов.
     Все аутентифицированные пользователи могут
     просматривать список продуктов с пагинацией.
     """
-    queryset = Product.objects.all().order_by('id')
+    queryset = Product.objects.prefetch_related('categories').order_by('id')
     serializer_class = ProductSerializer
+    pagination_class = ProductPagination
+    filter_backends = [ProductPriceFilter, ProductOrderingFilter]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
+    ordering = ['id']
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(CachedProductRetrieveMixin, generics.RetrieveAPIView):
     """
     API-вью для получения продукта по его ID.
     Все аутентифицированные пользователи могут просматривать детали продукта.
+    Ответ кешируется до изменения продукта или категорий.
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.prefetch_related('categories')
     serializer_class = ProductSerializer
 
 
-class ProductsByCategoryView(generics.ListAPIView):
+class ProductsByCategoryView(ProductReadMixin, generics.ListAPIView):
     """
     API-вью для получения списка продуктов в
-    конкретнойкатегории и ее подкатегориях.
+    конкретной категории и ее подкатегориях.
     Все аутентифицированные пользователи могут просматривать список продуктов.
     """
     serializer_class = ProductSerializer
+    pagination_class = ProductPagination
+    filter_backends = [ProductPriceFilter, ProductOrderingFilter]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
+    ordering = ['id']
 
     def get_queryset(self):
         """
         Этот метод возвращает список всех продуктов,
         принадлежащих к конкретной категории и ее подкатегориям.
+        Подкатегории выбираются по префиксу материализованного пути
+        в одном подзапросе, без рекурсивного обхода дерева.
+        """
+        category = get_object_or_404(
+            Category, name=self.kwargs['category_name']
+        )
+        product_ids = Product.categories.through.objects.filter(
+            category__path__startswith=category.path
+        ).values('product_id')
+        return Product.objects.filter(
+            id__in=product_ids
+        ).prefetch_related('categories').order_by('id')
+
+
+class ProductSearchView(ProductReadMixin, generics.ListAPIView):
+    """
+    API-вью для полнотекстового поиска продуктов по названию и описанию.
+    Результаты отсортированы по релевантности, слова запроса
+    ищутся по префиксу. Параметр ``category`` ограничивает поиск
+    категорией и ее подкатегориями.
+    Все аутентифицированные пользователи могут искать продукты.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = ProductPageNumberPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        """
+        Возвращает ленивый результат поиска по полнотекстовому индексу.
+        """
+        query = self.request.query_params.get('q', '')
+        if not parse_terms(query):
+            raise serializers.ValidationError(
+                {'q': 'This query parameter is required.'}
+            )
+        category = None
+        category_name = self.request.query_params.get('category')
+        if category_name:
+            category = get_object_or_404(Category, name=category_name)
+        return search_products(query, category)
+
+    def get_read_queryset(self):
+        return self.get_queryset().values(*PRODUCT_READ_FIELDS)
+
+
+class ProductImportView(APIView):
+    """
+    API-вью для массовой загрузки продуктов из CSV или NDJSON.
+    Тело запроса читается потоково и обрабатывается пачками.
+    Только сотрудники и администраторы могут загружать продукты.
+    """
+    permission_classes = [IsUserOrHigher, IsEmployeeOrHigherChange]
+    content_types = {
+        'text/csv': CSV,
+        'application/x-ndjson': NDJSON,
+        'application/jsonl': NDJSON,
+    }
+    default_batch_size = 1000
+    max_batch_size = 5000
+
+    def get_batch_size(self, request):
+        try:
+            batch_size = int(request.query_params.get('batch_size'))
+        except (TypeError, ValueError):
+            return self.default_batch_size
+        return max(1, min(batch_size, self.max_batch_size))
+
+    def post(self, request):
+        """
+        Обрабатывает загрузку и возвращает отчет по строкам.
+        Если тело не в UTF-8, возвращает 400 с отчетом о пачках,
+        загруженных до ошибки.
+        """
+        content_type = request.content_type.split(';')[0].strip()
+        file_format = self.content_types.get(content_type)
+        if file_format is None:
+            return Response(
+                {'message': (
+                    'Unsupported content type. '
+                    f'Use one of: {", ".join(self.content_types)}.'
+                )},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        stream = request.stream or []
+        lines = (line.decode('utf-8') for line in stream)
+        report = ImportReport()
+        try:
+            import_products(
+                read_rows(lines, file_format),
+                batch_size=self.get_batch_size(request), report=report
+            )
+        except UnicodeDecodeError:
+            return Response(
+                {'message': 'Request body must be UTF-8 encoded.',
+                 **report.as_dict()},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+class ProductStockView(APIView):
+    """
+    API-вью для массового изменения остатков. Принимает JSON-список
+    изменений ``{"id", "delta" | "stock", "version"?}`` и применяет
+    их к заблокированным строкам продуктов в одной транзакции.
+    Только сотрудники и администраторы могут менять остатки.
+    """
+    permission_classes = [IsUserOrHigher, IsEmployeeOrHigherChange]
+    max_changes = 10000
+    chunk_size = 500
+
+    def post(self, request):
+        """
+        Возвращает результат по каждому изменению в порядке запроса.
+        Некорректный запрос отклоняется целиком без изменений.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {'message': 'Expected a list of stock changes.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.max_changes:
+            return Response(
+                {'message': (
+                    f'At most {self.max_changes} changes per request.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = StockChangeSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        results = apply_stock_changes(
+            serializer.validated_data, chunk_size=self.chunk_size
+        )
+        applied = sum(result['status'] == APPLIED for result in results)
+        return Response(
+            {
+                'applied': applied,
+                'failed': len(results) - applied,
+                'results': results,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class ProductExportView(APIView):
+    """
+    API-вью для потоковой выгрузки всего каталога в NDJSON или CSV
+    (параметр ``output``). Ответ формируется по мере обхода продуктов,
+    поэтому расход памяти не зависит от размера каталога.
+    Все аутентифицированные пользователи могут выгружать каталог.
+    """
+    permission_classes = [IsUserOrHigher]
+    output_query_param = 'output'
+    default_output = NDJSON
+    chunk_size = CHUNK_SIZE
+
+    def get(self, request):
+        """
+        Возвращает StreamingHttpResponse с продуктами.
         """
-        category_name = self.kwargs['category_name']
-        category = Category.objects.get(name=category_name)
-        return Product.objects.filter(categories=category).order_by('id')
+        output = request.query_params.get(
+            self.output_query_param, self.default_output
+        )
+        if output not in EXPORTERS:
+            return Response(
+                {'message': (
+                    f'Unsupported output. Use one of: {", ".join(EXPORTERS)}.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        exporter, content_type = EXPORTERS[output]
+        response = StreamingHttpResponse(
+            exporter(iter_products(self.chunk_size)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="products.{output}"'
+        )
+        return response
+
+
+class CatalogCacheStatsView(APIView):
+    """
+    API-вью со счетчиками попаданий и промахов кеша каталога.
+    Доступно только сотрудникам и администраторам.
+    """
+    permission_classes = [IsEmployeeOrHigher]
+
+    def get(self, request):
+        return Response(get_cache_metrics())
+
+
+class ProductFacetsView(generics.GenericAPIView):
+    """
+    API-вью для фасетов каталога: число продуктов и продуктов
+    в наличии по категориям и корзинам гистограммы цен.
+    Без фильтров читает материализованные счетчики, с фильтрами
+    ``category``, ``min_price``, ``max_price`` считает по выборке
+    одним сгруппированным запросом.
+    """
+    filter_backends = [ProductPriceFilter]
+    category_query_param = 'category'
+
+    def get_queryset(self):
+        """
+        Возвращает выборку продуктов по фильтрам запроса или None,
+        если фильтров нет.
+        """
+        params = self.request.query_params
+        if not any(
+            params.get(param)
+            for param in (self.category_query_param, 'min_price', 'max_price')
+        ):
+            return None
+        queryset = Product.objects.all()
+        category_name = params.get(self.category_query_param)
+        if category_name:
+            category = get_object_or_404(Category, name=category_name)
+            queryset = queryset.filter(
+                id__in=Product.categories.through.objects.filter(
+                    category__path__startswith=category.path
+                ).values('product_id')
+            )
+        return self.filter_queryset(queryset)
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_facets(self.get_queryset()))
 
 
-class ProductStatsView(generics.GenericAPIView):
+class ProductStatsView(ConditionalResponseMixin, generics.GenericAPIView):
     """
     API-вью для получения статистики по продуктам.
     Возвращает минимальную цену, максимальную цену и
-    общий остаток всех продуктов.
+    общий остаток всех продуктов из предрассчитанной строки ProductStats.
     """
     def get(self, request, *args, **kwargs):
         """
         Обрабатывает GET-запрос для получения статистики по продуктам.
         """
-        stats = Product.objects.aggregate(
-            min_price=Min('regular_price'),
-            max_price=Max('regular_price'),
-            total_stock=Sum('stock')
+        return self.conditional_response(
+            request,
+            catalog_validators(get_catalog_version()),
+            lambda: Response(get_product_stats()),
         )
-        return Response(stats)
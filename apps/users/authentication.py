@@ -0,0 +1,76 @@
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .blacklist import ais_blacklisted, is_blacklisted
+from .tokens import REFRESH_JTI_CLAIM
+
+
+class AsyncJWTAuthenticationMixin:
+    """
+    Добавляет ``aauthenticate`` для async-вью. Проверка подписи
+    токена не обращается к БД и выполняется в событийном цикле.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = await self.aget_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_validated_token(self, raw_token):
+        return self.get_validated_token(raw_token)
+
+    async def aget_user(self, validated_token):
+        return await sync_to_async(self.get_user)(validated_token)
+
+
+class JWTAuthentication(
+    AsyncJWTAuthenticationMixin, authentication.JWTAuthentication
+):
+    """
+    JWTAuthentication из simplejwt с поддержкой async-вью.
+    Пользователь загружается из БД.
+    """
+
+
+class StatelessJWTAuthentication(
+    AsyncJWTAuthenticationMixin,
+    authentication.JWTStatelessUserAuthentication,
+):
+    """
+    Аутентификация по access-токену без загрузки пользователя из БД.
+    Пользователь строится из claims токена (см. ``TokenUser``).
+    Токен отклоняется, если refresh-токен, из которого он выпущен,
+    занесен в черный список; проверка обычно обходится без
+    запроса к БД.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if self.is_revoked(validated_token):
+            raise InvalidToken(_('Token is blacklisted'))
+        return validated_token
+
+    def is_revoked(self, validated_token):
+        refresh_jti = validated_token.get(REFRESH_JTI_CLAIM)
+        if refresh_jti is None:
+            return False
+        return is_blacklisted(refresh_jti)
+
+    async def aget_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        refresh_jti = validated_token.get(REFRESH_JTI_CLAIM)
+        if refresh_jti is not None and await ais_blacklisted(refresh_jti):
+            raise InvalidToken(_('Token is blacklisted'))
+        return validated_token
+
+    async def aget_user(self, validated_token):
+        return self.get_user(validated_token)
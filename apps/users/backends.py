@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+
+UserModel = get_user_model()
+
+_pool = None
+
+
+def get_hasher_pool():
+    """
+    Пул потоков для хеширования паролей, ограниченный
+    ``LOGIN_HASHER_THREADS``. PBKDF2 освобождает GIL, поэтому
+    хеши считаются параллельно, но не больше заданного числа
+    одновременно.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.LOGIN_HASHER_THREADS,
+            thread_name_prefix='login-hasher',
+        )
+    return _pool
+
+
+def _check_password(password, encoded):
+    """
+    Проверяет пароль и сообщает, нужно ли пересчитать хеш.
+    Выполняется в пуле и не обращается к БД.
+    """
+    must_update = []
+    valid = check_password(password, encoded, must_update.append)
+    return valid, bool(must_update)
+
+
+class PooledHashingBackend(ModelBackend):
+    """
+    ModelBackend, который вычисляет хеш пароля в ограниченном пуле
+    потоков. Запросы к БД выполняются в вызывающем потоке,
+    в пул уходит только хеширование.
+    """
+
+    def _get_username(self, username, kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        return username
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        username = self._get_username(username, kwargs)
+        if username is None or password is None:
+            return None
+        pool = get_hasher_pool()
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Хешируем и для несуществующего пользователя, чтобы время
+            # ответа не выдавало существование email.
+            pool.submit(make_password, password).result()
+            return None
+        valid, must_update = pool.submit(
+            _check_password, password, user.password
+        ).result()
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = pool.submit(make_password, password).result()
+            user.save(update_fields=['password'])
+        return user
+
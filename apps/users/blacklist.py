@@ -0,0 +1,147 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken, OutstandingToken,
+)
+
+CACHE_PREFIX = 'token_blacklist'
+PRUNE_BATCH_SIZE = 5000
+
+# jti → время истечения для токенов, про которые процесс уже знает,
+# что они в черном списке. Черный список только пополняется, поэтому
+# положительный результат можно хранить в памяти без инвалидации.
+_blacklisted = {}
+
+
+def _cache_key(jti):
+    return f'{CACHE_PREFIX}:{jti}'
+
+
+def _cache_timeout():
+    return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def _negative_timeout():
+    """
+    Время хранения отрицательного результата. Занесение в черный
+    список перезаписывает его только в кеше своего процесса, поэтому
+    с LocMemCache другие процессы хранят его не дольше
+    TOKEN_BLACKLIST_NEGATIVE_TIMEOUT секунд.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend.rsplit('.', 1)[-1] in ('LocMemCache', 'DummyCache'):
+        return settings.TOKEN_BLACKLIST_NEGATIVE_TIMEOUT
+    return _cache_timeout()
+
+
+def _remember(jti):
+    now = time.monotonic()
+    if len(_blacklisted) >= settings.TOKEN_BLACKLIST_LOCAL_SIZE:
+        for key, expires in list(_blacklisted.items()):
+            if expires <= now:
+                del _blacklisted[key]
+        if len(_blacklisted) >= settings.TOKEN_BLACKLIST_LOCAL_SIZE:
+            _blacklisted.clear()
+    _blacklisted[jti] = now + _cache_timeout()
+
+
+def clear_local_blacklist():
+    _blacklisted.clear()
+
+
+def _is_known(jti):
+    expires = _blacklisted.get(jti)
+    return expires is not None and expires > time.monotonic()
+
+
+def is_blacklisted(jti):
+    """
+    Проверяет, занесен ли токен в черный список.
+
+    Сначала смотрит в память процесса, затем в общий кеш и только
+    при промахе обращается к БД. Отрицательный результат кладется
+    в кеш через ``add``, поэтому не перезаписывает отметку
+    о занесении в черный список, сделанную параллельно.
+    """
+    if _is_known(jti):
+        return True
+
+    key = _cache_key(jti)
+    blacklisted = cache.get(key)
+    if blacklisted is None:
+        blacklisted = BlacklistedToken.objects.filter(
+            token__jti=jti
+        ).exists()
+        if blacklisted:
+            cache.set(key, True, _cache_timeout())
+        elif timeout := _negative_timeout():
+            cache.add(key, False, timeout)
+    if blacklisted:
+        _remember(jti)
+    return blacklisted
+
+
+async def ais_blacklisted(jti):
+    """
+    Асинхронная версия ``is_blacklisted`` для async-вью.
+    """
+    if _is_known(jti):
+        return True
+
+    key = _cache_key(jti)
+    blacklisted = await cache.aget(key)
+    if blacklisted is None:
+        blacklisted = await BlacklistedToken.objects.filter(
+            token__jti=jti
+        ).aexists()
+        if blacklisted:
+            await cache.aset(key, True, _cache_timeout())
+        elif timeout := _negative_timeout():
+            await cache.aadd(key, False, timeout)
+    if blacklisted:
+        _remember(jti)
+    return blacklisted
+
+
+def mark_blacklisted(jti):
+    """
+    Отмечает токен в кеше как занесенный в черный список.
+    Повторяется после коммита, чтобы перезаписать отрицательный
+    результат, закешированный параллельным запросом до коммита.
+    """
+    def mark():
+        cache.set(_cache_key(jti), True, _cache_timeout())
+        _remember(jti)
+
+    mark()
+    transaction.on_commit(mark)
+
+
+def prune_expired_tokens(batch_size=PRUNE_BATCH_SIZE):
+    """
+    Удаляет истекшие токены из OutstandingToken и BlacklistedToken
+    пачками по ``batch_size``, каждая в своей транзакции, чтобы
+    не держать длинные блокировки. Токены выпускаются с одинаковым
+    сроком жизни, поэтому истекшие идут первыми в порядке id.
+    Возвращает число удаленных OutstandingToken.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lt=now)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+    return deleted
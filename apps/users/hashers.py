@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 с числом итераций из ``PASSWORD_HASHER_ITERATIONS``.
+
+    Используется для нагрузочных окружений, где стоимость хеширования
+    нужно снизить. Алгоритм совпадает со стандартным, поэтому
+    существующие хеши остаются действительными и пересчитываются
+    с новым числом итераций при следующем входе.
+    """
+
+    @property
+    def iterations(self):
+        return (
+            settings.PASSWORD_HASHER_ITERATIONS or
+            PBKDF2PasswordHasher.iterations
+        )
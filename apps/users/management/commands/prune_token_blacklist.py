@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.blacklist import PRUNE_BATCH_SIZE, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие токены из черного списка пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=PRUNE_BATCH_SIZE,
+            help='Количество токенов, удаляемых в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired tokens pruned: {deleted}'
+        ))
@@ -26,6 +26,17 @@ class IsEmployeeOrHigherChange(permissions.BasePermission):
         return True
 
 
+class IsEmployeeOrHigher(permissions.BasePermission):
+    """
+    Доступ разрешен только сотрудникам и администраторам.
+    """
+    def has_permission(self, request, view):
+        return bool(
+            request.user and request.user.is_authenticated and
+            request.user.role in [User.EMPLOYEE, User.ADMIN]
+        )
+
+
 class IsUserOrHigher(permissions.BasePermission):
     """
     Доступ разрешен всем пользователям и выше.
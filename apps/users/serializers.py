@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import UserRefreshToken
 
 
 User = get_user_model()
@@ -86,7 +91,11 @@ class UserLoginSerializer(serializers.Serializer):
         password = data.get('password')
 
         if email and password:
-            user = authenticate(username=email, password=password)
+            user = authenticate(
+                request=self.context.get('request'),
+                username=email,
+                password=password,
+            )
             if user:
                 if not user.is_email_verified:
                     raise serializers.ValidationError(
@@ -108,3 +117,41 @@ class UserLoginSerializer(serializers.Serializer):
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField(required=False)
     blacklist = serializers.BooleanField(default=False)
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Сериализатор обновления access-токена. Использует
+    UserRefreshToken, поэтому черный список проверяется через кеш.
+    Пользователь загружается заново, и claims роли и подтвержденной
+    почты в новом токене отражают его текущее состояние, а не
+    состояние на момент входа.
+    """
+    token_class = UserRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(**{
+            api_settings.USER_ID_FIELD:
+                refresh.payload.get(api_settings.USER_ID_CLAIM)
+        }).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+        refresh.set_user_claims(user)
+        data = {}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        # Access-токен выпускается после ротации: он хранит jti
+        # нового refresh-токена, а не занесенного в черный список.
+        data['access'] = str(refresh.access_token)
+        return data
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .blacklist import mark_blacklisted
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created, **kwargs):
+    """
+    Отмечает токен в кеше черного списка, в том числе при занесении
+    через админку.
+    """
+    if created:
+        mark_blacklisted(instance.token.jti)
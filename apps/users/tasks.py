@@ -0,0 +1,111 @@
+import logging
+import smtplib
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .blacklist import prune_expired_tokens
+
+logger = logging.getLogger(__name__)
+
+_connection = None
+
+
+def get_pooled_connection():
+    """
+    Возвращает SMTP-соединение, открытое один раз на процесс воркера
+    и переиспользуемое между задачами. Сервер может закрыть его
+    между задачами, поэтому отправка при ошибке переоткрывает
+    соединение (см. ``send_pooled``).
+    """
+    global _connection
+    if _connection is None:
+        _connection = get_connection()
+    _connection.open()
+    return _connection
+
+
+def close_pooled_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+        _connection = None
+
+
+def build_email(message, connection):
+    email = EmailMultiAlternatives(
+        subject=message['subject'],
+        body=message['body'],
+        from_email=message.get('from_email'),
+        to=message['to'],
+        connection=connection,
+    )
+    if message.get('html'):
+        email.attach_alternative(message['html'], 'text/html')
+    return email
+
+
+def send_pooled(message):
+    """
+    Отправляет письмо через общее соединение. Если соединение
+    разорвано, оно открывается заново и отправка сразу повторяется
+    один раз.
+    """
+    try:
+        connection = get_pooled_connection()
+        connection.send_messages([build_email(message, connection)])
+    except (smtplib.SMTPException, OSError):
+        close_pooled_connection()
+        connection = get_pooled_connection()
+        connection.send_messages([build_email(message, connection)])
+
+
+@shared_task(bind=True, max_retries=settings.EMAIL_MAX_RETRIES)
+def send_emails(self, messages):
+    """
+    Отправляет письма через SMTP-соединение процесса воркера.
+
+    ``messages`` — список словарей с ключами subject, body, html,
+    from_email и to. Письма, которые не удалось отправить и после
+    переподключения, повторяются отдельной попыткой
+    с экспоненциально растущей задержкой; уже отправленные письма
+    повторно не отправляются. Без брокера (``CELERY_TASK_ALWAYS_EAGER``)
+    задача выполняется внутри запроса, поэтому повторов нет: ошибка
+    пишется в лог, а задача возвращает число отправленных писем.
+    """
+    failed = []
+    error = None
+    for message in messages:
+        try:
+            send_pooled(message)
+            logger.info(f"Email sent to {', '.join(message['to'])}")
+        except (smtplib.SMTPException, OSError) as exc:
+            close_pooled_connection()
+            failed.append(message)
+            error = exc
+
+    if failed and settings.CELERY_TASK_ALWAYS_EAGER:
+        logger.error(f'Failed to send {len(failed)} emails: {error}')
+        return len(messages) - len(failed)
+    if failed:
+        countdown = settings.EMAIL_RETRY_BACKOFF * 2 ** self.request.retries
+        logger.warning(
+            f'Failed to send {len(failed)} emails, retrying in '
+            f'{countdown}s: {error}'
+        )
+        raise self.retry(args=[failed], exc=error, countdown=countdown)
+    return len(messages)
+
+
+@shared_task
+def prune_token_blacklist():
+    """
+    Периодически удаляет истекшие токены из черного списка.
+    """
+    deleted = prune_expired_tokens()
+    logger.info(f'Expired tokens pruned: {deleted}')
+    return deleted
@@ -1,8 +1,35 @@
+import smtplib
+from unittest import mock
+
+from django.contrib.auth.hashers import (
+    check_password, identify_hasher, make_password,
+)
+from datetime import timedelta
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken, OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
 
+from .authentication import StatelessJWTAuthentication
+from .blacklist import (
+    clear_local_blacklist, is_blacklisted, prune_expired_tokens,
+)
+from .hashers import ConfigurablePBKDF2PasswordHasher
+from .tasks import close_pooled_connection, send_emails
+
 User = get_user_model()
 
 
@@ -35,6 +62,46 @@ class UserTests(APITestCase):
             'Registration successful. Please check your email to confirm your account.'
         )
 
+    def test_register_user_queues_activation_email(self):
+        """Активационное письмо отправляется после коммита регистрации."""
+        data = {
+            'email': 'newuser@mail.com',
+            'username': 'newuser',
+            'password': 'newpassword123'
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(
+                self.register_url, data, format='json'
+            )
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['newuser@mail.com'])
+        self.assertIn('/verify-email/', mail.outbox[0].body)
+
+    def test_register_when_email_fails_without_broker(self):
+        """
+        Без брокера ошибка SMTP не повторяется внутри запроса
+        и не превращает сохраненную регистрацию в 500.
+        """
+        data = {
+            'email': 'newuser@mail.com',
+            'username': 'newuser',
+            'password': 'newpassword123'
+        }
+        with mock.patch.object(
+            EmailBackend, 'send_messages',
+            side_effect=smtplib.SMTPServerDisconnected('Connection lost'),
+        ) as send_messages, self.assertLogs('apps.users.tasks', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    self.register_url, data, format='json'
+                )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(send_messages.call_count, 2)
+        self.assertTrue(User.objects.filter(email=data['email']).exists())
+
     def test_login_user(self):
         """Тестирует вход пользователя с проверенной электронной почтой."""
         data = {
@@ -46,6 +113,20 @@ class UserTests(APITestCase):
         self.assertIn('access', response.data)
         self.assertIn('refresh', response.data)
 
+    def test_login_hashes_password_once(self):
+        """Пароль при входе проверяется один раз."""
+        data = {
+            'email': self.user_data['email'],
+            'password': self.user_data['password']
+        }
+        with mock.patch(
+            'django.contrib.auth.base_user.check_password',
+            wraps=check_password,
+        ) as check:
+            response = self.client.post(self.login_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(check.call_count, 1)
+
     def test_login_user_unverified_email(self):
         """Тестирует вход пользователя с
         неподтвержденной электронной почтой."""
@@ -113,3 +194,326 @@ class UserTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], 'Logout successful')
+
+
+class SendEmailsTaskTests(TestCase):
+
+    def setUp(self):
+        close_pooled_connection()
+        self.addCleanup(close_pooled_connection)
+        self.messages = [
+            {
+                'subject': 'Subject',
+                'body': 'Body',
+                'html': '<p>Body</p>',
+                'from_email': 'shop@mail.com',
+                'to': [f'user{number}@mail.com'],
+            }
+            for number in range(3)
+        ]
+
+    def test_send_batch_over_one_connection(self):
+        """Несколько писем отправляются через одно соединение."""
+        with mock.patch(
+            'apps.users.tasks.get_connection', wraps=mail.get_connection
+        ) as get_connection:
+            result = send_emails.delay(self.messages)
+        self.assertEqual(result.get(), 3)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            mail.outbox[0].alternatives[0][0], '<p>Body</p>'
+        )
+
+    def test_reconnect_on_disconnect(self):
+        """
+        Разорванное соединение открывается заново, и письмо сразу
+        отправляется повторно.
+        """
+        send_messages = EmailBackend.send_messages
+        failures = iter([True])
+
+        def dropped_send_messages(backend, messages):
+            if next(failures, False):
+                raise smtplib.SMTPServerDisconnected('Connection lost')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(
+            EmailBackend, 'send_messages', dropped_send_messages
+        ), mock.patch(
+            'apps.users.tasks.get_connection', wraps=mail.get_connection
+        ) as get_connection:
+            result = send_emails.delay(self.messages)
+        self.assertEqual(result.get(), 3)
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertEqual(
+            [message.to[0] for message in mail.outbox],
+            ['user0@mail.com', 'user1@mail.com', 'user2@mail.com'],
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_retry_only_failed_messages(self):
+        """Повторно отправляются только письма, которые не ушли."""
+        send_messages = EmailBackend.send_messages
+        failures = iter([False, True, True, False])
+
+        def flaky_send_messages(backend, messages):
+            if next(failures, False):
+                raise smtplib.SMTPServerDisconnected('Connection lost')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(
+            EmailBackend, 'send_messages', flaky_send_messages
+        ):
+            send_emails.apply(args=[self.messages])
+        self.assertEqual(
+            [message.to[0] for message in mail.outbox],
+            ['user0@mail.com', 'user2@mail.com', 'user1@mail.com'],
+        )
+
+
+class StatelessAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            APIView, 'authentication_classes', [StatelessJWTAuthentication]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, role):
+        User.objects.create_user(
+            email=f'{role}@mail.com',
+            username=role,
+            password='password123',
+            role=role,
+            is_email_verified=True,
+        )
+        response = self.client.post(reverse('login'), {
+            'email': f'{role}@mail.com', 'password': 'password123'
+        }, format='json')
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + response.data['access']
+        )
+        return response.data
+
+    def test_product_list_without_user_queries(self):
+        """Роль берется из токена, пользователь из БД не загружается."""
+        self.login(User.USER)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if User._meta.db_table in query['sql']
+        ])
+
+    def test_cart_with_token_user(self):
+        """Корзина работает с пользователем из токена по его id."""
+        self.login(User.USER)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'], [])
+
+    def test_role_claim_checked_by_permissions(self):
+        """Разрешения на изменение проверяют роль из токена."""
+        self.login(User.USER)
+        response = self.client.post(
+            reverse('category-list'), {'name': 'Books'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.login(User.EMPLOYEE)
+        response = self.client.post(
+            reverse('category-list'), {'name': 'Books'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_blacklisted_refresh_revokes_access_token(self):
+        """После выхода с черным списком access-токен отклоняется."""
+        tokens = self.login(User.USER)
+        response = self.client.post(reverse('logout'), {
+            'refresh': tokens['refresh'], 'blacklist': True
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_valid_after_rotation(self):
+        """
+        При ротации новый access-токен ссылается на новый
+        refresh-токен и не отклоняется из-за черного списка.
+        """
+        tokens = self.login(User.USER)
+        with mock.patch(
+            'apps.users.serializers.api_settings.ROTATE_REFRESH_TOKENS', True
+        ):
+            response = self.client.post(
+                reverse('token_refresh'), {'refresh': tokens['refresh']},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = AccessToken(response.data['access'])
+        self.assertEqual(
+            access['refresh_jti'],
+            AccessToken(response.data['refresh'], verify=False)['jti'],
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + response.data['access']
+        )
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=['apps.users.backends.PooledHashingBackend'],
+    LOGIN_HASHER_THREADS=2,
+)
+class PooledHashingBackendTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='pooled@mail.com',
+            username='pooled',
+            password='password123',
+            is_email_verified=True,
+        )
+
+    def test_login(self):
+        """Вход работает с хешированием в пуле потоков."""
+        response = self.client.post(reverse('login'), {
+            'email': 'pooled@mail.com', 'password': 'password123'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('login'), {
+            'email': 'pooled@mail.com', 'password': 'wrong'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            'apps.users.hashers.ConfigurablePBKDF2PasswordHasher'
+        ],
+        PASSWORD_HASHER_ITERATIONS=1000,
+    )
+    def test_hash_updated_to_configured_iterations(self):
+        """Хеш пересчитывается с числом итераций из настроек."""
+        response = self.client.post(reverse('login'), {
+            'email': 'pooled@mail.com', 'password': 'password123'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split('$')[1], '1000')
+        self.assertIsInstance(
+            identify_hasher(make_password('password123')),
+            ConfigurablePBKDF2PasswordHasher,
+        )
+
+
+class TokenBlacklistTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_blacklist()
+        self.user = User.objects.create_user(
+            email='tokens@mail.com',
+            username='tokens',
+            password='password123',
+            is_email_verified=True,
+        )
+        response = self.client.post(reverse('login'), {
+            'email': 'tokens@mail.com', 'password': 'password123'
+        }, format='json')
+        self.refresh = response.data['refresh']
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + response.data['access']
+        )
+
+    def test_refresh_rejected_after_blacklist(self):
+        """После выхода с черным списком refresh-токен отклоняется."""
+        url = reverse('token_refresh')
+        response = self.client.post(
+            url, {'refresh': self.refresh}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+
+        self.client.post(reverse('logout'), {
+            'refresh': self.refresh, 'blacklist': True
+        }, format='json')
+        response = self.client.post(
+            url, {'refresh': self.refresh}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_reloads_claims(self):
+        """
+        Новый access-токен получает текущие роль и признак почты,
+        а не записанные в refresh-токен при входе.
+        """
+        self.user.role = User.EMPLOYEE
+        self.user.is_email_verified = False
+        self.user.save()
+        response = self.client.post(
+            reverse('token_refresh'), {'refresh': self.refresh},
+            format='json'
+        )
+        access = AccessToken(response.data['access'])
+        self.assertEqual(access['role'], User.EMPLOYEE)
+        self.assertFalse(access['is_email_verified'])
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(
+            reverse('token_refresh'), {'refresh': self.refresh},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_lookup_cached(self):
+        """Повторная проверка не обращается к БД, а занесение
+        в черный список перезаписывает закешированный результат."""
+        jti = OutstandingToken.objects.get().jti
+        self.assertFalse(is_blacklisted(jti))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_blacklisted(jti))
+
+        BlacklistedToken.objects.create(
+            token=OutstandingToken.objects.get()
+        )
+        clear_local_blacklist()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_blacklisted(jti))
+
+    @override_settings(TOKEN_BLACKLIST_NEGATIVE_TIMEOUT=5)
+    def test_negative_lookup_timeout(self):
+        """
+        С кешем одного процесса отсутствие в черном списке кешируется
+        на TOKEN_BLACKLIST_NEGATIVE_TIMEOUT секунд.
+        """
+        jti = OutstandingToken.objects.get().jti
+        with mock.patch.object(cache, 'add') as add:
+            is_blacklisted(jti)
+        add.assert_called_once_with(f'token_blacklist:{jti}', False, 5)
+        with override_settings(TOKEN_BLACKLIST_NEGATIVE_TIMEOUT=0):
+            self.assertFalse(is_blacklisted(jti))
+            with self.assertNumQueries(1):
+                self.assertFalse(is_blacklisted(jti))
+
+    def test_prune_expired_tokens(self):
+        """Истекшие токены удаляются пачками, действующие остаются."""
+        expired_at = timezone.now() - timedelta(hours=1)
+        expired = OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                jti=f'expired-{number}', token='', expires_at=expired_at
+            )
+            for number in range(5)
+        ])
+        BlacklistedToken.objects.bulk_create([
+            BlacklistedToken(token=token) for token in expired[:2]
+        ])
+
+        self.assertEqual(prune_expired_tokens(batch_size=2), 5)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
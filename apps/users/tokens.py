@@ -0,0 +1,68 @@
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.models import TokenUser as BaseTokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import is_blacklisted
+
+ROLE_CLAIM = 'role'
+EMAIL_VERIFIED_CLAIM = 'is_email_verified'
+REFRESH_JTI_CLAIM = 'refresh_jti'
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh-токен с ролью пользователя и признаком подтвержденной
+    почты в claims. Access-токен копирует эти claims и хранит jti
+    своего refresh-токена, чтобы его можно было отозвать через
+    черный список.
+
+    Проверка черного списка идет через кеш (см. ``is_blacklisted``).
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        """Записывает в токен текущие роль и признак почты."""
+        self[ROLE_CLAIM] = user.role
+        self[EMAIL_VERIFIED_CLAIM] = user.is_email_verified
+
+    def check_blacklist(self):
+        if is_blacklisted(self[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        access[REFRESH_JTI_CLAIM] = self[api_settings.JTI_CLAIM]
+        return access
+
+
+class TokenUser(BaseTokenUser):
+    """
+    Пользователь, построенный из claims access-токена без запроса
+    к БД. Предоставляет ``role`` и ``is_email_verified``, которые
+    проверяют разрешения из ``apps.users.permissions``.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def role(self):
+        return self.token.get(ROLE_CLAIM)
+
+    @cached_property
+    def is_email_verified(self):
+        return bool(self.token.get(EMAIL_VERIFIED_CLAIM, False))
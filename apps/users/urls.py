@@ -2,7 +2,8 @@ from django.urls import path
 
 from .views import (
     RegisterView, VerifyEmailView, LoginView,
-    LogoutView, ResendActivationEmailView, SessionExpiredView
+    LogoutView, ResendActivationEmailView, SessionExpiredView,
+    UserTokenRefreshView,
 )
 
 urlpatterns = [
@@ -14,6 +15,11 @@ urlpatterns = [
     ),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path(
+        'token/refresh/',
+        UserTokenRefreshView.as_view(),
+        name='token_refresh'
+    ),
     path(
         'verify-email/<str:uid>/<str:token>/',
         VerifyEmailView.as_view(),
@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import transaction
 from django.contrib.auth.tokens import default_token_generator
 from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode
@@ -8,33 +8,51 @@ from django.template.loader import render_to_string
 
 import logging
 
+from .tasks import send_emails
+
 logger = logging.getLogger(__name__)
 
 
+def build_activation_email(user, request):
+    """
+    Формирует активационное письмо для указанного пользователя.
+
+    Генерирует уникальный токен и идентификатор пользователя, создает
+    ссылку для активации и возвращает письмо в виде словаря, который
+    можно передать в задачу Celery.
+    """
+    token = default_token_generator.make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    activation_link = request.build_absolute_uri(reverse(
+        'verify-email',
+        kwargs={'uid': uid, 'token': token})
+    )
+    message = render_to_string('users/activate_email.html', {
+        'user': user,
+        'activation_link': activation_link,
+    })
+    return {
+        'subject': 'Activate your account',
+        'body': message,
+        'html': message,
+        'from_email': settings.DEFAULT_FROM_EMAIL,
+        'to': [user.email],
+    }
+
+
 def send_activation_email(user, request):
     """
-    Отправляет активационное письмо указанному пользователю.
+    Ставит активационное письмо в очередь отправки.
 
-    Эта функция генерирует уникальный токен и идентификатор пользователя,
-    создает ссылку для активации и отправляет письмо пользователю со
-    ссылкой для активации его аккаунта.
+    Письмо отправляется задачей Celery после фиксации транзакции,
+    поэтому запрос не ждет ответа SMTP-сервера. Ошибка отправки
+    после фиксации только пишется в лог: регистрация уже сохранена.
     """
     try:
-        token = default_token_generator.make_token(user)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        activation_link = request.build_absolute_uri(reverse(
-            'verify-email',
-            kwargs={'uid': uid, 'token': token})
-        )
-        subject = 'Activate your account'
-        message = render_to_string('users/activate_email.html', {
-            'user': user,
-            'activation_link': activation_link,
-        })
-        from_email = settings.DEFAULT_FROM_EMAIL
-        send_mail(
-            subject, message, from_email, [user.email], html_message=message
+        message = build_activation_email(user, request)
+        transaction.on_commit(
+            lambda: send_emails.delay([message]), robust=True
         )
-        logger.info(f"Activation email sent to {user.email}")
+        logger.info(f"Activation email queued for {user.email}")
     except Exception as e:
-        logger.error(f"Error sending activation email: {e}")
+        logger.error(f"Error queueing activation email: {e}")
@@ -1,4 +1,4 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
 from django.shortcuts import render
 from django.utils.http import urlsafe_base64_decode
@@ -6,13 +6,15 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
 
+from .tokens import UserRefreshToken
 from .utils import send_activation_email
 from .serializers import (
     UserRegistrationSerializer, ResendActivationEmailSerializer,
-    UserLoginSerializer, LogoutSerializer,
+    UserLoginSerializer, LogoutSerializer, UserTokenRefreshSerializer,
 )
+from apps.orders.carts import get_cart_token, merge_anonymous_cart
 
 User = get_user_model()
 
@@ -95,28 +97,25 @@ class LoginView(APIView):
     def post(self, request):
         """
         Обработка входа пользователя.
+
+        Пароль проверяется один раз при валидации сериализатора,
+        вью использует уже аутентифицированного пользователя.
+        Анонимная корзина из заголовка X-Cart-Token переносится
+        в корзину пользователя.
         """
-        serializer = UserLoginSerializer(data=request.data)
+        serializer = UserLoginSerializer(
+            data=request.data, context={'request': request}
+        )
         if serializer.is_valid():
-            email = serializer.validated_data['email']
-            password = serializer.validated_data['password']
-            user = authenticate(request, username=email, password=password)
-            if user is not None:
-                if user.is_email_verified:
-                    refresh = RefreshToken.for_user(user)
-                    return Response({
-                        'refresh': str(refresh),
-                        'access': str(refresh.access_token), },
-                        status=status.HTTP_200_OK
-                    )
-                else:
-                    return Response(
-                        {'message': 'Email is not verified'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            return Response(
-                {'message': 'Invalid credentials'},
-                status=status.HTTP_400_BAD_REQUEST
+            user = serializer.validated_data['user']
+            cart_token = get_cart_token(request)
+            if cart_token is not None:
+                merge_anonymous_cart(cart_token, user.pk)
+            refresh = UserRefreshToken.for_user(user)
+            return Response({
+                'refresh': str(refresh),
+                'access': str(refresh.access_token), },
+                status=status.HTTP_200_OK
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -134,7 +133,7 @@ class LogoutView(APIView):
             blacklist = serializer.validated_data.get('blacklist', False)
 
             if refresh_token and blacklist:
-                token = RefreshToken(refresh_token)
+                token = UserRefreshToken(refresh_token)
                 token.blacklist()
 
             return Response(
@@ -144,6 +143,13 @@ class LogoutView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserTokenRefreshView(TokenRefreshView):
+    """
+    Выпуск нового access-токена по refresh-токену.
+    """
+    serializer_class = UserTokenRefreshSerializer
+
+
 class SessionExpiredView(APIView):
     permission_classes = (AllowAny,)
 
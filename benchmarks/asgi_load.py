@@ -0,0 +1,247 @@
+"""
+Нагрузочное сравнение чтения продуктов под WSGI и ASGI.
+
+Заполняет отдельную базу каталогом и вызывает приложение Django
+в процессе, без HTTP-сервера: WSGI-приложение из пула потоков
+(как gunicorn с gthread), ASGI-приложение из задач asyncio
+(как uvicorn). Для каждого эндпоинта сравниваются sync-вью под
+WSGI и ASGI и async-вью под ASGI: запросы в секунду и p99.
+
+    python -m benchmarks.asgi_load --concurrency 32 --requests 2000
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import benchmark_database, setup_django, summarize
+
+HOST = 'testserver'
+
+
+def get_endpoints():
+    from apps.products.models import Category, Product
+
+    product_id = Product.objects.order_by('id').values_list(
+        'id', flat=True
+    ).first()
+    category = Category.objects.filter(parent=None).order_by('id').first()
+    return {
+        'list': ('/product-list/', '/async/product-list/'),
+        'list_ordered': (
+            '/product-list/?ordering=regular_price&page=3',
+            '/async/product-list/?ordering=regular_price&page=3',
+        ),
+        'detail': (
+            f'/products/{product_id}/',
+            f'/async/products/{product_id}/',
+        ),
+        'by_category': (
+            f'/products/category/{category.name}/',
+            f'/async/products/category/{category.name}/',
+        ),
+        'stats': ('/product-stats/', '/async/product-stats/'),
+    }
+
+
+def get_token():
+    from django.contrib.auth import get_user_model
+
+    from apps.users.tokens import UserRefreshToken
+
+    user, _ = get_user_model().objects.get_or_create(
+        email='load@example.com',
+        defaults={'username': 'load', 'is_email_verified': True},
+    )
+    return str(UserRefreshToken.for_user(user).access_token)
+
+
+def split_url(url):
+    path, _, query = url.partition('?')
+    return path, query
+
+
+def run_wsgi(url, token, requests, concurrency):
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+
+    application = get_wsgi_application()
+    path, query = split_url(url)
+
+    def request():
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'HTTP_HOST': HOST,
+            'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+        }
+        statuses = []
+        start = time.perf_counter()
+        body = application(
+            environ, lambda status, headers: statuses.append(status)
+        )
+        b''.join(body)
+        body.close()
+        elapsed = time.perf_counter() - start
+        if not statuses[0].startswith('200'):
+            raise RuntimeError(f'{url}: {statuses[0]}')
+        return elapsed
+
+    def worker(count):
+        try:
+            return [request() for _ in range(count)]
+        finally:
+            connections.close_all()
+
+    counts = [
+        requests // concurrency + (number < requests % concurrency)
+        for number in range(concurrency)
+    ]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = [
+            timing
+            for chunk in executor.map(worker, counts)
+            for timing in chunk
+        ]
+    return timings, time.perf_counter() - started
+
+
+def run_asgi(url, token, requests, concurrency):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    path, query = split_url(url)
+
+    async def request():
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': [
+                (b'host', HOST.encode()),
+                (b'authorization', f'Bearer {token}'.encode()),
+            ],
+            'server': (HOST, 80),
+        }
+        messages = []
+        inbox = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        finished = asyncio.Event()
+
+        async def receive():
+            # После тела запроса Django ждет отключения клиента,
+            # как сервер, сообщаем о нем после ответа.
+            if inbox:
+                return inbox.pop()
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if (
+                message['type'] == 'http.response.body' and
+                not message.get('more_body')
+            ):
+                finished.set()
+
+        start = time.perf_counter()
+        await application(scope, receive, send)
+        elapsed = time.perf_counter() - start
+        status = messages[0]['status']
+        if status != 200:
+            raise RuntimeError(f'{url}: {status}')
+        return elapsed
+
+    async def worker(count):
+        return [await request() for _ in range(count)]
+
+    async def main():
+        counts = [
+            requests // concurrency + (number < requests % concurrency)
+            for number in range(concurrency)
+        ]
+        chunks = await asyncio.gather(*(worker(count) for count in counts))
+        return [timing for chunk in chunks for timing in chunk]
+
+    started = time.perf_counter()
+    timings = asyncio.run(main())
+    return timings, time.perf_counter() - started
+
+
+def report(timings, elapsed):
+    summary = summarize(timings)
+    summary['requests_per_second'] = round(len(timings) / elapsed, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument(
+        '--endpoints',
+        help='Эндпоинты через запятую: list,list_ordered,detail,'
+             'by_category,stats'
+    )
+    parser.add_argument('--json', help='Путь для сохранения результатов')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    settings.DEBUG = False
+    from benchmarks.seed import seed_catalog
+
+    results = {}
+    with benchmark_database():
+        seed_catalog(products=args.products, users=1, orders=0)
+        token = get_token()
+        endpoints = get_endpoints()
+        if args.endpoints:
+            names = args.endpoints.split(',')
+            endpoints = {name: endpoints[name] for name in names}
+
+        for name, (sync_url, async_url) in endpoints.items():
+            scenarios = {
+                'wsgi_sync': (run_wsgi, sync_url),
+                'asgi_sync': (run_asgi, sync_url),
+                'asgi_async': (run_asgi, async_url),
+            }
+            results[name] = {}
+            for label, (runner, url) in scenarios.items():
+                runner(url, token, args.concurrency, args.concurrency)
+                results[name][label] = report(*runner(
+                    url, token, args.requests, args.concurrency
+                ))
+                result = results[name][label]
+                print(
+                    f'{name:<13} {label:<11} '
+                    f'{result["requests_per_second"]:>9.2f} req/s '
+                    f'p50={result["p50_ms"]:.2f}ms '
+                    f'p99={result["p99_ms"]:.2f}ms'
+                )
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
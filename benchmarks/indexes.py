@@ -0,0 +1,129 @@
+"""
+Бенчмарк индексов Product и Order.
+
+Заполняет отдельную базу синтетическими данными и для каждого
+горячего запроса выводит план выполнения и задержку без индексов
+из Meta.indexes моделей и с ними.
+
+    python -m benchmarks.indexes --products 100000 --orders 50000
+"""
+import argparse
+import json
+from datetime import timedelta
+
+from benchmarks.utils import benchmark_database, measure, setup_django
+
+
+def get_queries():
+    from django.utils import timezone
+
+    from apps.orders.models import Order
+    from apps.products.models import Product
+
+    user_id = Order.objects.values_list('user_id', flat=True).first()
+    since = timezone.now() - timedelta(days=1)
+    return {
+        'products_by_price': Product.objects.filter(
+            regular_price__gte=500
+        ).order_by('regular_price', 'id').values_list(
+            'id', 'regular_price'
+        )[:10],
+        'products_in_stock_count': Product.objects.filter(stock__gt=0),
+        'products_low_stock': Product.objects.filter(
+            stock__gt=0, stock__lte=5
+        ).order_by('stock').values_list('id', 'stock')[:10],
+        'product_by_name': Product.objects.filter(
+            name='Product 4242'
+        ).values_list('id'),
+        'products_by_name_ordering': Product.objects.order_by(
+            'name'
+        ).values_list('id', 'name')[:10],
+        'user_orders': Order.objects.filter(
+            user_id=user_id
+        ).order_by('-created_at').values_list('id', 'created_at')[:10],
+        'unpaid_orders': Order.objects.filter(
+            is_paid=False
+        ).order_by('created_at').values_list('id', 'created_at')[:50],
+        'orders_last_day': Order.objects.filter(created_at__gte=since),
+    }
+
+
+def run_query(name, queryset):
+    if name.endswith('_count') or name == 'orders_last_day':
+        return queryset.count()
+    return list(queryset)
+
+
+def explain(name, queryset):
+    if name.endswith('_count') or name == 'orders_last_day':
+        queryset = queryset.values('id')
+    return queryset.explain()
+
+
+def set_indexes(connection, enabled):
+    from apps.orders.models import Order
+    from apps.products.models import Product
+
+    with connection.schema_editor() as editor:
+        for model in (Product, Order):
+            for index in model._meta.indexes:
+                if enabled:
+                    editor.add_index(model, index)
+                else:
+                    editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def run(connection, repeat):
+    results = {}
+    for name, queryset in get_queries().items():
+        results[name] = {
+            'plan': explain(name, queryset),
+            **measure(lambda: run_query(name, queryset._chain()), repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--json', help='Путь для сохранения результатов')
+    args = parser.parse_args()
+
+    setup_django()
+    from benchmarks.seed import seed_catalog
+
+    with benchmark_database() as connection:
+        counts = seed_catalog(
+            products=args.products, users=args.users, orders=args.orders
+        )
+        print(f'Seeded: {counts}')
+        set_indexes(connection, enabled=False)
+        before = run(connection, args.repeat)
+        set_indexes(connection, enabled=True)
+        after = run(connection, args.repeat)
+
+    for name in before:
+        print(f'\n== {name}')
+        for label, results in (('before', before), ('after', after)):
+            result = results[name]
+            print(
+                f'  {label:<6} mean={result["mean_ms"]:.3f}ms '
+                f'p95={result["p95_ms"]:.3f}ms'
+            )
+            print(f'         plan: {result["plan"]}')
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(
+                {'counts': counts, 'before': before, 'after': after},
+                output, indent=2, default=str
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Бенчмарк пропускной способности входа.
+
+Создает верифицированных пользователей в отдельной базе и выполняет
+``POST /login/`` через полный стек DRF, последовательно и из
+нескольких потоков. Выводит задержку, число входов в секунду
+и число проверок пароля на один вход.
+
+    python -m benchmarks.login --repeat 100 --concurrency 4
+    python -m benchmarks.login --iterations 1000 --hasher-threads 4
+
+``--iterations`` задает стоимость PBKDF2 (профиль для нагрузочных
+окружений), ``--hasher-threads`` включает пул потоков хеширования.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from benchmarks.utils import benchmark_database, setup_django, summarize
+
+PASSWORD = 'benchmark-password'
+
+
+def hasher_settings(iterations, hasher_threads):
+    """
+    Настройки профиля хеширования для ``override_settings``.
+    """
+    overrides = {}
+    if iterations:
+        overrides['PASSWORD_HASHERS'] = [
+            'apps.users.hashers.ConfigurablePBKDF2PasswordHasher'
+        ]
+        overrides['PASSWORD_HASHER_ITERATIONS'] = iterations
+    if hasher_threads:
+        overrides['AUTHENTICATION_BACKENDS'] = [
+            'apps.users.backends.PooledHashingBackend'
+        ]
+        overrides['LOGIN_HASHER_THREADS'] = hasher_threads
+    return overrides
+
+
+def create_users(count):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(
+            email=f'login{number}@example.com',
+            username=f'login{number}',
+            password=password,
+            is_email_verified=True,
+        )
+        for number in range(count)
+    ])
+    return [f'login{number}@example.com' for number in range(count)]
+
+
+def login(client, email):
+    from django.urls import reverse
+
+    start = time.perf_counter()
+    response = client.post(
+        reverse('login'), {'email': email, 'password': PASSWORD},
+        format='json'
+    )
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f'Login failed: {response.status_code}')
+    return elapsed
+
+
+def run_sequential(emails, repeat):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    for email in emails[:3]:
+        login(client, email)
+    started = time.perf_counter()
+    timings = [
+        login(client, emails[number % len(emails)])
+        for number in range(repeat)
+    ]
+    return timings, time.perf_counter() - started
+
+
+def run_concurrent(emails, repeat, concurrency):
+    from django.db import connections
+    from rest_framework.test import APIClient
+
+    def worker(offset):
+        client = APIClient()
+        try:
+            return [
+                login(client, emails[number % len(emails)])
+                for number in range(offset, repeat, concurrency)
+            ]
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        chunks = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return [timing for chunk in chunks for timing in chunk], elapsed
+
+
+def count_password_checks(email):
+    from django.contrib.auth import hashers
+    from rest_framework.test import APIClient
+
+    with mock.patch.object(
+        hashers, 'check_password', wraps=hashers.check_password
+    ) as check, mock.patch(
+        'django.contrib.auth.base_user.check_password', new=check
+    ), mock.patch('apps.users.backends.check_password', new=check):
+        login(APIClient(), email)
+    return check.call_count
+
+
+def report(label, timings, elapsed):
+    summary = summarize(timings)
+    summary['logins_per_second'] = round(len(timings) / elapsed, 2)
+    print(
+        f'{label:<12} {summary["logins_per_second"]:>8.2f} logins/s  '
+        f'mean={summary["mean_ms"]:.2f}ms p95={summary["p95_ms"]:.2f}ms'
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument(
+        '--iterations', type=int, default=0,
+        help='Число итераций PBKDF2, по умолчанию стандартное Django'
+    )
+    parser.add_argument(
+        '--hasher-threads', type=int, default=0,
+        help='Размер пула потоков хеширования, 0 — без пула'
+    )
+    parser.add_argument('--json', help='Путь для сохранения результатов')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings, setup_test_environment
+
+    setup_test_environment()
+
+    with benchmark_database(), override_settings(
+        **hasher_settings(args.iterations, args.hasher_threads)
+    ):
+        emails = create_users(args.users)
+        results = {
+            'password_checks_per_login': count_password_checks(emails[0]),
+        }
+        print(
+            'Password checks per login: '
+            f'{results["password_checks_per_login"]}'
+        )
+        results['sequential'] = report(
+            'sequential', *run_sequential(emails, args.repeat)
+        )
+        if args.concurrency > 1:
+            results['concurrent'] = report(
+                f'{args.concurrency} threads',
+                *run_concurrent(emails, args.repeat, args.concurrency)
+            )
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
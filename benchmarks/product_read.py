@@ -0,0 +1,82 @@
+"""
+Бенчмарк чтения страниц продуктов: ProductSerializer и JSONRenderer
+против строк ``.values()`` (``read_products``) и FastJSONRenderer.
+
+Для каждого размера страницы измеряются отдельно построение данных
+(с запросами к БД) и рендеринг JSON, а также проверяется, что оба
+пути дают одинаковые байты.
+
+    python -m benchmarks.product_read --page-sizes 10,100,1000
+"""
+import argparse
+import json
+
+from benchmarks.utils import benchmark_database, measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--page-sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--json', help='Путь для сохранения результатов')
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+
+    from apps.products.models import Product
+    from apps.products.serializers import (
+        PRODUCT_READ_FIELDS, ProductSerializer, read_products,
+    )
+    from benchmarks.seed import seed_catalog
+    from mini_online_store.renderers import FastJSONRenderer
+
+    results = {}
+    with benchmark_database():
+        seed_catalog(products=args.products, users=1, orders=0)
+        queryset = Product.objects.order_by('id')
+        for page_size in map(int, args.page_sizes.split(',')):
+            def serializer_data():
+                return ProductSerializer(
+                    queryset.prefetch_related('categories')[:page_size],
+                    many=True,
+                ).data
+
+            def values_data():
+                return read_products(
+                    queryset.values(*PRODUCT_READ_FIELDS)[:page_size]
+                )
+
+            expected = serializer_data()
+            data = values_data()
+            if (
+                JSONRenderer().render(expected) !=
+                FastJSONRenderer().render(data)
+            ):
+                raise RuntimeError(f'Output differs for {page_size} rows')
+
+            results[page_size] = {
+                'serializer': measure(serializer_data, args.repeat),
+                'values': measure(values_data, args.repeat),
+                'json_renderer': measure(
+                    lambda: JSONRenderer().render(expected), args.repeat
+                ),
+                'fast_renderer': measure(
+                    lambda: FastJSONRenderer().render(data), args.repeat
+                ),
+            }
+            for label, summary in results[page_size].items():
+                print(
+                    f'{page_size:>6} rows {label:<14} '
+                    f'p50={summary["p50_ms"]:.3f}ms '
+                    f'p95={summary["p95_ms"]:.3f}ms'
+                )
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""
+Сценарии запросов к маршрутам ``apps.products.urls`` и
+``apps.users.urls`` для набора бенчмарков.
+
+Каждый сценарий строит запрос по сквозному номеру итерации, поэтому
+изменяющие запросы (регистрация, создание и удаление) можно
+повторять: каждая итерация работает со своими объектами.
+"""
+import itertools
+import json
+from urllib.parse import quote
+
+from django.urls import URLPattern, URLResolver
+
+USER = 'user'
+EMPLOYEE = 'employee'
+ANONYMOUS = None
+PASSWORD = 'benchmark-password'
+
+
+class Scenario:
+    """
+    Запрос к одному маршруту. ``path`` и ``data`` могут быть
+    функциями от номера итерации и контекста бенчмарка.
+    """
+
+    def __init__(self, name, route, path, method='GET', data=None,
+                 content_type='application/json', role=USER,
+                 expected=200, write=False, repeat=None):
+        self.name = name
+        self.route = route
+        self.path = path
+        self.method = method
+        self.data = data
+        self.content_type = content_type
+        self.role = role
+        self.expected = expected
+        self.write = write
+        self.repeat = repeat
+
+    def build(self, context):
+        """
+        Возвращает метод, путь, тело в байтах и content type.
+        """
+        iteration = next(context.iterations)
+        path = self.path
+        if callable(path):
+            path = path(iteration, context)
+        data = self.data
+        if callable(data):
+            data = data(iteration, context)
+        if data is None:
+            body = b''
+        elif isinstance(data, bytes):
+            body = data
+        else:
+            body = json.dumps(data).encode()
+        return self.method, path, body, self.content_type
+
+
+class BenchmarkContext:
+    """
+    Объекты, созданные для сценариев: пользователи, токены,
+    продукт и категория для чтения, ссылки подтверждения почты.
+    """
+
+    def __init__(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.tokens import default_token_generator
+        from django.utils.encoding import force_bytes
+        from django.utils.http import urlsafe_base64_encode
+
+        from apps.products.models import Category, Product
+        from apps.users.tokens import UserRefreshToken
+
+        User = get_user_model()
+        self.iterations = itertools.count()
+        self.users = {
+            USER: User.objects.create_user(
+                email='bench-user@example.com', username='bench-user',
+                password=PASSWORD, is_email_verified=True,
+            ),
+            EMPLOYEE: User.objects.create_user(
+                email='bench-employee@example.com',
+                username='bench-employee', password=PASSWORD,
+                role=User.EMPLOYEE, is_email_verified=True,
+            ),
+        }
+        self.refresh_tokens = {
+            role: str(UserRefreshToken.for_user(user))
+            for role, user in self.users.items()
+        }
+        self.unverified = User.objects.create_user(
+            email='bench-unverified@example.com',
+            username='bench-unverified', password=PASSWORD,
+        )
+        verify_user = User.objects.create_user(
+            email='bench-verify@example.com',
+            username='bench-verify', password=PASSWORD,
+        )
+        self.verify_path = (
+            f'/users/verify-email/'
+            f'{urlsafe_base64_encode(force_bytes(verify_user.pk))}/'
+            f'{default_token_generator.make_token(verify_user)}/'
+        )
+        self.product = Product.objects.order_by('id').first()
+        self.product_ids = list(
+            Product.objects.order_by('id').values_list('id', flat=True)[:100]
+        )
+        self.category = Category.objects.order_by('id').first()
+        self.category_names = list(
+            Category.objects.order_by('id').values_list('name', flat=True)
+        )
+
+    def access_token(self, role):
+        from apps.users.tokens import UserRefreshToken
+
+        return str(UserRefreshToken.for_user(self.users[role]).access_token)
+
+    def new_product(self):
+        from apps.products.models import Product
+
+        return Product.objects.create(
+            name='Benchmark product', regular_price='10.00', stock=1,
+            description='Created by the benchmark suite',
+        )
+
+    def new_category(self, iteration):
+        from apps.products.models import Category
+
+        return Category.objects.create(
+            name=f'Benchmark delete {iteration}'
+        )
+
+
+def _product_data(iteration, context):
+    return {
+        'name': f'Benchmark product {iteration}',
+        'regular_price': '100.00',
+        'discount_price': '90.00',
+        'stock': 10,
+        'description': 'Created by the benchmark suite',
+        'categories': context.category_names[:2],
+    }
+
+
+def _import_data(iteration, context):
+    categories = context.category_names[:1]
+    return ''.join(
+        json.dumps({
+            'name': f'Imported {iteration}-{number}',
+            'regular_price': '50.00',
+            'stock': number,
+            'categories': categories,
+        }) + '\n'
+        for number in range(100)
+    ).encode()
+
+
+def _stock_data(iteration, context):
+    # Чередование знака держит остатки около исходных значений.
+    delta = 1 if iteration % 2 else -1
+    return [
+        {'id': product_id, 'delta': delta}
+        for product_id in context.product_ids
+    ]
+
+
+def get_scenarios():
+    return [
+        # apps.users.urls
+        Scenario(
+            'register', 'register', '/users/register/', method='POST',
+            data=lambda i, c: {
+                'email': f'bench-register-{i}@example.com',
+                'username': f'bench-register-{i}',
+                'password': PASSWORD,
+            },
+            role=ANONYMOUS, expected=201, write=True,
+        ),
+        Scenario(
+            'resend_activation_email', 'resend_activation_email',
+            '/users/resend-activation-email/', method='POST',
+            data=lambda i, c: {'email': c.unverified.email},
+            role=ANONYMOUS, write=True,
+        ),
+        Scenario(
+            'login', 'login', '/users/login/', method='POST',
+            data={'email': 'bench-user@example.com', 'password': PASSWORD},
+            role=ANONYMOUS, write=True,
+        ),
+        Scenario(
+            'token_refresh', 'token_refresh', '/users/token/refresh/',
+            method='POST',
+            data=lambda i, c: {'refresh': c.refresh_tokens[USER]},
+            role=ANONYMOUS,
+        ),
+        Scenario(
+            'logout', 'logout', '/users/logout/', method='POST',
+            data={'blacklist': False},
+        ),
+        Scenario(
+            'verify_email', 'verify-email',
+            lambda i, c: c.verify_path, role=ANONYMOUS, write=True,
+        ),
+        Scenario(
+            'session_expired', 'session_expired',
+            '/users/session-expired/', role=ANONYMOUS,
+        ),
+
+        # apps.products.urls
+        Scenario('api_root', 'api-root', '/'),
+        Scenario('category_list', 'category-list', '/categories/'),
+        Scenario(
+            'category_create', 'category-list', '/categories/',
+            method='POST',
+            data=lambda i, c: {'name': f'Benchmark category {i}'},
+            role=EMPLOYEE, expected=201, write=True,
+        ),
+        Scenario(
+            'category_detail', 'category-detail',
+            lambda i, c: f'/categories/{c.category.pk}/',
+        ),
+        Scenario(
+            'category_update', 'category-detail',
+            lambda i, c: f'/categories/{c.category.pk}/', method='PATCH',
+            data=lambda i, c: {'name': c.category.name},
+            role=EMPLOYEE, write=True,
+        ),
+        Scenario(
+            'category_delete', 'category-detail',
+            lambda i, c: f'/categories/{c.new_category(i).pk}/',
+            method='DELETE', role=EMPLOYEE, expected=204, write=True,
+        ),
+        Scenario('product_list', 'product-list', '/products/'),
+        Scenario(
+            'product_create', 'product-list', '/products/', method='POST',
+            data=_product_data, role=EMPLOYEE, expected=201, write=True,
+        ),
+        Scenario(
+            'product_detail', 'product-detail',
+            lambda i, c: f'/products/{c.product.pk}/',
+        ),
+        Scenario(
+            'product_update', 'product-detail',
+            lambda i, c: f'/products/{c.product.pk}/', method='PATCH',
+            data=lambda i, c: {'stock': c.product.stock},
+            role=EMPLOYEE, write=True,
+        ),
+        Scenario(
+            'product_delete', 'product-detail',
+            lambda i, c: f'/products/{c.new_product().pk}/',
+            method='DELETE', role=EMPLOYEE, expected=204, write=True,
+        ),
+        Scenario('product_list_view', 'product-list-view', '/product-list/'),
+        Scenario(
+            'product_list_deep_page', 'product-list-view',
+            '/product-list/?ordering=-regular_price&page=50',
+        ),
+        Scenario(
+            'product_list_countless', 'product-list-view',
+            '/product-list/?count=false',
+        ),
+        Scenario(
+            'product_list_cursor', 'product-list-view',
+            '/product-list/?pagination=cursor&ordering=regular_price',
+        ),
+        Scenario(
+            'products_by_category', 'products-by-category',
+            lambda i, c: f'/products/category/{quote(c.category.name)}/',
+        ),
+        Scenario(
+            'product_search', 'product-search',
+            '/products/search/?q=synthetic+product',
+        ),
+        Scenario(
+            'product_import', 'product-import', '/products/import/',
+            method='POST', data=_import_data,
+            content_type='application/x-ndjson', role=EMPLOYEE,
+            write=True, repeat=5,
+        ),
+        Scenario(
+            'product_stock', 'product-stock', '/products/stock/',
+            method='POST', data=_stock_data, role=EMPLOYEE, write=True,
+        ),
+        Scenario(
+            'product_export', 'product-export',
+            '/products/export/?output=ndjson', repeat=3,
+        ),
+        Scenario('product_facets', 'product-facets', '/products/facets/'),
+        Scenario(
+            'product_facets_filtered', 'product-facets',
+            lambda i, c: (
+                f'/products/facets/?category={quote(c.category.name)}'
+                '&min_price=50'
+            ),
+        ),
+        Scenario('product_stats', 'product-stats', '/product-stats/'),
+        Scenario(
+            'catalog_cache_stats', 'catalog-cache-stats',
+            '/catalog-cache-stats/', role=EMPLOYEE,
+        ),
+        Scenario(
+            'async_product_list', 'async-product-list',
+            '/async/product-list/',
+        ),
+        Scenario(
+            'async_product_detail', 'async-product-detail',
+            lambda i, c: f'/async/products/{c.product.pk}/',
+        ),
+        Scenario(
+            'async_products_by_category', 'async-products-by-category',
+            lambda i, c: (
+                f'/async/products/category/{quote(c.category.name)}/'
+            ),
+        ),
+        Scenario(
+            'async_product_stats', 'async-product-stats',
+            '/async/product-stats/',
+        ),
+    ]
+
+
+def _route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+def missing_routes(scenarios):
+    """
+    Имена маршрутов ``apps.products.urls`` и ``apps.users.urls``,
+    для которых нет ни одного сценария.
+    """
+    from apps.products import urls as product_urls
+    from apps.users import urls as user_urls
+
+    routes = set(_route_names(
+        product_urls.urlpatterns + user_urls.urlpatterns
+    ))
+    return sorted(routes - {scenario.route for scenario in scenarios})
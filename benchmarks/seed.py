@@ -0,0 +1,144 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem
+from apps.products.facets import rebuild_facets
+from apps.products.models import Category, Product
+from apps.products.stats import rebuild_product_stats
+
+BATCH_SIZE = 5000
+
+
+@contextmanager
+def _explicit_created_at(model):
+    """
+    Временно отключает auto_now_add, чтобы задать даты заказов.
+    """
+    field = model._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def seed_catalog(products=10000, categories=50, users=100, orders=10000,
+                 in_stock_ratio=0.2, seed=42):
+    """
+    Заполняет базу синтетическим каталогом: категории, продукты
+    с категориями, пользователи и заказы с позициями.
+    Возвращает словарь с количеством созданных объектов.
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+
+    Category.objects.bulk_create([
+        Category(name=f'Category {i}') for i in range(categories)
+    ])
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    for category_id in category_ids:
+        Category.objects.filter(pk=category_id).update(
+            path=f'{category_id:010d}/'
+        )
+
+    for batch in _batches(range(products)):
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {i}',
+                regular_price=Decimal(rng.randint(100, 100000)) / 100,
+                stock=(
+                    rng.randint(1, 500)
+                    if rng.random() < in_stock_ratio else 0
+                ),
+                description=f'Synthetic product number {i}',
+            )
+            for i in batch
+        ])
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    prices = dict(Product.objects.values_list('id', 'regular_price'))
+
+    Through = Product.categories.through
+    links = [
+        Through(product_id=product_id, category_id=category_id)
+        for product_id in product_ids
+        for category_id in rng.sample(category_ids, min(2, len(category_ids)))
+    ]
+    for batch in _batches(links):
+        Through.objects.bulk_create(batch)
+
+    password = make_password('benchmark-password')
+    User.objects.bulk_create([
+        User(
+            username=f'benchuser{i}',
+            email=f'benchuser{i}@example.com',
+            password=password,
+            role=User.USER,
+            is_email_verified=True,
+        )
+        for i in range(users)
+    ])
+    user_ids = list(User.objects.values_list('id', flat=True))
+
+    now = timezone.now()
+    order_count = 0
+    item_count = 0
+    with _explicit_created_at(Order):
+        for batch in _batches(range(orders)):
+            lines = [
+                [
+                    (product_id, rng.randint(1, 3))
+                    for product_id in rng.sample(
+                        product_ids, min(3, len(product_ids))
+                    )
+                ]
+                for _ in batch
+            ]
+            created = Order.objects.bulk_create([
+                Order(
+                    user_id=rng.choice(user_ids),
+                    created_at=now - timedelta(
+                        minutes=rng.randint(0, 60 * 24 * 365)
+                    ),
+                    total_price=sum(
+                        prices[product_id] * quantity
+                        for product_id, quantity in order_lines
+                    ),
+                    is_paid=rng.random() < 0.9,
+                )
+                for order_lines in lines
+            ])
+            items = [
+                OrderItem(
+                    order_id=order.pk,
+                    product_id=product_id,
+                    quantity=quantity,
+                    price=prices[product_id],
+                )
+                for order, order_lines in zip(created, lines)
+                for product_id, quantity in order_lines
+            ]
+            OrderItem.objects.bulk_create(items)
+            order_count += len(created)
+            item_count += len(items)
+
+    rebuild_product_stats()
+    rebuild_facets()
+
+    return {
+        'categories': len(category_ids),
+        'products': len(product_ids),
+        'users': len(user_ids),
+        'orders': order_count,
+        'order_items': item_count,
+    }
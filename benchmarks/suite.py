@@ -0,0 +1,314 @@
+"""
+Набор бенчмарков всех маршрутов ``apps.products.urls`` и
+``apps.users.urls``.
+
+Заполняет отдельную базу синтетическим каталогом заданного размера
+и выполняет сценарии из ``benchmarks.scenarios`` двумя способами:
+
+- в процессе через тестовый клиент Django: задержка и число
+  SQL-запросов на запрос;
+- через HTTP: локальный многопоточный WSGI-сервер и генератор
+  нагрузки из ``--concurrency`` потоков (изменяющие сценарии
+  выполняются в один поток): пропускная способность и задержка.
+
+Результаты сохраняются в JSON (``--save``) и сравниваются
+с сохраненным ранее базовым прогоном (``--baseline``)::
+
+    python -m benchmarks.suite --products 10000 --save baseline.json
+    python -m benchmarks.suite --products 10000 --baseline baseline.json
+
+С ``--fail-on-regression`` завершается с кодом 1, если p95 вырос
+больше чем на ``--threshold`` или выросло число запросов к БД.
+"""
+import argparse
+import http.client
+import json
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+
+from benchmarks.utils import benchmark_database, setup_django, summarize
+
+
+def run_in_process(scenario, context, tokens, repeat, warmup=1):
+    """
+    Выполняет сценарий тестовым клиентом и возвращает сводку
+    по задержке и медианное число SQL-запросов.
+    """
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    headers = {}
+    if scenario.role is not None:
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {tokens[scenario.role]}'
+
+    def request():
+        method, path, body, content_type = scenario.build(context)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.generic(
+                method, path, data=body, content_type=content_type,
+                **headers
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if response.status_code != scenario.expected:
+            raise RuntimeError(
+                f'{scenario.name}: {method} {path} returned '
+                f'{response.status_code}, expected {scenario.expected}'
+            )
+        return elapsed, len(queries)
+
+    for _ in range(warmup):
+        request()
+    results = [request() for _ in range(repeat)]
+    summary = summarize([elapsed for elapsed, _ in results])
+    summary['queries'] = median(count for _, count in results)
+    return summary
+
+
+class HTTPServer:
+    """
+    Многопоточный WSGI-сервер Django на свободном локальном порту,
+    работающий в фоновом потоке.
+    """
+
+    def __enter__(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import ThreadedWSGIServer
+        from django.test.testcases import QuietWSGIRequestHandler
+
+        self.server = ThreadedWSGIServer(
+            ('127.0.0.1', 0), QuietWSGIRequestHandler,
+            allow_reuse_address=False,
+        )
+        self.server.set_app(WSGIHandler())
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_http(scenario, context, tokens, port, repeat, concurrency):
+    """
+    Выполняет сценарий по HTTP из ``concurrency`` потоков и возвращает
+    сводку по задержке и число запросов в секунду.
+    """
+    headers = {'Host': 'testserver'}
+    if scenario.role is not None:
+        headers['Authorization'] = f'Bearer {tokens[scenario.role]}'
+    if scenario.write:
+        concurrency = 1
+
+    def request():
+        method, path, body, content_type = scenario.build(context)
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        start = time.perf_counter()
+        connection.request(
+            method, path, body=body or None,
+            headers={**headers, 'Content-Type': content_type},
+        )
+        response = connection.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - start
+        connection.close()
+        if response.status != scenario.expected:
+            raise RuntimeError(
+                f'{scenario.name}: {method} {path} returned '
+                f'{response.status} over HTTP, '
+                f'expected {scenario.expected}'
+            )
+        return elapsed
+
+    def worker(count):
+        return [request() for _ in range(count)]
+
+    counts = [
+        repeat // concurrency + (number < repeat % concurrency)
+        for number in range(concurrency)
+    ]
+    request()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = [
+            timing
+            for chunk in executor.map(worker, counts)
+            for timing in chunk
+        ]
+    elapsed = time.perf_counter() - started
+    summary = summarize(timings)
+    summary['concurrency'] = concurrency
+    summary['requests_per_second'] = round(len(timings) / elapsed, 2)
+    return summary
+
+
+def compare(results, baseline, threshold):
+    """
+    Печатает изменения относительно базового прогона и возвращает
+    список регрессий: рост p95 больше ``threshold`` или рост числа
+    SQL-запросов.
+    """
+    regressions = []
+    print(f'\nComparison with baseline ({baseline["meta"]["created_at"]}):')
+    for name, result in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            print(f'  {name:<28} new scenario')
+            continue
+        for mode in ('in_process', 'http'):
+            if mode not in result or mode not in base:
+                continue
+            current, previous = result[mode], base[mode]
+            change = (
+                current['p95_ms'] / previous['p95_ms'] - 1
+                if previous['p95_ms'] else 0
+            )
+            line = f'  {name:<28} {mode:<10} p95 {change:+7.1%}'
+            if 'queries' in current:
+                line += (
+                    f'  queries {previous["queries"]:g} -> '
+                    f'{current["queries"]:g}'
+                )
+                if current['queries'] > previous['queries']:
+                    regressions.append(f'{name} {mode}: more queries')
+            if change > threshold:
+                regressions.append(f'{name} {mode}: p95 {change:+.1%}')
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--http-repeat', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument(
+        '--scenarios', help='Имена сценариев через запятую'
+    )
+    parser.add_argument(
+        '--no-http', action='store_true',
+        help='Не выполнять сценарии через HTTP'
+    )
+    parser.add_argument('--save', help='Путь для сохранения результатов')
+    parser.add_argument('--baseline', help='JSON базового прогона')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+    from django.utils import timezone
+
+    setup_test_environment()
+    settings.DEBUG = False
+    from benchmarks.scenarios import (
+        BenchmarkContext, get_scenarios, missing_routes,
+    )
+    from benchmarks.seed import seed_catalog
+
+    scenarios = get_scenarios()
+    missing = missing_routes(scenarios)
+    if missing:
+        sys.exit(f'Routes without scenarios: {", ".join(missing)}')
+    if args.scenarios:
+        names = set(args.scenarios.split(','))
+        scenarios = [s for s in scenarios if s.name in names]
+
+    results = {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'products': args.products,
+            'categories': args.categories,
+            'users': args.users,
+            'orders': args.orders,
+            'repeat': args.repeat,
+            'http_repeat': args.http_repeat,
+            'concurrency': args.concurrency,
+        },
+        'scenarios': {},
+    }
+    with benchmark_database() as connection:
+        results['meta']['database'] = connection.vendor
+        counts = seed_catalog(
+            products=args.products, categories=args.categories,
+            users=args.users, orders=args.orders,
+        )
+        print(f'Seeded: {counts}')
+        context = BenchmarkContext()
+        tokens = {
+            role: context.access_token(role) for role in context.users
+        }
+
+        for scenario in scenarios:
+            repeat = min(args.repeat, scenario.repeat or args.repeat)
+            result = results['scenarios'][scenario.name] = {
+                'in_process': run_in_process(
+                    scenario, context, tokens, repeat
+                ),
+            }
+            print(
+                f'{scenario.name:<28} in-process '
+                f'p50={result["in_process"]["p50_ms"]:.2f}ms '
+                f'p95={result["in_process"]["p95_ms"]:.2f}ms '
+                f'queries={result["in_process"]["queries"]:g}'
+            )
+
+        if not args.no_http:
+            with HTTPServer() as server:
+                for scenario in scenarios:
+                    repeat = min(
+                        args.http_repeat, scenario.repeat or args.http_repeat
+                    )
+                    result = results['scenarios'][scenario.name]
+                    result['http'] = run_http(
+                        scenario, context, tokens, server.port, repeat,
+                        args.concurrency,
+                    )
+                    print(
+                        f'{scenario.name:<28} http '
+                        f'{result["http"]["requests_per_second"]:>8.2f} '
+                        f'req/s p50={result["http"]["p50_ms"]:.2f}ms '
+                        f'p99={result["http"]["p99_ms"]:.2f}ms'
+                    )
+
+    if args.save:
+        with open(args.save, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('\nRegressions:')
+            for regression in regressions:
+                print(f'  {regression}')
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
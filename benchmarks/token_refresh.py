@@ -0,0 +1,129 @@
+"""
+Бенчмарк обновления токенов при росте черного списка.
+
+Заполняет таблицы OutstandingToken/BlacklistedToken до заданных
+размеров и для каждого размера измеряет ``POST /users/token/refresh/``
+с кешем черного списка и без него (кеш очищается перед каждым
+запросом).
+
+    python -m benchmarks.token_refresh --sizes 0,100000,1000000
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from benchmarks.utils import benchmark_database, setup_django, summarize
+
+BATCH_SIZE = 10000
+PASSWORD = 'benchmark-password'
+
+
+def grow_blacklist(current, target):
+    """
+    Добавляет занесенные в черный список токены до ``target`` строк.
+    """
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import (
+        BlacklistedToken, OutstandingToken,
+    )
+
+    expires_at = timezone.now() + timedelta(days=1)
+    while current < target:
+        size = min(BATCH_SIZE, target - current)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                jti=uuid.uuid4().hex, token='', expires_at=expires_at
+            )
+            for _ in range(size)
+        ])
+        BlacklistedToken.objects.bulk_create([
+            BlacklistedToken(token=token) for token in tokens
+        ])
+        current += size
+    return current
+
+
+def login(client):
+    from django.contrib.auth import get_user_model
+    from django.urls import reverse
+
+    get_user_model().objects.create_user(
+        email='refresh@example.com', username='refresh',
+        password=PASSWORD, is_email_verified=True,
+    )
+    response = client.post(reverse('login'), {
+        'email': 'refresh@example.com', 'password': PASSWORD
+    }, format='json')
+    return response.data['refresh']
+
+
+def measure_refresh(client, refresh, repeat, cached):
+    from django.core.cache import cache
+    from django.urls import reverse
+
+    from apps.users.blacklist import clear_local_blacklist
+
+    url = reverse('token_refresh')
+    timings = []
+    for _ in range(repeat):
+        if not cached:
+            cache.clear()
+            clear_local_blacklist()
+        start = time.perf_counter()
+        response = client.post(url, {'refresh': refresh}, format='json')
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f'Refresh failed: {response.status_code}')
+    summary = summarize(timings)
+    summary['refreshes_per_second'] = round(len(timings) / sum(timings), 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', default='0,10000,100000',
+        help='Размеры черного списка через запятую'
+    )
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--json', help='Путь для сохранения результатов')
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    setup_django()
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+
+    setup_test_environment()
+    results = {}
+    with benchmark_database():
+        client = APIClient()
+        refresh = login(client)
+        current = 0
+        for size in sizes:
+            current = grow_blacklist(current, size)
+            results[size] = {
+                'uncached': measure_refresh(
+                    client, refresh, args.repeat, cached=False
+                ),
+                'cached': measure_refresh(
+                    client, refresh, args.repeat, cached=True
+                ),
+            }
+            for label, result in results[size].items():
+                print(
+                    f'{size:>9} rows {label:<8} '
+                    f'{result["refreshes_per_second"]:>9.2f} refreshes/s '
+                    f'mean={result["mean_ms"]:.3f}ms '
+                    f'p95={result["p95_ms"]:.3f}ms'
+                )
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    """
+    Настраивает Django для запуска бенчмарков как отдельных скриптов.
+    """
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE', 'mini_online_store.settings'
+    )
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Создает отдельную базу данных (как для тестов), применяет
+    миграции и удаляет ее после завершения бенчмарка.
+    """
+    from django.db import connection
+
+    old_name = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def summarize(timings):
+    """
+    Сводка по списку замеров в секундах: среднее и перцентили в мс.
+    """
+    ordered = sorted(timings)
+
+    def percentile(value):
+        index = min(len(ordered) - 1, int(round(value * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(percentile(0.50), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'p99_ms': round(percentile(0.99), 3),
+    }
+
+
+def measure(func, repeat=50, warmup=3):
+    """
+    Выполняет ``func`` ``repeat`` раз и возвращает сводку по времени.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
@@ -0,0 +1,147 @@
+"""
+Маршрутизация запросов к БД между основной базой и репликами.
+
+Чтения продуктов, категорий и статистики внутри HTTP-запроса идут на
+случайную реплику из ``DATABASE_REPLICAS``, все записи — в основную
+базу. После первой записи (или для запросов с небезопасным методом)
+чтения до конца запроса тоже идут в основную базу. Клиент получает
+cookie, и его чтения ``REPLICA_PIN_SECONDS`` секунд после записи
+тоже идут в основную базу, поэтому он видит свои изменения несмотря
+на задержку репликации.
+
+Вне HTTP-запросов (команды управления, задачи Celery) все запросы
+идут в основную базу. Внутри ``read_primary()`` чтения тоже идут в
+основную базу: так заполняются записи общего кеша, которые живут
+дольше окна задержки репликации.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = 'db_pinned_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_APP_LABELS = {'products'}
+
+_pin_state = ContextVar('replica_pin_state', default=None)
+_read_primary = ContextVar('replica_read_primary', default=False)
+
+
+@contextmanager
+def read_primary():
+    """
+    Направляет чтения внутри блока в основную базу. Работает и в
+    корутинах: sync_to_async копирует контекст в поток.
+    """
+    token = _read_primary.set(True)
+    try:
+        yield
+    finally:
+        _read_primary.reset(token)
+
+
+class PinState:
+    """
+    Состояние маршрутизации одного запроса: ``pinned`` — читать
+    из основной базы, ``wrote`` — в запросе была запись.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _pin_state.get()
+        if (
+            state is None or state.pinned or _read_primary.get() or
+            not settings.DATABASE_REPLICAS or
+            model._meta.app_label not in REPLICA_APP_LABELS
+        ):
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _pin_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def _pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaPinningMiddleware:
+    """
+    Создает состояние маршрутизации для запроса и после записи
+    выставляет cookie, закрепляющую чтения клиента за основной базой.
+    Работает и в синхронной, и в асинхронной цепочке middleware:
+    sync_to_async копирует контекст в поток, поэтому запись в
+    синхронном коде async-вью видна в том же состоянии.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin_state.reset(token)
+        return self._finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin_state.reset(token)
+        return self._finish(request, response, state)
+
+    @staticmethod
+    def _start(request):
+        state = PinState(
+            pinned=(
+                request.method not in SAFE_METHODS or
+                _pinned_by_cookie(request)
+            )
+        )
+        return state, _pin_state.set(state)
+
+    @staticmethod
+    def _finish(request, response, state):
+        if state.wrote or request.method not in SAFE_METHODS:
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + seconds)),
+                max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
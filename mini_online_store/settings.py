@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     'apps.users',
     'apps.products',
     'apps.orders',
+    'apps.monitoring',
     'django_extensions',
 ]
 
@@ -45,6 +46,24 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+REQUEST_PROFILING = os.getenv(
+    'REQUEST_PROFILING', default='false'
+).lower() == 'true'
+if REQUEST_PROFILING:
+    MIDDLEWARE.insert(0, 'apps.monitoring.middleware.ProfilingMiddleware')
+
+PROFILING_DUPLICATE_QUERIES = int(
+    os.getenv('PROFILING_DUPLICATE_QUERIES', default=3)
+)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default=0))
+PROFILING_DUMP_DIR = os.getenv(
+    'PROFILING_DUMP_DIR', default=str(BASE_DIR / 'profiles')
+)
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', default='')
+PROFILING_TRACE_ALLOCATIONS = os.getenv(
+    'PROFILING_TRACE_ALLOCATIONS', default='false'
+).lower() == 'true'
+
 SESSION_COOKIE_AGE = 180 * 30
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
@@ -72,33 +91,75 @@ WSGI_APPLICATION = 'mini_online_store.wsgi.application'
 
 AUTH_USER_MODEL = 'users.User'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', default=BASE_DIR / 'db.sqlite3'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.getenv('DB_NAME', default='postgres'),
+            'USER': os.getenv('POSTGRES_USER', default='postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='password12345'),
+            'HOST': os.getenv('DB_HOST', default='db'),
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            # Постоянные соединения с проверкой перед переиспользованием.
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Нужно при PgBouncer в режиме transaction pooling.
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+                'DB_DISABLE_SERVER_SIDE_CURSORS', default='false'
+            ).lower() == 'true',
+            'OPTIONS': {
+                'connect_timeout': int(
+                    os.getenv('DB_CONNECT_TIMEOUT', default=5)
+                ),
+            },
+        }
     }
-}
 
-"""
-DATABASES = {
-    'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
-        'NAME': os.getenv('DB_NAME', default='postgres'),
-        'USER': os.getenv('POSTGRES_USER', default='postgres'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='password12345'),
-        'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))
+):
+    host, _, port = replica.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT', ''),
+        'TEST': {'MIRROR': 'default'},
     }
-}
-"""
+    DATABASE_REPLICAS.append(alias)
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=5))
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['mini_online_store.routers.ReplicaRouter']
+    MIDDLEWARE.append('mini_online_store.routers.ReplicaPinningMiddleware')
+
+JWT_STATELESS_AUTH = os.getenv(
+    'JWT_STATELESS_AUTH', default='false'
+).lower() == 'true'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
+        'apps.users.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'mini_online_store.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
@@ -114,8 +175,35 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_USER_CLASS': 'apps.users.tokens.TokenUser',
 }
 
+TOKEN_BLACKLIST_LOCAL_SIZE = int(
+    os.getenv('TOKEN_BLACKLIST_LOCAL_SIZE', default=10000)
+)
+# Сколько секунд кешировать отсутствие токена в черном списке,
+# если кеш не общий для процессов (LocMemCache).
+TOKEN_BLACKLIST_NEGATIVE_TIMEOUT = int(
+    os.getenv('TOKEN_BLACKLIST_NEGATIVE_TIMEOUT', default=5)
+)
+
+
+LOGIN_HASHER_THREADS = int(os.getenv('LOGIN_HASHER_THREADS', default=0))
+if LOGIN_HASHER_THREADS:
+    AUTHENTICATION_BACKENDS = ['apps.users.backends.PooledHashingBackend']
+
+PASSWORD_HASHER_ITERATIONS = int(
+    os.getenv('PASSWORD_HASHER_ITERATIONS', default=0)
+)
+if PASSWORD_HASHER_ITERATIONS:
+    PASSWORD_HASHERS = [
+        'apps.users.hashers.ConfigurablePBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ]
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -144,6 +232,50 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=300))
+# max-age в Cache-Control ответов каталога; по умолчанию клиенты
+# проверяют актуальность условным запросом при каждом обращении.
+CATALOG_HTTP_MAX_AGE = int(os.getenv('CATALOG_HTTP_MAX_AGE', default=0))
+
+PRODUCT_STATS_MAX_AGE = timedelta(
+    seconds=int(os.getenv('PRODUCT_STATS_MAX_AGE', default=15 * 60))
+)
+
+# Нижние границы корзин гистограммы цен в фасетах. После изменения
+# нужно выполнить rebuild_product_facets.
+PRODUCT_PRICE_BUCKETS = [
+    int(bound) for bound in os.getenv(
+        'PRODUCT_PRICE_BUCKETS', default='0,50,100,500,1000,5000'
+    ).split(',')
+]
+
+# Корзины хранятся в CART_STORE: в таблицах Cart (по умолчанию)
+# или в общем кеше (apps.orders.carts.CacheCartStore, требует Redis
+# и брокер Celery) с записью в таблицы через CART_PERSIST_DELAY
+# секунд после изменения.
+CART_STORE = os.getenv(
+    'CART_STORE', default='apps.orders.carts.DatabaseCartStore'
+)
+CART_TIMEOUT = int(os.getenv('CART_TIMEOUT', default=24 * 60 * 60))
+CART_ANONYMOUS_TIMEOUT = int(
+    os.getenv('CART_ANONYMOUS_TIMEOUT', default=30 * 24 * 60 * 60)
+)
+CART_PERSIST_DELAY = int(os.getenv('CART_PERSIST_DELAY', default=5))
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST')
@@ -152,3 +284,32 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
+
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
+CELERY_TASK_ALWAYS_EAGER = os.getenv(
+    'CELERY_TASK_ALWAYS_EAGER', default=str(not CELERY_BROKER_URL)
+).lower() == 'true'
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_ACKS_LATE = True
+SALES_ROLLUP_INTERVAL = timedelta(
+    seconds=int(os.getenv('SALES_ROLLUP_INTERVAL', default=5 * 60))
+)
+
+CELERY_BEAT_SCHEDULE = {
+    'prune-token-blacklist': {
+        'task': 'apps.users.tasks.prune_token_blacklist',
+        'schedule': timedelta(hours=1),
+    },
+    'rollup-sales': {
+        'task': 'apps.orders.tasks.rollup_sales',
+        'schedule': SALES_ROLLUP_INTERVAL,
+    },
+    'prune-anonymous-carts': {
+        'task': 'apps.orders.tasks.prune_anonymous_carts',
+        'schedule': timedelta(hours=1),
+    },
+}
+
+EMAIL_MAX_RETRIES = int(os.getenv('EMAIL_MAX_RETRIES', default=5))
+EMAIL_RETRY_BACKOFF = int(os.getenv('EMAIL_RETRY_BACKOFF', default=30))
@@ -6,4 +6,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', include('apps.users.urls')),
     path('', include('apps.products.urls')),
+    path('', include('apps.orders.urls')),
+    path('', include('apps.monitoring.urls')),
 ]